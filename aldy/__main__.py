@@ -10,6 +10,7 @@ import logbook
 import logbook.more
 import logbook.base
 import argparse
+import contextlib
 import os
 import sys
 import platform
@@ -22,7 +23,7 @@ from . import common
 from .common import log, script_path, AldyException, td, parse_cn_region
 from .gene import Gene
 from .profile import Profile
-from .genotype import genotype
+from .genotype import genotype, batch
 from .query import query
 from .version import __version__
 
@@ -111,6 +112,7 @@ def main(argv):
                     cn_region=parse_cn_region(args.cn_neutral_region),
                     genome=args.genome,
                     params=params,
+                    jobs=args.jobs,
                 )
                 print(yaml.dump(p, default_flow_style=None))
             except AldyException as ex:
@@ -125,6 +127,8 @@ def main(argv):
             _genotype(args.gene, output, args)
             if output and output != sys.stdout:
                 output.close()
+        elif args.subparser == "batch":
+            _batch(args)
         else:
             raise AldyException("Invalid sub-command " + args.subparser)
     except IOError as ex:
@@ -180,24 +184,16 @@ def _get_args(argv):
         ),
     )
 
-    subparsers = parser.add_subparsers(dest="subparser")
-
-    genotype_parser = subparsers.add_parser(
-        "genotype",
-        help="Call the most likely genotype and diplotype within a sample.",
-        parents=[base],
-    )
-    genotype_parser.add_argument(
-        "file", nargs="?", help="Input file in SAM, BAM or CRAM format."
-    )
-    genotype_parser.add_argument(
+    # Options shared by the genotype and batch commands
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument(
         "--gene",
         "-g",
         default="all",
         help='Gene whose genotype is to be called. Default is "all" which calls '
         + "genotypes for all supported genes.",
     )
-    genotype_parser.add_argument(
+    options.add_argument(
         "--profile",
         "-p",
         help=td(
@@ -214,18 +210,18 @@ def _get_args(argv):
                Please check documentation for more details."""
         ),
     )
-    genotype_parser.add_argument(
+    options.add_argument(
         "--reference",
         "-r",
         default=None,
         help="Genome reference used for reading CRAM files",
     )
-    genotype_parser.add_argument(
+    options.add_argument(
         "--genome",
         default=None,
         help="SAM/BAM reference genome (hg19 or hg38; none for auto-detection)",
     )
-    genotype_parser.add_argument(
+    options.add_argument(
         "--cn-neutral-region",
         "-n",
         help=td(
@@ -234,13 +230,7 @@ def _get_args(argv):
                Default is CYP2D8 region within hg19 (22:42547463-42548249)."""
         ),
     )
-    genotype_parser.add_argument(
-        "--output",
-        "-o",
-        default=None,
-        help="Output file location. Default is [input].[gene].aldy.",
-    )
-    genotype_parser.add_argument(
+    options.add_argument(
         "--solver",
         "-s",
         default="any",
@@ -248,17 +238,14 @@ def _get_args(argv):
             """ILP solver:
                - gurobi (Gurobi)
                - cbc (Google OR-Tools/CBC)
-               - any (attempts to use Gurobi and then CBC).
+               - cpsat (Google OR-Tools/CP-SAT; multi-threaded)
+               - highs (HiGHS; multi-threaded)
+               - any (attempts to use CBC, then Gurobi, CP-SAT and then HiGHS;
+                 CP-SAT is tried first on multi-core machines).
                Default is "any"."""
         ),
     )
-    genotype_parser.add_argument(
-        "--debug",
-        default=None,
-        help="Create a directory that will contain the debug information "
-        + "and core dumps.",
-    )
-    genotype_parser.add_argument(
+    options.add_argument(
         "--cn",
         "-c",
         default=None,
@@ -270,8 +257,8 @@ def _get_args(argv):
                (e.g. two copies of the main gene), use 1,1."""
         ),
     )
-    genotype_parser.add_argument("--log", "-l", default=None, help="Log file location")
-    genotype_parser.add_argument(
+    options.add_argument("--log", "-l", default=None, help="Log file location")
+    options.add_argument(
         "--multiple-warn-level",
         "-W",
         default=1,
@@ -281,13 +268,96 @@ def _get_args(argv):
         + "(also warn if there are multiple major solutions)."
         + "Default is 1 (warn after the genotyping).",
     )
+    options.add_argument(
+        "--allow-pickle",
+        action="store_true",
+        default=False,
+        help=td(
+            """Allow loading the dump files in the older pickle format.
+               Unpickling can execute arbitrary code: use it only for the dumps
+               from the trusted sources."""
+        ),
+    )
+    options.add_argument("--param", action="append", nargs="+")
+
+    subparsers = parser.add_subparsers(dest="subparser")
+
+    genotype_parser = subparsers.add_parser(
+        "genotype",
+        help="Call the most likely genotype and diplotype within a sample.",
+        parents=[base, options],
+    )
+    genotype_parser.add_argument(
+        "file", nargs="?", help="Input file in SAM, BAM or CRAM format."
+    )
+    genotype_parser.add_argument(
+        "--output",
+        "-o",
+        default=None,
+        help="Output file location. Default is [input].[gene].aldy.",
+    )
+    genotype_parser.add_argument(
+        "--jobs",
+        "-j",
+        default=1,
+        type=int,
+        help=td(
+            """Number of genes to genotype in parallel (or, for a single gene,
+               the number of minor star-allele models to solve in parallel).
+               Default is 1."""
+        ),
+    )
+    genotype_parser.add_argument(
+        "--debug",
+        default=None,
+        help="Create a directory that will contain the debug information "
+        + "and core dumps.",
+    )
     genotype_parser.add_argument(
         "--simple",
         action="store_true",
         default=False,
         help=td("""Print one-line result per gene (debug). Default is off."""),
     )
-    genotype_parser.add_argument("--param", action="append", nargs="+")
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Genotype multiple samples listed in a manifest file.",
+        parents=[base, options],
+    )
+    batch_parser.add_argument(
+        "file",
+        help=td(
+            """Manifest file. Each line contains a path to a SAM/BAM/CRAM/VCF file,
+               optionally followed by a tab and the sample name.
+               Empty lines and lines starting with # are ignored."""
+        ),
+    )
+    batch_parser.add_argument(
+        "--jobs",
+        "-j",
+        default=1,
+        type=int,
+        help="Number of samples to genotype in parallel. Default is 1.",
+    )
+    batch_parser.add_argument(
+        "--output-dir",
+        "-o",
+        default=".",
+        help="Output directory for the per-sample results. "
+        + "Default is current directory.",
+    )
+    batch_parser.add_argument(
+        "--format",
+        "-f",
+        default="aldy",
+        help="Per-sample output format (aldy, vcf or simple). Default is aldy.",
+    )
+    batch_parser.add_argument(
+        "--summary",
+        default=None,
+        help="Summary table location. Default is [output-dir]/summary.tsv.",
+    )
 
     _ = subparsers.add_parser(
         "test",
@@ -331,6 +401,13 @@ def _get_args(argv):
         default=None,
         help="SAM/BAM reference genome (hg19 or hg38; hg19 by default)",
     )
+    profile_parser.add_argument(
+        "--jobs",
+        "-j",
+        default=1,
+        type=int,
+        help="Number of processes that scan the file in parallel. Default is 1.",
+    )
     profile_parser.add_argument("--param", action="append", nargs="+")
 
     _ = subparsers.add_parser(
@@ -384,7 +461,15 @@ def _genotype(gene: str, output: Optional[Any], args) -> None:
             params = {
                 k: v
                 for k, v in vars(args).items()
-                if k in ["solver", "reference", "multiple_warn_level", "genome"]
+                if k
+                in [
+                    "solver",
+                    "reference",
+                    "multiple_warn_level",
+                    "genome",
+                    "jobs",
+                    "allow_pickle",
+                ]
             }
             if args.param:
                 for pl in args.param:
@@ -452,6 +537,83 @@ def _genotype(gene: str, output: Optional[Any], args) -> None:
         run(None)
 
 
+def _batch(args) -> None:
+    """
+    Genotype all samples from a manifest file.
+
+    :raise: :py:class:`aldy.common.AldyException` if the manifest is invalid.
+    """
+
+    samples = []
+    root = os.path.dirname(os.path.abspath(args.file))
+    with open(args.file) as f:
+        for ll in f:
+            ll = ll.strip()
+            if not ll or ll.startswith("#"):
+                continue
+            path, *name = ll.split("\t")
+            path = os.path.join(root, os.path.expanduser(path.strip()))
+            if name and name[0].strip():
+                name = name[0].strip()
+            else:
+                name = os.path.splitext(os.path.basename(path))[0]
+            if name in {n for n, _ in samples}:
+                raise AldyException(f"Duplicate sample {name} in {args.file}")
+            samples.append((name, path))
+    log.info("Genotyping {} samples from {}...", len(samples), args.file)
+
+    if args.log:
+        fh = logbook.FileHandler(
+            args.log,
+            mode="w",
+            bubble=True,
+            level="TRACE",  # type: ignore
+        )
+        fh.formatter = lambda record, _: record.message  # type: ignore
+        fh.push_application()
+
+    params = {
+        k: v
+        for k, v in vars(args).items()
+        if k
+        in [
+            "solver",
+            "reference",
+            "multiple_warn_level",
+            "genome",
+            "jobs",
+            "allow_pickle",
+        ]
+    }
+    if args.param:
+        for pl in args.param:
+            for p in pl:
+                if "=" not in p:
+                    raise AldyException(f"Invalid parameter {p}")
+                k, v = p.split("=", 1)
+                params[k.replace("-", "_")] = v
+    summary = args.summary or os.path.join(args.output_dir, "summary.tsv")
+    os.makedirs(args.output_dir, exist_ok=True)
+    with contextlib.ExitStack() as stack:
+        if summary == "-":
+            summary_file = sys.stdout
+        else:
+            summary_file = stack.enter_context(open(summary, "w"))
+        batch(
+            samples,
+            gene_db=args.gene,
+            profile_name=args.profile,
+            output_dir=args.output_dir,
+            output_format=args.format,
+            summary_file=summary_file,
+            cn_region=parse_cn_region(args.cn_neutral_region),
+            cn_solution=args.cn.split(",") if args.cn else None,
+            **{k: v for k, v in params.items() if v is not None},
+        )
+    if summary != "-":
+        log.info("Summary written to {}", summary)
+
+
 def _run_test() -> None:
     """
     Run the Aldy test suite.
@@ -8,8 +8,10 @@ from typing import Dict, List, Tuple, Optional
 from math import ceil
 from natsort import natsorted
 from functools import partial
+import itertools
 import copy
 import re
+import numpy
 
 from . import lpinterface
 from .common import log, json, sorted_tuple, AldyException
@@ -137,27 +139,44 @@ def solve_cn_model(
         Please see `Aldy paper <https://www.nature.com/articles/s41467-018-03273-1>`_
         (section Methods/Copy number and structural variation estimation)
         for the detailed description of ILP model.
+        Small instances are solved by :py:func:`_enumerate_cn_model` instead
+        (see :py:attr:`aldy.profile.Profile.cn_enumeration_limit`).
     """
 
-    model = lpinterface.model("AldyCN", solver)
     debug_info = json[gene.name]["cn"]
-
     del_allele = gene.deletion_allele()
 
+    # N.B. (3/2022) this step filters "weak" fusions without long-read support
+    cn_configs = {
+        name: structure
+        for name, structure in cn_configs.items()
+        if not fusion_support
+        or name == "1"
+        or (del_allele and name == del_allele)
+        or (name in fusion_support and fusion_support[name] >= 1 / (2 * max_cn))
+    }
+    # Debug runs always dump the ILP model
+    space = _search_space(gene, cn_configs, max_cn)
+    if not debug and space <= profile.cn_enumeration_limit:
+        log.trace("[cn] enumerating {} configuration combinations", space)
+        return _enumerate_cn_model(gene, profile, cn_configs, max_cn, region_coverage)
+
+    model = lpinterface.model(
+        "AldyCN",
+        solver,
+        time_limit=profile.cn_time_limit,
+        mip_gap=profile.cn_mip_gap,
+        threads=profile.solver_threads,
+    )
+
     # List of CN configurations (a.k.a. structures). Each configuration is a binary
     # variable. Each structure is defined by `('structure_name', number)`.
     # When `number` ∈ {0, -1}, the configuration is complete with *all* pseudogenes
     # included (a diploid genome must contain exactly *2* complete configurations).
     # When `number` > 0, the configuration describes only the main gene and not the
     # pseudogene (there can be many such configurations).
-    # N.B. (3/2022) this step filters "weak" fusions without long-read support
     structures: Dict[Tuple[str, int], CNConfig] = {
-        (name, 0): structure
-        for name, structure in cn_configs.items()
-        if not fusion_support
-        or name == "1"
-        or (del_allele and name == del_allele)
-        or (name in fusion_support and fusion_support[name] >= 1 / (2 * max_cn))
+        (name, 0): structure for name, structure in cn_configs.items()
     }
     for a, ai in list(structures.keys()):
         structures[a, -1] = copy.deepcopy(structures[a, 0])
@@ -274,6 +293,8 @@ def solve_cn_model(
         )
         if sol_tuple not in result:
             result[sol_tuple] = CNSolution(gene, opt, list(sol_tuple))
+            result[sol_tuple].status = status
+            result[sol_tuple].proven_gap = model.proven_gap
             log.debug(
                 f"[cn] status= {status}; opt= {opt:.2f} "
                 + "(diff= {:.2f}, fit= {:.2f}, pars= {:.2f}) "
@@ -289,6 +310,170 @@ def solve_cn_model(
     return list(result.values())
 
 
+def _search_space(gene: Gene, cn_configs: Dict[str, CNConfig], max_cn: int) -> int:
+    """
+    :returns: Number of the configuration combinations that satisfy the constraints
+        of the copy number ILP (see :py:func:`_enumerate_cn_model`).
+    """
+
+    n = len(cn_configs)
+    space = n * (n + 1) // 2
+    for c in cn_configs.values():
+        if c.kind == CNConfigType.DEFAULT:
+            space *= max_cn
+    if len(gene.regions) > 1 and gene.deletion_allele():
+        space *= max_cn + 1
+    return space
+
+
+def _enumerate_cn_model(
+    gene: Gene,
+    profile: Profile,
+    cn_configs: Dict[str, CNConfig],
+    max_cn: int,
+    region_coverage: Dict[str, Tuple[float, float]],
+) -> List[CNSolution]:
+    """
+    Solve the copy number estimation problem by scoring all combinations of
+    the copy number configurations.
+    Uses the same objective as the ILP in :py:func:`solve_cn_model`, and reports
+    the same solutions. Feasible only if the number of configurations
+    and `max_cn` are small.
+
+    A combination consists of two complete configurations (or a single whole-gene
+    deletion that excludes everything else), up to `max_cn - 1` extra copies of each
+    default configuration without the pseudogene, and up to `max_cn` extra
+    pseudogene copies.
+    """
+
+    debug_info = json[gene.name]["cn"]
+    del_allele = gene.deletion_allele()
+
+    names = list(cn_configs)
+    regions = [r for r in region_coverage if r in gene.unique_regions]
+    for r, cov in region_coverage.items():
+        debug_info["data"][r] = cov
+
+    def vectors(configs, weak=False):
+        """:returns: Main gene and pseudogene copy number of each region."""
+        gene_cn = numpy.array(
+            [[c.cn[0].get(r, 0) for r in regions] for c in configs], dtype=float
+        ).reshape(len(configs), len(regions))
+        pseudo_cn = numpy.array(
+            [
+                [
+                    c.cn[1][r] - weak if len(c.cn) > 1 and r in c.cn[1] else 0
+                    for r in regions
+                ]
+                for c in configs
+            ],
+            dtype=float,
+        ).reshape(len(configs), len(regions))
+        return gene_cn, pseudo_cn
+
+    # Complete configurations (the pairs)
+    pairs = list(itertools.combinations_with_replacement(range(len(names)), 2))
+    complete = numpy.zeros((len(pairs), len(names)))
+    for pi, (i, j) in enumerate(pairs):
+        complete[pi, i] += 1
+        complete[pi, j] += 1
+    # Extra copies of the main gene
+    default = [
+        i for i, n in enumerate(names) if cn_configs[n].kind == CNConfigType.DEFAULT
+    ]
+    extra = numpy.zeros((max_cn ** len(default), len(names)))
+    for wi, counts in enumerate(itertools.product(range(max_cn), repeat=len(default))):
+        extra[wi, default] = counts
+    # Extra pseudogene copies
+    pseudo_copies = 0
+    if len(gene.regions) > 1 and del_allele:
+        pseudo_copies = max_cn
+    pseudo = numpy.arange(pseudo_copies + 1, dtype=float)
+
+    cn0, cn1 = vectors([cn_configs[n] for n in names])
+    weak0, weak1 = vectors([cn_configs[n] for n in names], weak=True)
+    del0, del1 = numpy.zeros(len(regions)), numpy.zeros(len(regions))
+    if pseudo_copies:
+        (del0,), (del1,) = vectors([cn_configs[del_allele]])
+
+    # Copy numbers of the main gene and the difference to the pseudogene:
+    # axes are (pair, extra copies, pseudogene copies, region)
+    gene_cn = (
+        (complete @ cn0)[:, None, None, :]
+        + (extra @ weak0)[None, :, None, :]
+        + pseudo[None, None, :, None] * del0
+    )
+    diff_cn = gene_cn - (
+        (complete @ cn1)[:, None, None, :]
+        + (extra @ weak1)[None, :, None, :]
+        + pseudo[None, None, :, None] * del1
+    )
+
+    exp0 = numpy.array([region_coverage[r][0] for r in regions])
+    exp1 = numpy.array([region_coverage[r][1] for r in regions])
+    scale = numpy.maximum(exp0, exp1) + 1
+    err = (exp0 - exp1 - diff_cn) / scale
+    err_gene = exp0 - gene_cn
+
+    # The objective of the ILP (see solve_cn_model)
+    weights = numpy.array(
+        [profile.cn_pce_penalty if r == "pce" else 1 for r in regions]
+    )
+    o_diff = profile.cn_diff / len(gene.unique_regions) * (abs(err) @ weights)
+    o_fit = profile.cn_fit / len(gene.unique_regions) * abs(err_gene).sum(axis=3)
+    PARSIMONY_PENALTY = 0.75 * 10.0 / len(gene.unique_regions)
+    penalty = numpy.full(len(names), PARSIMONY_PENALTY)
+    for i, n in enumerate(names):
+        if cn_configs[n].kind == CNConfigType.RIGHT_FUSION:
+            penalty[i] += PARSIMONY_PENALTY * profile.cn_fusion_right
+        if cn_configs[n].kind == CNConfigType.LEFT_FUSION:
+            penalty[i] += PARSIMONY_PENALTY * profile.cn_fusion_left
+    o_pars = profile.cn_parsimony * (
+        (complete @ penalty)[:, None, None]
+        + (extra @ penalty)[None, :, None]
+        + pseudo[None, None, :] * PARSIMONY_PENALTY
+    )
+    score = o_diff + o_fit + o_pars
+
+    # Error variables of the ILP are bounded
+    bound = profile.cn_max + lpinterface.SOLVER_PRECISON
+    feasible = (abs(err) <= bound).all(axis=3) & (abs(err_gene) <= bound).all(axis=3)
+    if del_allele in names:  # Whole-gene deletion excludes everything else
+        d = pairs.index((names.index(del_allele),) * 2)
+        feasible[d, 1:, :] = feasible[d, :, 1:] = False
+    score[~feasible] = numpy.inf
+
+    result: dict = {}
+    if numpy.isfinite(score).any():
+        ub = (1 + profile.gap) * score.min() + lpinterface.SOLVER_PRECISON
+        found: List[Tuple[int, numpy.ndarray, int]] = []
+        for pi, wi, si in sorted(
+            map(tuple, numpy.argwhere(score <= ub)), key=lambda i: score[i]
+        ):
+            # The ILP enumeration excludes the supersets of the previous solutions
+            # (see lpinterface.CBC.solutions)
+            if any(p == pi and s <= si and (w <= extra[wi]).all() for p, w, s in found):
+                continue
+            found.append((pi, extra[wi], si))
+            counts = complete[pi] + extra[wi]
+            sol_tuple = sorted_tuple(
+                n
+                for i, n in enumerate(names)
+                for _ in range(int(counts[i]))
+                if n != del_allele
+            )
+            if sol_tuple not in result:
+                opt = float(score[pi, wi, si])
+                result[sol_tuple] = CNSolution(gene, opt, list(sol_tuple))
+    for sol in result.values():
+        log.debug(f"[cn] status= enumerated; opt= {sol.score:.2f}; solution= {sol}")
+    if not result:
+        log.debug("[cn] solution= []")
+
+    debug_info["sol"] = [dict(r.solution) for r in result.values()]
+    return list(result.values())
+
+
 def _filter_configs(gene: Gene, coverage: Coverage) -> Dict[str, CNConfig]:
     """
     Filter out low-quality mutations and copy number configurations that are not
@@ -4,8 +4,10 @@
 #   file 'LICENSE', which is part of this source code package.
 
 
-from typing import Dict, Tuple, Callable, List, Any, Optional
+from typing import Dict, Tuple, Callable, List, Any, Optional, Union
+from collections import Counter
 import copy
+import numpy as np
 
 from .profile import Profile
 from .common import log, AldyException
@@ -21,9 +23,9 @@ class Coverage:
         gene: Gene,
         profile: Profile,
         sam,
-        coverage: Dict[int, Dict[str, List]],
+        coverage: Dict[int, Dict[str, Union[Counter, List]]],
         indel_coverage: Optional[Dict],
-        cnv_coverage: Dict[int, int],
+        cnv_coverage: Union[np.ndarray, Dict[int, int]],
     ) -> None:
         """
         :param gene: Gene instance.
@@ -31,58 +33,177 @@ class Coverage:
         :param sam: Sample instance.
         :param coverage: Coverage for each sample location. Each location is represented
             as a dictionary that maps a mutation (or a reference position indicated by
-            `_`) to the list of read quality scores that cover it. For example,
-            `coverage[10]['A>G'] = [(10, 20), (10, 10)]` indicates that 2 reads have G
-            (instead of A) at the location 10.
+            `_`) to the counts of the (binned) read quality scores that cover it.
+            For example, `coverage[10]['A>G'] = Counter({(10, 20): 2, (10, 10): 1})`
+            indicates that 3 reads have G (instead of A) at the location 10.
+            Lists of quality scores (e.g. `[(10, 20), (10, 20), (10, 10)]`)
+            are also accepted.
         :param indel_coverage: Number of reads that do not support and that do support
             the indel for each indel in the gene database.
         :param cnv_coverage: Coverage of the copy-number neutral region within the
-            sample. Each location is represented by the total corresponsing read
-            coverage. Used for coverage rescaling.
+            sample: the read depth of each location within the region (or a dictionary
+            that maps locations to their read depth). Used for coverage rescaling.
         """
         self.gene = gene
         self.profile = profile
         self.sam = sam
-        self._coverage = {}
+        self._data: Dict[int, Dict[str, Counter]] = {}
+        """Unfiltered coverage (shared by all filtered views)."""
         for pos, ops in coverage.items():
-            self._coverage[pos] = {}
+            self._data[pos] = {}
             for op, quals in ops.items():
                 if not (indel_coverage and op.startswith("ins")):
-                    self._coverage[pos][op] = quals
+                    if not isinstance(quals, Counter):
+                        quals = Counter(quals)
+                    self._data[pos][op] = quals
         if indel_coverage:
             self._indels = {k: (n, y) for k, (n, y) in indel_coverage.items() if y}
         else:
             self._indels = None
+        if isinstance(cnv_coverage, dict):
+            r = profile.cn_region
+            cnv_coverage = np.array(
+                [cnv_coverage.get(i, 0) for i in range(r.start, r.end)] if r else [],
+                dtype=np.int64,
+            )
         self._cnv_coverage = cnv_coverage
         self._region_coverage: Dict[Tuple[int, str], float] = {}
 
+        self._parent: Optional[Coverage] = None
+        """Coverage that is filtered by this view (`None` for the unfiltered one)."""
+        self._filter_fn: Optional[Callable] = None
+        self._quals_cache: Dict[Tuple[int, str], Optional[Counter]] = {}
+        self._indels_cache: Dict[Tuple[int, str], Optional[Tuple[int, int]]] = {}
+        self._total_cache: Dict[int, float] = {}
+        self._materialized: Optional[Dict[int, Dict[str, Counter]]] = None
+
+        # Quality score counts of all non-insertion reads in a columnar form
+        # (used for vectorized threshold filters)
+        entries = [
+            (pos, m, q, n)
+            for pos, ops in self._data.items()
+            for op, quals in ops.items()
+            if op[:3] != "ins"
+            for (m, q), n in quals.items()
+        ]
+        self._entries = np.array(entries, dtype=np.int64).reshape(-1, 4)
+        self._depth_start = min(self._data, default=0)
+        self._depth_len = max(self._data, default=-1) + 1 - self._depth_start
+        self._make_depth(np.ones(len(self._entries), dtype=bool))
+
+    def _make_depth(self, mask: Optional[np.ndarray]) -> None:
+        """
+        Calculate the total coverage of each location within the covered span
+        and its prefix sums (used for constant-time region queries).
+
+        :param mask: Mask of the columnar quality score counts that pass the filter.
+            If `None`, the totals are calculated on demand.
+        """
+        if mask is None:
+            self._depth = self._depth_sum = None
+            return
+        e = self._entries[mask]
+        self._depth = np.bincount(
+            e[:, 0] - self._depth_start, weights=e[:, 3], minlength=self._depth_len
+        )
+        self._depth_sum = np.concatenate(([0], np.cumsum(self._depth)))
+
+    @property
+    def _coverage(self) -> Dict[int, Dict[str, Counter]]:
+        """
+        Coverage of each location in the format described in :py:meth:`__init__`.
+        Filtered views are fully evaluated on the first access.
+        """
+        if self._parent is None:
+            return self._data
+        if self._materialized is None:
+            self._materialized = {
+                pos: {
+                    op: q for op in ops for q in [self._quals(pos, op)] if q is not None
+                }
+                for pos, ops in self._data.items()
+            }
+        return self._materialized
+
+    def _quals(self, pos: int, op: str) -> Optional[Counter]:
+        """:returns: Quality score counts of a mutation or `None` if not present."""
+        if self._parent is None:
+            return self._data.get(pos, {}).get(op)
+        key = pos, op
+        if key not in self._quals_cache:
+            quals = self._parent._quals(pos, op)
+            if quals is not None:
+                assert self._filter_fn
+                f = self._filter_fn(self._parent, Mutation(pos, op))
+                if isinstance(f, (Counter, list)):
+                    quals = (f if isinstance(f, Counter) else Counter(f)) or None
+                elif not f:
+                    quals = None
+            self._quals_cache[key] = quals
+        return self._quals_cache[key]
+
+    def _indel(self, pos: int, op: str) -> Optional[Tuple[int, int]]:
+        """:returns: Realigned indel coverage or `None` if not present."""
+        if self._parent is None:
+            return self._indels.get((pos, op)) if self._indels else None
+        key = pos, op
+        if key not in self._indels_cache:
+            v = self._parent._indel(pos, op)
+            if v is not None:
+                assert self._filter_fn
+                f = self._filter_fn(self._parent, Mutation(pos, op))
+                if isinstance(f, bool) and not f:
+                    v = None
+            self._indels_cache[key] = v
+        return self._indels_cache[key]
+
     def __getitem__(self, mut: Mutation) -> float:
         """:returns: Mutation coverage."""
         return self.coverage(mut)
 
     def coverage(self, mut: Mutation) -> float:
         """:returns: Mutation coverage."""
-        if self._indels and (mut.pos, mut.op) in self._indels:
-            return self._indels[mut.pos, mut.op][1]
-        if mut.pos in self._coverage and mut.op in self._coverage[mut.pos]:
-            return len(self._coverage[mut.pos][mut.op])
-        else:
-            return 0
+        indel = self._indel(mut.pos, mut.op)
+        if indel is not None:
+            return indel[1]
+        quals = self._quals(mut.pos, mut.op)
+        return sum(quals.values()) if quals is not None else 0
 
     def total(self, m) -> float:
         """:returns: Location coverage."""
         if hasattr(m, "pos") and hasattr(m, "op"):
-            if self._indels and (m.pos, m.op) in self._indels:
-                return sum(self._indels[m.pos, m.op])
+            indel = self._indel(m.pos, m.op)
+            if indel is not None:
+                return sum(indel)
             pos = m.pos
         else:
             assert isinstance(m, int), f"got {m}: {type(m)} {Mutation}"
             pos = m
-        if pos not in self._coverage:
+        if not 0 <= pos - self._depth_start < self._depth_len:
             return 0
-        return float(
-            sum(len(v) for p, v in self._coverage[pos].items() if p[:3] != "ins")
-        )
+        if self._depth is not None:
+            return float(self._depth[pos - self._depth_start])
+        if pos not in self._total_cache:
+            self._total_cache[pos] = float(
+                sum(
+                    n
+                    for op in self._data.get(pos, {})
+                    if op[:3] != "ins"
+                    for q in [self._quals(pos, op)]
+                    if q is not None
+                    for n in q.values()
+                )
+            )
+        return self._total_cache[pos]
+
+    def region_total(self, start: int, end: int) -> float:
+        """:returns: Total coverage of the locations within `[start, end)`."""
+        n = self._depth_len
+        start = min(n, max(0, start - self._depth_start))
+        end = min(n, max(start, end - self._depth_start))
+        if self._depth_sum is None:
+            return sum(self.total(self._depth_start + i) for i in range(start, end))
+        return float(self._depth_sum[end] - self._depth_sum[start])
 
     def percentage(self, m: Mutation) -> float:
         """:returns: Mutation coverage expressed as percentage (0-100%)."""
@@ -112,9 +233,9 @@ class Coverage:
 
     def average_coverage(self) -> float:
         """:returns: Average coverage of the gene."""
-        return sum(self.total(pos) for pos in self._coverage) / float(
-            len(self._coverage) + 0.1
-        )
+        end = self._depth_start + self._depth_len
+        total = self.region_total(self._depth_start, end)
+        return total / (len(self._data) + 0.1)
 
     def dump(self, out=None):
         """Pretty-print the coverage data."""
@@ -140,7 +261,7 @@ class Coverage:
                         f"{self.gene.chr_to_ref.get(pos, -1) + 1}\t{op}\t{p:.1f}\t{t}"
                     )
 
-    def filtered(self, filter_fn: Callable[[Any, Mutation], List]):
+    def filtered(self, filter_fn: Callable[[Any, Mutation], Union[bool, Counter]]):
         """
         :param filter_fn: Function that performs mutation filtering with the following
             arguments:
@@ -151,34 +272,33 @@ class Coverage:
                 4. thres (float): filtering threshold
 
             `filter_fn` returns `False` if a mutation should be filtered out.
+            It can also return the filtered quality score counts of a mutation
+            (see :py:meth:`quality_filter`).
 
-        :returns: Filtered coverage.
+        :returns: Filtered coverage view. The filter is evaluated on demand
+            (and memoized) for each queried mutation. The location totals of
+            :py:meth:`quality_filter` are computed with a vectorized mask.
         """
 
         new_cov = copy.copy(self)
-        new_cov._coverage = {}
-        for pos, pos_mut in self._coverage.items():
-            new_cov._coverage[pos] = {}
-            for o in pos_mut:
-                f = filter_fn(self, Mutation(pos, o))
-                if isinstance(f, list) and f:
-                    new_cov._coverage[pos][o] = f
-                elif f:
-                    assert isinstance(f, bool)
-                    new_cov._coverage[pos][o] = pos_mut[o]
-        new_cov._indels = None
-        if self._indels:
-            new_cov._indels = {}
-            for (pos, o), v in self._indels.items():
-                f = filter_fn(self, Mutation(pos, o))
-                if not (isinstance(f, bool) and not f):
-                    new_cov._indels[pos, o] = v
+        new_cov._parent, new_cov._filter_fn = self, filter_fn
+        new_cov._quals_cache, new_cov._indels_cache = {}, {}
+        new_cov._total_cache, new_cov._materialized = {}, None
+        mask = None
+        if filter_fn is Coverage.quality_filter and self._parent is None:
+            e = self._entries
+            mask = e[:, 1] >= self.profile.min_mapq
+            mask &= e[:, 2] >= self.profile.min_quality
+        new_cov._make_depth(mask)
         return new_cov
 
     def diploid_avg_coverage(self) -> float:
-        """:returns: Average coverage of the copy-number neutral region."""
+        """
+        :returns: Average coverage of the copy-number neutral region
+            (only the bases within the region are counted).
+        """
         assert self.profile.cn_region, "CN region not set"
-        return float(sum(self._cnv_coverage.values())) / abs(
+        return float(self._cnv_coverage.sum()) / abs(
             self.profile.cn_region.end - self.profile.cn_region.start
         )
 
@@ -186,10 +306,7 @@ class Coverage:
         """Normalize the sample coverage with the profile coverage."""
 
         assert self.profile.cn_region and self.profile.data, "CN region not set"
-        sam_ref = sum(
-            self._cnv_coverage[i]
-            for i in range(self.profile.cn_region.start, self.profile.cn_region.end)
-        )
+        sam_ref = float(self._cnv_coverage.sum())
         if sam_ref == 0:
             raise AldyException(
                 f"CN-neutral region {self.profile.cn_region} has no reads. "
@@ -204,7 +321,7 @@ class Coverage:
         self._region_coverage = {}
         for gene, gr in enumerate(self.gene.regions):
             for region, rng in gr.items():
-                s = sum(self.total(i) for i in range(rng.start, rng.end))
+                s = self.region_total(rng.start, rng.end)
                 p = self.profile.data[self.gene.name][region][gene]
                 p /= 2  # profile has 2 copies, so divide it with 2 for normalization
                 self._region_coverage[gene, region] = (ratio * s / p) if p != 0 else 0.0
@@ -218,12 +335,18 @@ class Coverage:
         sz = self.coverage(mut)
         return sz >= min_cov
 
-    def quality_filter(self, mut: Mutation) -> List:
-        """Basic quality filter."""
-        quals = self._coverage.get(mut.pos, {}).get(mut.op, [])
-        return [
-            (m, q)
-            for m, q in quals
-            if q >= self.profile.min_quality
-            if m >= self.profile.min_mapq
-        ]
+    def quality_filter(self, mut: Mutation) -> Counter:
+        """
+        Basic quality filter.
+
+        :returns: Quality score counts that pass the profile quality thresholds.
+        """
+        quals = self._quals(mut.pos, mut.op) or {}
+        return Counter(
+            {
+                (m, q): n
+                for (m, q), n in quals.items()
+                if q >= self.profile.min_quality
+                if m >= self.profile.min_mapq
+            }
+        )
@@ -4,15 +4,22 @@
 #   file 'LICENSE', which is part of this source code package.
 
 
-from typing import Tuple, Dict, List, Optional, Set, NamedTuple
+from typing import Tuple, Dict, List, Optional, Set, NamedTuple, Iterator
 from dataclasses import dataclass, field
 from enum import Enum
 from natsort import natsorted
 import os
 import yaml
+import bisect
+import pickle
+import hashlib
+import tempfile
 import collections
+import collections.abc
+import numpy as np
 
 from .common import (
+    PROTEINS,
     GRange,
     AldyException,
     allele_name,
@@ -22,6 +29,7 @@ from .common import (
     log,
     freezekey,
 )
+from .version import __version__
 
 
 class Mutation(NamedTuple):
@@ -154,9 +162,9 @@ class Gene:
     """Reference genome chromosome."""
     strand: int
     """RefSeq sequence strand within the reference genome."""
-    chr_to_ref: Dict[int, int]
+    chr_to_ref: "CoordinateMap"
     """Position mapping from the reference to the RefSeq sequence."""
-    ref_to_chr: Dict[int, int]
+    ref_to_chr: "CoordinateMap"
     """Position mapping from the RefSeq sequence to the reference."""
     pseudogenes: List[str]
     """Pseudogene names. A pseudogene has ID greater than zero."""
@@ -226,6 +234,10 @@ class Gene:
         if not yml or not name:
             raise AldyException("Either a path or a name should be given")
 
+        cache = _cache_path(name, yml, genome)
+        if cache and self._load_cache(cache):
+            return
+
         yml = yaml.safe_load(yml)
         self._yml = yml  # for debugging / raw API access
         if genome:
@@ -233,13 +245,58 @@ class Gene:
         else:
             self.genome = list(yml["reference"]["mappings"].keys())[0]  # type: ignore
         self._init_basic(yml)
+        self._init_effects()
         self._init_regions(yml)
         self._init_alleles(yml)
         self._init_partials()
+        if cache:
+            self._save_cache(cache)
+
+    def _load_cache(self, path: str) -> bool:
+        """
+        Load the fully initialized gene from the compiled gene cache.
+
+        :returns: `True` if the cached gene was loaded.
+        """
+
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as fd:
+                self.__dict__.update(pickle.load(fd))
+            log.trace("[gene] loaded {} from cache {}", self.name, path)
+            return True
+        except Exception as ex:
+            log.debug("[gene] cannot load cache {}: {}", path, ex)
+            return False
+
+    def _save_cache(self, path: str) -> None:
+        """
+        Store the gene in the compiled gene cache.
+        Stale cache files of the same gene and genome are removed.
+        """
+
+        try:
+            d, f = os.path.split(path)
+            os.makedirs(d, exist_ok=True)
+            prefix = f.rsplit(".", 1)[0]
+            for old in os.listdir(d):
+                if old.startswith(f"{prefix}.") and old != f:
+                    os.remove(os.path.join(d, old))
+            # Write atomically as other processes might read the cache concurrently
+            with tempfile.NamedTemporaryFile("wb", dir=d, delete=False) as fd:
+                pickle.dump(self.__dict__, fd, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(fd.name, path)
+            log.trace("[gene] saved {} to cache {}", self.name, path)
+        except Exception as ex:
+            log.debug("[gene] cannot save cache {}: {}", path, ex)
 
     def region_at(self, pos: int) -> Optional[Tuple[int, str]]:
         """:returns: Gene ID and a region that covers the position."""
-        return self._region_at.get(pos, None)
+        i = bisect.bisect_right(self._region_starts, pos) - 1
+        if i >= 0 and pos < self._region_ends[i]:
+            return self._region_names[i]
+        return None
 
     def _reverse_op(self, op: str) -> str:
         if ">" in op:
@@ -262,9 +319,9 @@ class Gene:
             return self.mutations[pos, op][0]
 
         # Calculate based on aminoacid change
-        if pos not in self.chr_to_ref:
+        pos = self.chr_to_ref.get(pos)
+        if pos is None:
             return None
-        pos = self.chr_to_ref[pos]
         if infer and any(s <= pos < e for s, e in self.exons):
             if ">" not in op:
                 return "indel"
@@ -275,18 +332,7 @@ class Gene:
                 return None
             if self.seq[pos] != op[0]:
                 log.warn(f"Bad mutation: {op[0]} != {self.seq[pos]}")
-            seq = "".join(
-                (
-                    self.seq[s:pos] + op[2] + self.seq[pos + 1 : e]
-                    if s <= pos < e
-                    else self.seq[s:e]
-                )
-                for s, e in self.exons
-            )
-            amino = seq_to_amino(seq)
-            if amino != self.aminoacid:
-                pos = next(i for i, a in enumerate(amino) if a != self.aminoacid[i])
-                return f"{self.aminoacid[pos]}{pos + 1}{amino[pos]}"
+            return self._effects.get((pos, op[2]))
         return None
 
     def is_functional(self, mut, infer=True) -> bool:
@@ -407,17 +453,18 @@ class Gene:
             self.seq = "".join(seq)
 
         self.chr, start, end, strand, cigar = yml["reference"]["mappings"][self.genome]
-        self.chr_to_ref = {}
-        self.ref_to_chr = {}
         self.strand = 1 if strand == "+" else -1
         pos_ref = 0 if self.strand > 0 else (len(self.seq) - 1)
         pos_chr = start - 1
+        chr_blocks, ref_blocks = [], []
         for i in cigar.split():
             op, sz = i[0], int(i[1:])
             if op == "M":
-                for idx in range(sz):
-                    self.chr_to_ref[pos_chr + idx] = pos_ref + idx * self.strand
-                    self.ref_to_chr[pos_ref + idx * self.strand] = pos_chr + idx
+                chr_blocks.append((pos_chr, sz, pos_ref, self.strand))
+                if self.strand > 0:
+                    ref_blocks.append((pos_ref, sz, pos_chr, 1))
+                else:
+                    ref_blocks.append((pos_ref - sz + 1, sz, pos_chr + sz - 1, -1))
                 pos_chr += sz
                 pos_ref += sz * self.strand
             elif op == "I":
@@ -426,24 +473,43 @@ class Gene:
                 pos_chr += sz
             else:
                 raise AldyException("Invalid CIGAR string")
+        self.chr_to_ref = CoordinateMap(chr_blocks)
+        self.ref_to_chr = CoordinateMap(ref_blocks)
 
         self._lookup_range = (start - 1, end - 1)
-        self._lookup_seq = "".join(
-            (
-                (
-                    rev_comp(self.seq[self.chr_to_ref[i]])
-                    if self.strand < 0
-                    else self.seq[self.chr_to_ref[i]]
-                )
-                if i in self.chr_to_ref
-                else "N"
-            )
-            for i in range(*self._lookup_range)
-        )
+        lookup = np.full(end - start, "N", dtype="U1")
+        for st, sz, ref, _ in chr_blocks:
+            if self.strand > 0:
+                block = self.seq[ref : ref + sz]
+            else:
+                block = rev_comp(self.seq[ref - sz + 1 : ref + 1])
+            st -= self._lookup_range[0]
+            block = block[max(0, -st) : len(lookup) - st]
+            st = max(0, st)
+            lookup[st : st + len(block)] = list(block)
+        self._lookup_seq = "".join(lookup)
 
         self.exons = sorted((s - 1, e - 1) for [s, e] in yml["reference"]["exons"])
         self.aminoacid = seq_to_amino("".join(self.seq[s:e] for [s, e] in self.exons))
 
+    def _init_effects(self) -> None:
+        """
+        Precompute the aminoacid change of each SNV within the coding sequence.
+        Used by :py:meth:`get_functional` to avoid translating the whole coding
+        sequence for every novel SNV.
+        """
+
+        self._effects: Dict[Tuple[int, str], str] = {}
+        cds = [i for s, e in self.exons for i in range(s, e)]
+        for ci in range(0, len(cds) - len(cds) % 3, 3):
+            codon = [self.seq[i] for i in cds[ci : ci + 3]]
+            aa = self.aminoacid[ci // 3]
+            for j in range(3):
+                for nuc in "ACGT":
+                    alt = PROTEINS["".join(codon[:j] + [nuc] + codon[j + 1 :])]
+                    if alt != aa:
+                        self._effects[cds[ci + j], nuc] = f"{aa}{ci // 3 + 1}{alt}"
+
     def _init_regions(self, yml) -> None:
         """
         Calculate the genic regions and pseudogenes (`regions`, `unique_regions`
@@ -474,9 +540,6 @@ class Gene:
                 dict(sorted(regions.items(), key=lambda x: x[1])[:: self.strand])
             )
 
-        #: dict[int, (int, str)]:
-        #: reverse lookup (gene, region) of gene regions given a location
-        #: within the reference genome.
         for d in self.regions:
             regs = sorted((r.start, r.end) for r in d.values())
             for ri in range(1, len(regs)):
@@ -484,17 +547,41 @@ class Gene:
                     raise AldyException(
                         "Region {}-{} is not annotated", regs[ri - 1][1], regs[ri][0]
                     )
-        self._region_at = {
-            i: (g, r)
+
+        # Interval index for the reverse lookup (gene, region) of gene regions given
+        # a location within the reference genome (see `region_at`).
+        # Regions are split into disjoint intervals; if the regions overlap,
+        # the last specified region is used.
+        intervals = [
+            (rng.start, rng.end, (g, r))
             for g, d in enumerate(self.regions)
             for r, rng in d.items()
-            for i in range(rng.start, rng.end)
-        }
-        for i in self.chr_to_ref:
-            if i not in self._region_at:
-                raise AldyException(
-                    f"Position {i} not within a named region of {self.name}"
-                )
+            if rng.start < rng.end
+        ]
+        bounds = sorted({b for s, e, _ in intervals for b in (s, e)})
+        self._region_starts: List[int] = []
+        self._region_ends: List[int] = []
+        self._region_names: List[Tuple[int, str]] = []
+        for s, e in zip(bounds, bounds[1:]):
+            v = next((v for i, j, v in reversed(intervals) if i <= s < j), None)
+            if v is None:
+                continue
+            if self._region_ends and self._region_ends[-1] == s:
+                if self._region_names[-1] == v:  # extend the previous interval
+                    self._region_ends[-1] = e
+                    continue
+            self._region_starts.append(s)
+            self._region_ends.append(e)
+            self._region_names.append(v)
+        for pos, sz in zip(self.chr_to_ref.starts, self.chr_to_ref.sizes):
+            pos, end = int(pos), int(pos + sz)
+            while pos < end:
+                i = bisect.bisect_right(self._region_starts, pos) - 1
+                if i < 0 or pos >= self._region_ends[i]:
+                    raise AldyException(
+                        f"Position {pos} not within a named region of {self.name}"
+                    )
+                pos = self._region_ends[i]
         self.unique_regions = yml["structure"]["cn_regions"]
 
     def _init_alleles(self, yml) -> None:
@@ -865,3 +952,83 @@ class Gene:
             v.alleles.clear()
         for a in self.alleles.values():
             self.cn_configs[a.cn_config].alleles.add(a.name)
+
+
+def _cache_path(name: str, yml: str, genome: Optional[str]) -> Optional[str]:
+    """
+    Compiled gene cache location.
+    The cache is stored in `$ALDY_CACHE` (if set) or in the user cache directory
+    (`$XDG_CACHE_HOME/aldy` or `~/.cache/aldy`). Set `ALDY_CACHE` to an empty string
+    to disable the cache.
+
+    :returns: Cache file path that is keyed by the YAML contents, the reference genome,
+        Aldy version and the sources of this module and :py:mod:`aldy.common`
+        (as cached genes depend on them), or `None` if the cache is disabled.
+    """
+
+    cache_dir = os.environ.get("ALDY_CACHE")
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "aldy"
+        )
+    if not cache_dir:
+        return None
+    key = hashlib.sha256()
+    for src in ["gene.py", "common.py"]:
+        with open(os.path.join(os.path.dirname(__file__), src), "rb") as fd:
+            key.update(fd.read())
+    for k in [__version__, name, str(genome), str(pickle.HIGHEST_PROTOCOL), yml]:
+        key.update(k.encode())
+        key.update(b"\0")
+    name = name.replace(os.sep, "_")
+    return os.path.join(cache_dir, f"{name}.{genome or 'default'}.{key.hexdigest()}")
+
+
+class CoordinateMap(collections.abc.Mapping):
+    """
+    Read-only position mapping between two coordinate systems (e.g., between the
+    reference genome and the RefSeq sequence) that consists of contiguous blocks
+    (e.g., CIGAR matches). Behaves like a dictionary that maps each position to its
+    counterpart, but uses only a few integers per block.
+    """
+
+    def __init__(self, blocks: List[Tuple[int, int, int, int]]):
+        """
+        :param blocks: List of blocks in `(start, size, target, step)` format where
+            the block maps `start + i` to `target + i * step` for each
+            `0 <= i < size`.
+        """
+
+        blocks = sorted(b for b in blocks if b[1] > 0)
+        self.starts = np.array([b[0] for b in blocks], dtype=np.int64)
+        """Sorted block start positions."""
+        self.sizes = np.array([b[1] for b in blocks], dtype=np.int64)
+        """Block sizes."""
+        self.targets = np.array([b[2] for b in blocks], dtype=np.int64)
+        """Mapped positions of block starts."""
+        self.steps = np.array([b[3] for b in blocks], dtype=np.int64)
+        """Block directions (1 or -1)."""
+        self._starts = [b[0] for b in blocks]  # for fast scalar lookups
+        self._len = int(self.sizes.sum())
+
+    def __getitem__(self, pos: int) -> int:
+        if not isinstance(pos, (int, np.integer)):
+            raise KeyError(pos)
+        i = bisect.bisect_right(self._starts, pos) - 1
+        if i < 0 or pos >= self._starts[i] + self.sizes[i]:
+            raise KeyError(pos)
+        return int(self.targets[i] + (pos - self._starts[i]) * self.steps[i])
+
+    def __iter__(self) -> Iterator[int]:
+        for st, sz in zip(self._starts, self.sizes):
+            yield from range(st, st + int(sz))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def bounds(self) -> Tuple[int, int]:
+        """:returns: The smallest and the largest mapped position."""
+        return self._starts[0], int((self.starts + self.sizes).max()) - 1
+
+    def __repr__(self):
+        return f"CoordinateMap({len(self.starts)} blocks, {self._len} positions)"
@@ -4,11 +4,15 @@
 #   file 'LICENSE', which is part of this source code package.
 
 
-from typing import List, Optional, Any, Set, Dict
+from typing import List, Optional, Any, Set, Dict, Tuple
 import os
+import io
 import sys
 import importlib.resources
+import concurrent.futures
+import contextlib
 import datetime
+import logbook
 import time
 
 from . import sam
@@ -45,6 +49,9 @@ def genotype(
     report: bool = False,
     genome=None,
     is_simple: bool = False,
+    sample: Optional[sam.Sample] = None,
+    jobs: int = 1,
+    allow_pickle: bool = False,
     **params,
 ) -> Dict[str, List[solutions.MinorSolution]]:
     """Genotype a sample.
@@ -75,6 +82,17 @@ def genotype(
         Default: `None` (auto-detect).
     :param is_simple: Use simple output format.
         Default: `False`.
+    :param sample: Pre-loaded sample (see :py:func:`aldy.sam.load_samples`).
+        Default: `None` (load the sample from `sam_path`).
+    :param jobs: Number of genes to genotype in parallel (each in its own process).
+        The results, logs and debug information are reported in the gene order
+        regardless of the job completion order.
+        When genotyping a single gene, the number of minor star-allele models to
+        solve in parallel (see :py:func:`aldy.minor.estimate_minor`).
+        Default: 1.
+    :param allow_pickle: Allow loading the older (pickled) dump files.
+        Only use it for the dumps from the trusted sources.
+        Default: `False`.
     :param params: Model parameters. See :py:mod:`aldy.profile` for details.
     """
 
@@ -86,7 +104,10 @@ def genotype(
 
     with open(sam_path):  # Check if file exists
         pass
-    kind, g = sam.detect_genome(sam_path)
+    if sample:
+        kind, g = sample.kind, sample.genome
+    else:
+        kind, g = sam.detect_genome(sam_path)
     if genome is None:
         genome = g
         if not genome:
@@ -96,100 +117,83 @@ def genotype(
     if genome not in ["hg19", "hg38"]:
         raise AldyException(f"Unknown genome {genome}")
 
-    avail_genes = []
-    if gene_db == "all":
-        avail_genes = [
-            p.as_posix()
-            for p in importlib.resources.files("aldy.resources.genes").iterdir()
-        ]
-        avail_genes = [
-            i[:-4]
-            for i in avail_genes
-            if len(i) > 4 and i.endswith(".yml") and not i.startswith("pharma-")
-        ]
-        avail_genes = sorted(avail_genes)
-    elif gene_db == "pharmacoscan":
-        avail_genes = [
-            p.as_posix()
-            for p in importlib.resources.files(
-                "aldy.resources.genes.pharmacoscan"
-            ).iterdir()
-        ]
-        avail_genes = [
-            f"pharmacoscan/{i[:-4]}" for i in avail_genes if i.endswith(".yml")
-        ]
-        avail_genes = sorted(avail_genes)
-    else:
-        avail_genes = gene_db.lower().split(",")
+    avail_genes = _gene_list(gene_db)
     if len(avail_genes) != 1:
+        samples: Dict[str, Any] = {}
+        if kind == "sam":
+            samples = _load_samples(
+                avail_genes,
+                sam_path,
+                profile_name,
+                cn_region,
+                cn_solution,
+                reference,
+                debug,
+                genome,
+                params,
+            )
         res: Dict = {}
-        for a in avail_genes:
-            log.warn("=" * 50)
-            log.warn("Gene {}", a.upper())
-            try:
-                res = {
-                    **res,
-                    **genotype(
-                        a,
-                        sam_path,
-                        profile_name,
-                        output_file,
-                        cn_region,
-                        cn_solution,
-                        solver,
-                        reference,
-                        debug,
-                        multiple_warn_level,
-                        report,
-                        genome,
-                        is_simple,
-                        **params,
-                    ),
-                }
-            except AldyException as ex:
-                log.error(f"Failed gene {a.upper()}")
-                log.error(f"Message: {str(ex)}")
-            log.warn("")
+        params = dict(params, allow_pickle=allow_pickle)
+        pool = concurrent.futures.ProcessPoolExecutor(jobs) if jobs > 1 else None
+        try:
+            tasks: List[Any] = []
+            for a in avail_genes:
+                args = (
+                    a,
+                    sam_path,
+                    profile_name,
+                    output_file,
+                    cn_region,
+                    cn_solution,
+                    solver,
+                    reference,
+                    debug,
+                    multiple_warn_level,
+                    report,
+                    genome,
+                    is_simple,
+                    samples.get(a),
+                )
+                if pool:
+                    # Output files cannot be shared between the processes
+                    job_args = args[:3] + (output_file and output_file.name,) + args[4:]
+                    tasks.append(pool.submit(_genotype_job, job_args, params))
+                else:
+                    tasks.append(args)
+            for a, task in zip(avail_genes, tasks):
+                log.warn("=" * 50)
+                log.warn("Gene {}", a.upper())
+                try:
+                    if pool:
+                        r = _collect_job(task.result(), output_file)
+                    else:
+                        if isinstance(task[-1], AldyException):
+                            raise task[-1]
+                        r = genotype(*task, **params)
+                    res = {**res, **r}
+                except AldyException as ex:
+                    log.error(f"Failed gene {a.upper()}")
+                    log.error(f"Message: {str(ex)}")
+                log.warn("")
+        finally:
+            if pool:
+                pool.shutdown()
         return res
-    else:
-        db_file = script_path(
-            "aldy.resources.genes", "{}.yml".format(avail_genes[0].lower())
-        )
-
-    # Load the gene specification
-    if os.path.exists(db_file):
-        gene_db = db_file
-    with open(gene_db):  # Check if file exists
-        pass
-    gene = Gene(gene_db, genome=genome)
-
-    if profile_name in ["exome", "wxs", "wes"]:
-        gene.do_copy_number = False
-        profile_name = "illumina"
-        params["min_coverage"] = 5.0
-    elif profile_name == "wgs":
-        profile_name = "illumina"
-    elif profile_name == "pgrnseq-v1":
-        profile_name = "pgx1"
-    elif profile_name == "pgrnseq-v2":
-        profile_name = "pgx2"
-    elif profile_name == "pgrnseq-v3":
-        profile_name = "pgx3"
 
-    if kind in ["vcf", "pscan"]:
-        log.warn("WARNING: Using VCF file. Copy-number calling is not available.")
-        profile = Profile("user_provided", cn_solution=["1", "1"], **params)
-        sample = sam.Sample(gene, profile, sam_path, debug=debug)
+    if sample:
+        gene, profile = sample.gene, sample.profile
     else:
-        if cn_solution:
-            profile = Profile("user_provided", cn_solution=cn_solution, **params)
-        elif kind != "dump":
-            if not profile_name:
-                raise AldyException("Profile not provided")
-            profile = Profile.load(gene, profile_name, cn_region, **params)
+        gene = _load_gene(avail_genes[0], genome)
+        profile = _load_profile(
+            gene, kind, profile_name, cn_region, cn_solution, params
+        )
+        if kind in ["vcf", "pscan"]:
+            log.warn("WARNING: Using VCF file. Copy-number calling is not available.")
+            sample = sam.Sample(gene, profile, sam_path, debug=debug)
         else:
-            profile = None
-        sample = sam.Sample(gene, profile, sam_path, reference, debug)
+            sample = sam.Sample(
+                gene, profile, sam_path, reference, debug, allow_pickle=allow_pickle
+            )
     profile = sample.profile  # if loaded for a dump
     assert profile, "Profile not set"
     if kind == "dump":
@@ -281,6 +285,8 @@ def genotype(
             m.solution,
             m.cn_solution,
             m.added,
+            m.status,
+            m.proven_gap,
         )
         for m in major_sols
     ]
@@ -309,6 +315,8 @@ def genotype(
         major_sols,
         solver,
         max_solutions=profile.max_minor_solutions,
+        debug=debug,
+        jobs=jobs,
     ):
         n = solutions.MinorSolution(
             m.score
@@ -316,6 +324,8 @@ def genotype(
             m.solution,
             m.major_solution,
             profile=profile,
+            status=m.status,
+            proven_gap=m.proven_gap,
         )
         n.set_diplotype(m.get_diplotype())
         minor_sols.append(n)
@@ -343,6 +353,12 @@ def genotype(
 
     if multiple_warn_level >= 1 and len(minor_sols) > 1:
         log.warn("WARNING: multiple optimal solutions found!")
+    limits = {(s, t): g for m in minor_sols for s, t, g in m.time_limits()}
+    for (s, t), g in limits.items():
+        log.warn(
+            f"WARNING: {s} solver reached the {t} limit (gap= {g:.2%}); "
+            + "the reported solutions might not be optimal"
+        )
     log.info(
         f"{{}} {gene.name} star-alleles for {sample.name}:",
         "Best" if len(minor_sols) == 1 else "Potential",
@@ -362,7 +378,12 @@ def genotype(
             minor_sol.get_minor_diplotype(legacy=True).replace(" ", ""),
         ]
         if is_aldy:
-            print(f"#Solution {i + 1}: {minor_sol._solution_nice()}", file=output_file)
+            note = time_limit_note(minor_sol)
+            print(
+                f"#Solution {i + 1}: {minor_sol._solution_nice()}"
+                + (f" ({note})" if note else ""),
+                file=output_file,
+            )
             diplotype.write_decomposition(
                 sample.name, gene, sample.coverage, i + 1, minor_sol, output_file
             )
@@ -430,3 +451,441 @@ def genotype(
 
     log.debug("[genotype] gene={}; took={}", gene_db, time.time() - t1)
     return {gene_db: minor_sols}
+
+
+def time_limit_note(sol: solutions.MinorSolution) -> str:
+    """
+    :returns: Description of the solver time or gap limits that were reached while
+        calling `sol` (empty if all solvers completed).
+    """
+    return "; ".join(f"{s} {t} limit, gap={g:.2%}" for s, t, g in sol.time_limits())
+
+
+BATCH_COLS = [
+    "Sample",
+    "Gene",
+    "SolutionID",
+    "Major",
+    "Minor",
+    "Legacy",
+    "Status",
+]
+"""Columns of the batch summary table."""
+
+
+def batch(
+    samples: List[Tuple[str, str]],
+    gene_db: str,
+    profile_name: Optional[str],
+    output_dir: Optional[str] = None,
+    output_format: str = "aldy",
+    summary_file: Optional[Any] = None,
+    cn_region: Optional[GRange] = None,
+    cn_solution: Optional[List[str]] = None,
+    solver: str = "any",
+    reference: Optional[str] = None,
+    multiple_warn_level: int = 1,
+    genome=None,
+    jobs: int = 1,
+    **params,
+) -> List[Tuple[str, ...]]:
+    """Genotype a cohort of samples.
+    Each gene database and profile is loaded only once and shared by all samples;
+    the samples are distributed among `jobs` worker processes.
+
+    :param samples: List of samples given as (sample name, file path) tuples.
+    :param gene_db: Gene name, comma-separated list of genes or "all"
+        (see :py:func:`genotype`).
+    :param profile_name: Coverage profile (e.g. WGS).
+    :param output_dir: Directory for the per-sample output files
+        (`[output_dir]/[sample].[output_format]`). Use `None` for no output.
+        Default: `None`.
+    :param output_format: Format of the per-sample output files
+        (`aldy`, `vcf` or `simple`).
+        Default: `aldy`.
+    :param summary_file: File where the combined summary table is written
+        (see :py:data:`BATCH_COLS`). Use `None` for no summary.
+        Default: `None`.
+    :param cn_region: Copy-number neutral region.
+        Default: None (uses the provided CYP2D8 region).
+    :param cn_solution: List of the copy number configurations.
+        Default: `None`.
+    :param solver: ILP solver (see :py:mod:`aldy.lpinterface` for supported solvers).
+    :param reference: Reference genome (for reading CRAM files).
+        Default: `None`.
+    :param multiple_warn_level: Warning level (see :py:func:`genotype`).
+        Default: 1.
+    :param genome: Reference genome (e.g., hg19 or hg38).
+        Default: `None` (auto-detect for each sample).
+    :param jobs: Number of samples to genotype in parallel.
+        The summary and the logs are reported in the sample order
+        regardless of the job completion order.
+        Default: 1.
+    :param params: Model parameters. See :py:mod:`aldy.profile` for details.
+    :returns: Summary table rows (see :py:data:`BATCH_COLS`).
+    :raise: :py:class:`aldy.common.AldyException` if the output format or a sample
+        genome is invalid.
+    """
+
+    if output_format not in ["aldy", "vcf", "simple"]:
+        raise AldyException(f"Unknown output format {output_format}")
+    _ = lp_model("init", solver)
+
+    # Detect the sample formats and genomes first to know which models are needed
+    tasks = []
+    for name, path in samples:
+        with open(path):  # Check if file exists
+            pass
+        kind, g = sam.detect_genome(path)
+        g = genome or g
+        if not g:
+            log.warn(f"WARNING: Cannot detect genome of {name}, defaulting to hg19.")
+            g = "hg19"
+        if g not in ["hg19", "hg38"]:
+            raise AldyException(f"Unknown genome {g} for sample {name}")
+        output = None
+        if output_dir:
+            output = os.path.join(output_dir, f"{name}.{output_format}")
+        tasks.append((name, path, kind, g, output))
+
+    genes = _gene_list(gene_db)
+    models: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for _, _, kind, g, _ in tasks:
+        if (kind, g) in models:
+            continue
+        models[kind, g] = {}
+        for a in genes:
+            try:
+                gene = _load_gene(a, g)
+                profile = _load_profile(
+                    gene, kind, profile_name, cn_region, cn_solution, dict(params)
+                )
+                models[kind, g][a] = (gene, profile)
+            except (AldyException, IOError) as ex:
+                models[kind, g][a] = AldyException(str(ex))
+    log.debug("[batch] loaded {} models for {} samples", len(models), len(tasks))
+
+    options = dict(
+        profile_name=profile_name,
+        cn_region=cn_region,
+        cn_solution=cn_solution,
+        solver=solver,
+        reference=reference,
+        multiple_warn_level=multiple_warn_level,
+        is_simple=output_format == "simple",
+        **params,
+    )
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if summary_file:
+        print("\t".join(BATCH_COLS), file=summary_file)
+
+    rows: List[Tuple[str, ...]] = []
+    pool = None
+    if jobs > 1:
+        # Models are sent to each worker only once
+        pool = concurrent.futures.ProcessPoolExecutor(
+            jobs, initializer=_batch_init, initargs=(models,)
+        )
+    else:
+        _batch_init(models)
+    try:
+        futures: List[Any] = [
+            pool.submit(_batch_job, task, options, True) if pool else task
+            for task in tasks
+        ]
+        for i, (task, future) in enumerate(zip(tasks, futures)):
+            log.warn("=" * 50)
+            log.warn("Sample {} ({} of {})", task[0], i + 1, len(tasks))
+            if pool:
+                result, records = future.result()
+                for r in records:
+                    log.handle(logbook.LogRecord.from_dict(r))
+            else:
+                result, _ = _batch_job(task, options)
+            for row in result:
+                if summary_file:
+                    print("\t".join(row), file=summary_file)
+            rows += result
+            log.warn("")
+    finally:
+        if pool:
+            pool.shutdown()
+        _batch_init({})
+    return rows
+
+
+_batch_models: Dict[Tuple[str, str], Dict[str, Any]] = {}
+"""Gene and profile instances shared by the batch jobs within a process."""
+
+
+def _batch_init(models: Dict[Tuple[str, str], Dict[str, Any]]):
+    """Set up the shared batch models (see :py:func:`batch`)."""
+
+    global _batch_models
+    _batch_models = models
+
+
+def _batch_job(task: tuple, options: Dict, capture: bool = False) -> tuple:
+    """
+    Genotype all genes of a single sample (see :py:func:`batch`).
+
+    :param task: Tuple consisting of the sample name, path, kind, genome and the
+        output file path.
+    :param options: Genotyping options (see :py:func:`genotype`).
+    :param capture: If set, capture the log records and return them to the caller
+        (used by the worker processes).
+    :returns: Tuple consisting of the summary table rows and the captured log
+        records.
+    """
+
+    name, path, kind, genome, output = task
+    models = _batch_models[kind, genome]
+    json.clear()  # Debug information is not kept between the samples
+    handler = logbook.TestHandler(level="TRACE", bubble=False)
+    rows: List[Tuple[str, ...]] = []
+    with contextlib.ExitStack() as stack:
+        if capture:
+            stack.enter_context(handler.applicationbound())
+        output_file = stack.enter_context(open(output, "w")) if output else None
+
+        # Load all short-read samples in a single pass
+        samples: Dict[str, Any] = {}
+        loaded = {
+            a: m
+            for a, m in models.items()
+            if not isinstance(m, AldyException)
+            and kind == "sam"
+            and m[1]
+            and not m[1].sam_long_reads
+        }
+        if loaded:
+            ss = sam.load_samples(list(loaded.values()), path, options["reference"])
+            samples = dict(zip(loaded, ss))
+        for a, m in models.items():
+            try:
+                if isinstance(m, AldyException):
+                    raise m
+                if a in samples:
+                    sample = samples[a]
+                    if isinstance(sample, AldyException):
+                        raise sample
+                elif kind in ["vcf", "pscan"]:
+                    sample = sam.Sample(m[0], m[1], path)
+                else:
+                    sample = sam.Sample(
+                        m[0],
+                        m[1],
+                        path,
+                        options["reference"],
+                        allow_pickle=options.get("allow_pickle", False),
+                    )
+                sols = genotype(
+                    a,
+                    path,
+                    output_file=output_file,
+                    genome=genome,
+                    sample=sample,
+                    **options,
+                )[a]
+                for i, sol in enumerate(sols):
+                    note = time_limit_note(sol)
+                    rows.append(
+                        (
+                            name,
+                            m[0].name,
+                            str(i + 1),
+                            sol.get_major_diplotype(),
+                            sol.get_minor_diplotype(),
+                            sol.get_minor_diplotype(legacy=True),
+                            f"OK ({note})" if note else "OK",
+                        )
+                    )
+            except AldyException as ex:
+                gene = m[0].name if isinstance(m, tuple) else a.upper()
+                log.error(f"Failed gene {gene} in sample {name}")
+                log.error(f"Message: {str(ex)}")
+                msg = " ".join(str(ex).split())
+                rows.append((name, gene, "", "", "", "", f"Error: {msg}"))
+    return rows, [r.to_dict() for r in handler.records]
+
+
+def _gene_list(gene_db: str) -> List[str]:
+    """
+    :returns: List of genes described by `gene_db` (a gene name, a comma-separated
+        list of genes, "all" for all supported genes or "pharmacoscan" for all
+        Pharmacoscan genes).
+    """
+
+    if gene_db == "all":
+        avail_genes = [
+            p.as_posix()
+            for p in importlib.resources.files("aldy.resources.genes").iterdir()
+        ]
+        avail_genes = [
+            i[:-4]
+            for i in avail_genes
+            if len(i) > 4 and i.endswith(".yml") and not i.startswith("pharma-")
+        ]
+        avail_genes = sorted(avail_genes)
+    elif gene_db == "pharmacoscan":
+        avail_genes = [
+            p.as_posix()
+            for p in importlib.resources.files(
+                "aldy.resources.genes.pharmacoscan"
+            ).iterdir()
+        ]
+        avail_genes = [
+            f"pharmacoscan/{i[:-4]}" for i in avail_genes if i.endswith(".yml")
+        ]
+        avail_genes = sorted(avail_genes)
+    else:
+        avail_genes = gene_db.lower().split(",")
+    return avail_genes
+
+
+def _load_gene(gene_db: str, genome: str) -> Gene:
+    """
+    Load a gene database.
+
+    :param gene_db: Gene name (if it is shipped with Aldy)
+        or the location of the gene database in YAML format.
+    :param genome: Reference genome (e.g., hg19 or hg38).
+    """
+
+    db_file = script_path("aldy.resources.genes", "{}.yml".format(gene_db.lower()))
+    if os.path.exists(db_file):
+        gene_db = db_file
+    with open(gene_db):  # Check if file exists
+        pass
+    return Gene(gene_db, genome=genome)
+
+
+def _load_profile(
+    gene: Gene,
+    kind: str,
+    profile_name: Optional[str],
+    cn_region: Optional[GRange],
+    cn_solution: Optional[List[str]],
+    params: Dict,
+) -> Optional[Profile]:
+    """
+    Load the sequencing profile for a gene.
+
+    .. note:: `gene` and `params` might be modified (e.g., for exome profiles).
+
+    :returns: Profile instance or `None` if the profile is stored in a dump file.
+    :raise: :py:class:`aldy.common.AldyException` if the profile is not provided.
+    """
+
+    if profile_name in ["exome", "wxs", "wes"]:
+        gene.do_copy_number = False
+        profile_name = "illumina"
+        params["min_coverage"] = 5.0
+    elif profile_name == "wgs":
+        profile_name = "illumina"
+    elif profile_name == "pgrnseq-v1":
+        profile_name = "pgx1"
+    elif profile_name == "pgrnseq-v2":
+        profile_name = "pgx2"
+    elif profile_name == "pgrnseq-v3":
+        profile_name = "pgx3"
+
+    if kind in ["vcf", "pscan"]:
+        return Profile("user_provided", cn_solution=["1", "1"], **params)
+    elif cn_solution:
+        return Profile("user_provided", cn_solution=cn_solution, **params)
+    elif kind != "dump":
+        if not profile_name:
+            raise AldyException("Profile not provided")
+        return Profile.load(gene, profile_name, cn_region, **params)
+    return None
+
+
+def _load_samples(
+    genes: List[str],
+    sam_path: str,
+    profile_name: Optional[str],
+    cn_region: Optional[GRange],
+    cn_solution: Optional[List[str]],
+    reference: Optional[str],
+    debug: Optional[str],
+    genome: str,
+    params: Dict,
+) -> Dict[str, Any]:
+    """
+    Load the samples of multiple genes from a SAM/BAM/CRAM file in a single pass.
+    Genes that cannot be loaded (or that require long-read processing) are skipped
+    and later loaded separately by :py:func:`genotype`.
+
+    :returns: Dictionary that maps a gene to its sample.
+    """
+
+    loaded = {}
+    for a in genes:
+        try:
+            gene = _load_gene(a, genome)
+            profile = _load_profile(
+                gene, "sam", profile_name, cn_region, cn_solution, dict(params)
+            )
+        except (AldyException, IOError):
+            continue  # will be reported by the per-gene genotyping
+        if profile and not profile.sam_long_reads:
+            loaded[a] = (gene, profile)
+    if not loaded:
+        return {}
+
+    samples = sam.load_samples(list(loaded.values()), sam_path, reference, debug)
+    return dict(zip(loaded, samples))
+
+
+def _genotype_job(args: tuple, params: Dict) -> tuple:
+    """
+    Genotype a single gene within a worker process (see :py:func:`genotype`).
+    The output, the debug information and the log records are captured and returned
+    to the parent process.
+
+    :returns: Tuple consisting of the genotyping result (or an
+        :py:class:`aldy.common.AldyException` on failure), the debug information,
+        the output contents and the log records.
+    """
+
+    args, sample = list(args), args[-1]
+    buffer = None
+    if args[3]:  # Capture the output (the output file is passed by its name)
+        buffer = io.StringIO()
+        buffer.name = args[3]
+        args[3] = buffer
+    json.clear()
+    handler = logbook.TestHandler(level="TRACE", bubble=False)
+    with handler.applicationbound():
+        try:
+            if isinstance(sample, AldyException):
+                raise sample
+            result: Any = genotype(*args, **params)
+        except AldyException as ex:
+            result = ex
+    return (
+        result,
+        dict(json),
+        buffer.getvalue() if buffer else "",
+        [r.to_dict() for r in handler.records],
+    )
+
+
+def _collect_job(job: tuple, output_file: Optional[Any]) -> Dict:
+    """
+    Report the result of :py:func:`_genotype_job` within the parent process.
+
+    :raise: :py:class:`aldy.common.AldyException` if the genotyping failed.
+    """
+
+    result, debug_info, output, records = job
+    for r in records:
+        log.handle(logbook.LogRecord.from_dict(r))
+    json.update(debug_info)
+    if output_file and output:
+        output_file.write(output)
+    if isinstance(result, AldyException):
+        raise result
+    return result
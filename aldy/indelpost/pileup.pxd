@@ -1,6 +1,29 @@
 from .variant cimport Variant
 from .local_reference cimport UnsplicedLocalReference
 from pysam.libcalignmentfile cimport AlignmentFile
+from pysam.libcfaidx cimport FastaFile
+
+cdef class SharedPileup:
+    cdef readonly str chrom
+    cdef readonly int start, end
+    cdef readonly list reads
+    cdef list starts, ends, flags
+    cdef int max_span
+    cdef dict dictized
+
+    cpdef bint covers(self, str chrom, int start, int end)
+    cdef list fetch(self, int start, int end, bint exclude_duplicates)
+    cdef int count(self, int start, int end, bint exclude_duplicates)
+    cdef dict dictize(
+        self,
+        int i,
+        str chrom,
+        int pos,
+        int rpos,
+        FastaFile reference,
+        UnsplicedLocalReference unspl_loc_ref,
+        int basequalthresh,
+    )
 
 cdef tuple make_pileup(
     Variant target,
@@ -9,5 +32,6 @@ cdef tuple make_pileup(
     bint exclude_duplicates,
     int window,
     int downsamplethresh,
-    int basequalthresh
+    int basequalthresh,
+    SharedPileup shared=*
 )
@@ -7,6 +7,7 @@ cimport cython
 from cpython cimport array
 import array
 
+from bisect import bisect_left
 from  functools import partial
 from difflib import get_close_matches, SequenceMatcher
 
@@ -56,6 +57,7 @@ cdef tuple make_pileup(
     int window,
     int downsamplethresh,
     int basequalthresh,
+    SharedPileup shared=None,
 ):
     cdef str chrom
     cdef int pos
@@ -77,9 +79,18 @@ cdef tuple make_pileup(
     else:
         _chrom = chrom
 
-    pileup = fetch_reads(_chrom, pos, bam, ref_len, window, exclude_duplicates)
-    call_back = "all" if exclude_duplicates else "nofilter"
-    orig_depth = bam.count(_chrom, pos - 1, pos, read_callback=call_back)
+    fetch_start, fetch_end = max(0, pos - 1 - window), min(pos + window, ref_len)
+    if shared is not None and not shared.covers(_chrom, fetch_start, fetch_end):
+        shared = None
+
+    if shared is not None:
+        indices = shared.fetch(fetch_start, fetch_end, exclude_duplicates)
+        pileup = [shared.reads[i] for i in indices]
+        orig_depth = shared.count(pos - 1, pos, exclude_duplicates)
+    else:
+        pileup = fetch_reads(_chrom, pos, bam, ref_len, window, exclude_duplicates)
+        call_back = "all" if exclude_duplicates else "nofilter"
+        orig_depth = bam.count(_chrom, pos - 1, pos, read_callback=call_back)
     orig_read_num = len(pileup)
 
     # downsampling
@@ -95,16 +106,25 @@ cdef tuple make_pileup(
         ###          n_sample -> 1
         ###          over downsampled.
         if n_sample >= downsamplethresh / 2 > 0:
-            pileup = random.sample(pileup,  n_sample)
+            if shared is not None:
+                indices = random.sample(indices,  n_sample)
+                pileup = [shared.reads[i] for i in indices]
+            else:
+                pileup = random.sample(pileup,  n_sample)
             sample_factor = orig_read_num / len(pileup)
         else:
             sample_factor = 1.0
     else:
         sample_factor = 1.0
 
-    pileup = [
-        dictize_read(seg, chrom, pos, rpos, reference, unspl_loc_ref, basequalthresh) for seg in pileup
-    ]
+    if shared is not None:
+        pileup = [
+            shared.dictize(i, chrom, pos, rpos, reference, unspl_loc_ref, basequalthresh) for i in indices
+        ]
+    else:
+        pileup = [
+            dictize_read(seg, chrom, pos, rpos, reference, unspl_loc_ref, basequalthresh) for seg in pileup
+        ]
 
     pileup = [read for read in pileup if not is_within_intron(read, pos, window)]
 
@@ -133,24 +153,131 @@ cdef list fetch_reads(str chrom, int pos, AlignmentFile bam, int ref_len, int wi
         chrom, max(0, pos - window), min(pos + 1 + window, ref_len), until_eof=True
     )
 
+    reads = [read for read in all_reads if is_valid_read(read, exclude_duplicates)]
+
+    return reads
+
+
+cdef bint is_valid_read(AlignedSegment read, bint exclude_duplicates):
     if exclude_duplicates:
-        reads = [
-            read
-            for read in all_reads
-            if not read.is_duplicate
+        return (
+            not read.is_duplicate
             and not read.is_secondary
             and read.cigarstring
             and read.reference_start
-        ]
+        )
     else:
-        reads = [
-            read
-            for read in all_reads
-            if not read.is_secondary
-            and read.cigarstring
-        ]
+        return not read.is_secondary and read.cigarstring
+
+
+cdef class SharedPileup:
+    """Reads fetched once for a region and shared by the alignments of all
+    variants within that region (see :class:`~indelpost.VariantAlignment`).
+    Dictized reads are cached and reused across the variants.
+
+    Parameters
+    ----------
+    bam : pysam.AlignmentFile
+        BAM file.
+
+    chrom : string
+        chromosome name as in the BAM file.
+
+    start : integer
+        0-based start of the region.
+
+    end : integer
+        0-based end of the region (exclusive).
+    """
+    def __init__(self, AlignmentFile bam, str chrom, int start, int end):
+        cdef AlignedSegment read
+
+        self.chrom = chrom
+        self.start = start
+        self.end = end
+        self.reads, self.starts, self.ends, self.flags = [], [], [], []
+        self.max_span = 0
+        self.dictized = {}
+
+        # same overlap semantics as AlignmentFile.fetch
+        for read in bam.fetch(chrom, start, end, until_eof=True):
+            self.reads.append(read)
+            self.starts.append(read.reference_start)
+            self.ends.append(read.reference_start + max(1, read.reference_length or 0))
+            self.flags.append(read.flag)
+            self.max_span = max(self.max_span, self.ends[-1] - self.starts[-1])
+
+    def __len__(self):
+        return len(self.reads)
+
+    cpdef bint covers(self, str chrom, int start, int end):
+        return chrom == self.chrom and self.start <= start and end <= self.end
+
+    cdef list fetch(self, int start, int end, bint exclude_duplicates):
+        """returns the indices of the valid reads overlapping [start, end)"""
+        cdef int i
+        cdef list indices = []
+
+        for i in range(
+            bisect_left(self.starts, start - self.max_span), bisect_left(self.starts, end)
+        ):
+            if self.ends[i] > start and is_valid_read(self.reads[i], exclude_duplicates):
+                indices.append(i)
+        return indices
+
+    cdef int count(self, int start, int end, bint exclude_duplicates):
+        """same as AlignmentFile.count with "all" (or "nofilter") read callback"""
+        cdef int i, n = 0
+        cdef int mask = 0x4 | 0x100 | 0x200 | 0x400 if exclude_duplicates else 0
+
+        for i in range(
+            bisect_left(self.starts, start - self.max_span), bisect_left(self.starts, end)
+        ):
+            if self.ends[i] > start and not (self.flags[i] & mask):
+                n += 1
+        return n
+
+    cdef dict dictize(
+        self,
+        int i,
+        str chrom,
+        int pos,
+        int rpos,
+        FastaFile reference,
+        UnsplicedLocalReference unspl_loc_ref,
+        int basequalthresh,
+    ):
+        """same as dictize_read but reuses the target-independent part"""
+        cdef AlignedSegment read = self.reads[i]
+        cdef dict base, read_dict
+
+        # reference sequence of the reads that do not fit the local reference
+        # depends on the target
+        local_start = unspl_loc_ref.local_ref_start
+        local_end = local_start + len(unspl_loc_ref.unspliced_local_reference)
+        if local_start <= self.starts[i] and self.ends[i] <= local_end:
+            key = (i, basequalthresh)
+        else:
+            key = (i, basequalthresh, local_start, local_end)
 
-    return reads
+        base = self.dictized.get(key)
+        if base is None:
+            base = dictize_read_base(read, chrom, reference, unspl_loc_ref, basequalthresh)
+            self.dictized[key] = base
+
+        # read dicts are modified during the analysis: copy the mutable parts
+        read_dict = dict(base)
+        read_dict["I"] = [copy_indel(indel) for indel in base["I"]]
+        read_dict["D"] = [copy_indel(indel) for indel in base["D"]]
+        add_target_info(read_dict, pos, rpos, basequalthresh)
+        return read_dict
+
+
+cdef tuple copy_indel(tuple indel):
+    cdef Variant var = indel[-1]
+    return indel[:-1] + (
+        Variant(var.chrom, var.pos, var.ref, var.alt, var.reference, skip_validation=True),
+    )
 
 
 cdef dict dictize_read(
@@ -162,6 +289,18 @@ cdef dict dictize_read(
     UnsplicedLocalReference unspl_loc_ref,
     int basequalthresh
 ):
+    cdef dict read_dict = dictize_read_base(read, chrom, reference, unspl_loc_ref, basequalthresh)
+    add_target_info(read_dict, pos, rpos, basequalthresh)
+    return read_dict
+
+
+cdef dict dictize_read_base(
+    AlignedSegment read,
+    str chrom,
+    FastaFile reference,
+    UnsplicedLocalReference unspl_loc_ref,
+    int basequalthresh
+):
 
     cdef tuple ins, deln
 
@@ -208,7 +347,6 @@ cdef dict dictize_read(
 
     # base qual check
     read_dict["low_qual_base_num"] = count_lowqual_non_ref_bases(read_seq, ref_seq, read_qual, cigar_list, basequalthresh)
-    read_dict["is_end_dirty"] = is_end_dirty(read_qual, basequalthresh, pos, read_start, read_end, cigar_string)
     read_dict["is_dirty"] = sum(q <= basequalthresh for q in read_qual) / len(read_seq) > 0.15
 
     insertions, deletions = locate_indels(cigar_string, read_start)
@@ -247,7 +385,18 @@ cdef dict dictize_read(
             )
         )
 
-    indels = [ins[-1] for ins in read_dict["I"]] + [deln[-1] for deln in read_dict["D"]]
+    return read_dict
+
+
+cdef add_target_info(dict read_dict, int pos, int rpos, int basequalthresh):
+    read_dict["is_end_dirty"] = is_end_dirty(
+        read_dict["read_qual"],
+        basequalthresh,
+        pos,
+        read_dict["read_start"],
+        read_dict["read_end"],
+        read_dict["cigar_string"],
+    )
 
     (
         is_covering,
@@ -255,7 +404,9 @@ cdef dict dictize_read(
         is_spliced,
         splice_ptrn,
         intron_ptrn,
-    ) = parse_spliced_read(cigar_string, read_start, read_end, pos, rpos)
+    ) = parse_spliced_read(
+        read_dict["cigar_string"], read_dict["read_start"], read_dict["read_end"], pos, rpos
+    )
 
     read_dict["is_covering"] = is_covering
     read_dict["covering_subread"] = covering_subread
@@ -263,8 +414,6 @@ cdef dict dictize_read(
     read_dict["splice_pattern"] = splice_ptrn
     read_dict["intron_pattern"] = intron_ptrn
 
-    return read_dict
-
 
 cdef str get_ref_seq(
     str chrom,
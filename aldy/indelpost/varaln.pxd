@@ -5,6 +5,7 @@ from pysam.libcalignmentfile cimport AlignmentFile
 from .variant cimport Variant
 from .contig cimport Contig
 from .local_reference cimport UnsplicedLocalReference
+from .pileup cimport SharedPileup
 
 cdef class VariantAlignment:
     cdef Variant target, __target, second_target
@@ -18,5 +19,6 @@ cdef class VariantAlignment:
     cdef readonly is_spurious_overhang, is_complex_input
     cdef readonly Contig contig
     cdef readonly UnsplicedLocalReference unspliced_local_reference
+    cdef SharedPileup shared_pileup
 
     cdef __parse_pileup(self, Contig contig=*, bint retargeted=*, bint skip_read_end_check=*)
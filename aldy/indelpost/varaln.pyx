@@ -27,7 +27,7 @@ from .utilities import (
     get_gap_ptrn2,
     most_common
 )
-from .pileup cimport make_pileup
+from .pileup cimport make_pileup, SharedPileup
 from .utilities cimport split
 from .contig cimport Contig, FailedContig
 
@@ -98,6 +98,10 @@ cdef class VariantAlignment:
 
     no_realignment : bool
         True to only analyzed gap-aligned indels (default False)
+
+    shared_pileup : SharedPileup
+        :class:`~indelpost.SharedPileup` with the reads around the input indel.
+        Reads are fetched from the BAM file if None (default) or if the pileup does not cover the indel.
     """
     def __cinit__(
         self,
@@ -117,6 +121,7 @@ cdef class VariantAlignment:
         int gap_extension_penalty=1,
         bint auto_adjust_extension_penalty=True,
         bint no_realignment=False,
+        SharedPileup shared_pileup=None,
     ):
 
         self.target, second_target = target, target
@@ -157,6 +162,7 @@ cdef class VariantAlignment:
         self.gap_extension_penalty = gap_extension_penalty
         self.auto_adjust_extension_penalty = auto_adjust_extension_penalty
         self.no_realignment = no_realignment
+        self.shared_pileup = shared_pileup
         self.is_complex_input = is_complex_input
         self.second_target = second_target
         self.unspliced_local_reference = UnsplicedLocalReference(
@@ -194,6 +200,7 @@ cdef class VariantAlignment:
                 window=self.window,
                 downsamplethresh=self.downsamplethresh,
                 basequalthresh=self.basequalthresh,
+                shared=self.shared_pileup,
             )
 
             (
@@ -4,9 +4,15 @@
 #   file 'LICENSE', which is part of this source code package.
 
 
-from typing import Optional, Dict, Tuple, Iterable, Callable
+from typing import Optional, Dict, Tuple, Iterable, Callable, List, Set
 import importlib
+import os
+import math
 import collections
+import array
+import copy
+import time
+import numpy
 
 from .common import log, sorted_tuple, SOLUTION_PRECISION, AldyException
 
@@ -15,6 +21,16 @@ SOLVER_PRECISON = 1e-5
 """Default solver precision"""
 
 
+def cpu_count() -> int:
+    """
+    :returns: Number of CPUs available to the current process
+        (all CPUs on the platforms without CPU affinity support).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
 def escape_name(s: str, d: Optional[dict] = None) -> str:
     """
     Escape variable names to conform with the various solver requirements.
@@ -37,8 +53,23 @@ class NoSolutionsError(Exception):
 class Gurobi:  # pragma: no cover
     """Wrapper around Gurobi's Python interface (:py:mod:`gurobipy`)."""
 
+    time_limit: Optional[float] = None
+    """
+    Time limit (in seconds) shared by all solves of the model
+    (`None` for no limit). The clock starts at the first solve.
+    """
+    mip_gap: Optional[float] = None
+    """Relative optimality gap at which the solver stops (`None` for the default)."""
+    proven_gap = 0.0
+    """
+    Proven relative optimality gap of the last solution
+    (non-zero only if the solver was interrupted by the time limit).
+    """
+    _deadline: Optional[float] = None
+
     def __init__(self, name, prev_model=None):
         self.gurobipy = importlib.import_module("gurobipy")
+        self.name = name
         self.names = collections.defaultdict(int)
 
         self.env = self.gurobipy.Env(empty=True)
@@ -55,6 +86,34 @@ class Gurobi:  # pragma: no cover
         else:
             self.model = self.gurobipy.Model(name, env=self.env)
             self.model.reset()
+        self.pool_solution: Optional[int] = None
+        """Index of the current pool solution (see :py:meth:`solutions`)."""
+
+    def _time_left(self) -> Optional[float]:
+        """:returns: Remaining time (in seconds) or `None` if there is no limit."""
+        if not self.time_limit:
+            return None
+        if self._deadline is None:
+            self._deadline = time.monotonic() + self.time_limit
+        return max(0.0, self._deadline - time.monotonic())
+
+    @staticmethod
+    def _relative_gap(obj: float, bound: float) -> float:
+        """:returns: Relative gap between an objective value and its bound."""
+        return abs(obj - bound) / max(abs(obj), SOLVER_PRECISON)
+
+    def _no_solution(self, err: NoSolutionsError):
+        """Report the models that were interrupted before finding any solution."""
+        if str(err) == "time_limit":
+            log.warn(f"WARNING: {self.name} found no solution within the time limit")
+
+    def _set_limits(self, model):
+        """Pass the time and gap limits to Gurobi."""
+        left = self._time_left()
+        if left is not None:
+            model.params.TimeLimit = left
+        if self.mip_gap is not None:
+            model.params.MIPGap = self.mip_gap
 
     def addConstr(self, *args, **kwargs):
         """Add a constraint to the model."""
@@ -158,12 +217,18 @@ class Gurobi:  # pragma: no cover
         Additional parameters of the solver can be set via `init` function that takes
         the model instance as the sole argument.
 
+        If the solver is interrupted by :py:attr:`time_limit`, the best solution found
+        so far is returned with the `time_limit` status
+        (its optimality gap is stored in :py:attr:`proven_gap`).
+
         :returns: Status of the solution and the objective value.
-        :raise: :py:class:`NoSolutionsError` if the model is infeasible.
+        :raise: :py:class:`NoSolutionsError` if the model is infeasible
+            or if no solution was found within the time limit.
         """
 
         self.model.params.outputFlag = 0
         self.model.params.logFile = ""
+        self._set_limits(self.model)
         if init is not None:
             init(self.model)
         self.model.optimize()
@@ -171,6 +236,11 @@ class Gurobi:  # pragma: no cover
         status = self.GUROBI_STATUS[self.model.status]
         if self.model.status == self.gurobipy.GRB.INFEASIBLE:
             raise NoSolutionsError(status)
+        self.proven_gap = 0.0
+        if self.model.status == self.gurobipy.GRB.TIME_LIMIT:
+            if not self.model.SolCount:
+                raise NoSolutionsError("time_limit")
+            self.proven_gap = self.model.MIPGap
         return status.lower(), self.model.objVal
 
     def getValue(self, var):
@@ -178,14 +248,22 @@ class Gurobi:  # pragma: no cover
         Get the value of the solved variable.
         Automatically adjusts the return type based on the variable type.
         """
-        if hasattr(var, "vtype") and var.vtype == self.gurobipy.GRB.BINARY:
-            return round(var.x) > 0
-        if hasattr(var, "vtype") and var.vtype == self.gurobipy.GRB.INTEGER:
-            return int(round(var.x))
+        if self.pool_solution is not None:
+            if isinstance(var, self.gurobipy.Var):
+                x = var.Xn
+            else:  # linear expression
+                x = var.getConstant() + sum(
+                    var.getCoeff(i) * var.getVar(i).Xn for i in range(var.size())
+                )
         elif hasattr(var, "x"):
-            return var.x
+            x = var.x
         else:
             return var.getValue()
+        if hasattr(var, "vtype") and var.vtype == self.gurobipy.GRB.BINARY:
+            return round(x) > 0
+        if hasattr(var, "vtype") and var.vtype == self.gurobipy.GRB.INTEGER:
+            return int(round(x))
+        return x
 
     def dump(self, file):
         """Dump the model description (in LP format) to a file."""
@@ -220,32 +298,63 @@ class Gurobi:  # pragma: no cover
         Additional parameters of the solver can be set via `init` function that takes
         the model instance as the sole argument.
 
-        This is a generic version that supports any solver.
+        All solutions are obtained in a single optimization via Gurobi's solution pool.
+        As in :py:meth:`CBC.solutions`, a solution that is a superset of an already
+        reported solution is skipped.
+        The values of the current solution are available via :py:meth:`getValue`
+        until the next solution is requested.
 
         :yields: Status of the solution, the objective value and the solution itself.
         """
 
+        def pool_init(model):
+            model.params.PoolSearchMode = 2  # systematic search for the best solutions
+            # Supersets are filtered below, so the pool cannot be capped by `limit`
+            model.params.PoolSolutions = self.gurobipy.GRB.MAXINT
+            model.params.PoolGap = gap + SOLVER_PRECISON  # exact bound is checked below
+            if init is not None:
+                init(model)
+
         try:
-            status, obj = self.solve(init)
-            best_obj = obj if best_obj is None else best_obj
-            if status != "optimal":
-                return
-            ub = (1 + gap) * best_obj
-            if abs(obj - ub) >= SOLVER_PRECISON and obj > ub:
-                return
+            status, obj = self.solve(pool_init)
+        except NoSolutionsError as err:
+            self._no_solution(err)
+            return
+        best_obj = obj if best_obj is None else best_obj
+        if status not in ["optimal", "time_limit", "gap_limit"]:
+            return
+        ub = (1 + gap) * best_obj
 
-            vv = {
-                self.varName(v): v
-                for v in self.variables()
-                if self.is_binary(v) and self.getValue(v) == 1
-            }
-            yield status, obj, sorted_tuple(set(vv.keys()))
+        found: List[Set[str]] = []
+        try:
+            for i in range(self.model.SolCount):
+                if limit and len(found) >= limit - iteration:
+                    break
+                self._select_pool_solution(i)
+                obj = self.model.PoolObjVal
+                if abs(obj - ub) >= SOLVER_PRECISON and obj > ub:
+                    break
+                sol = sorted_tuple(
+                    self.varName(v)
+                    for v in self.variables()
+                    if self.is_binary(v) and self.getValue(v) == 1
+                )
+                names = set(sol)
+                if any(f <= names for f in found):
+                    continue
+                found.append(names)
+                yield status, obj, sol
+        finally:
+            self._select_pool_solution(None)
 
-            if not limit or iteration + 1 < limit:
-                self.addConstr(self.quicksum(vv.values()) <= len(vv) - 1)
-                yield from self.solutions(gap, best_obj, limit, iteration + 1, init)
-        except NoSolutionsError:
-            return
+    def _select_pool_solution(self, i: Optional[int]):
+        """
+        Make the `i`-th solution of the solution pool available via
+        :py:meth:`getValue` (or the best solution if `i` is `None`).
+        """
+        self.pool_solution = i
+        if i is not None:
+            self.model.params.SolutionNumber = i
 
 
 class CBC(Gurobi):
@@ -253,10 +362,14 @@ class CBC(Gurobi):
     Wrapper around CBC's Python interface (Google's ortools).
     """
 
+    PROBLEM_TYPE = "CBC_MIXED_INTEGER_PROGRAMMING"
+    """OR-Tools solver backend (see :py:class:`pywraplp.Solver`)."""
+
     def __init__(self, name):
         self.ortools = importlib.import_module("ortools.linear_solver.pywraplp")
+        self.name = name
         self.model = self.ortools.Solver(
-            name, self.ortools.Solver.CBC_MIXED_INTEGER_PROGRAMMING
+            name, getattr(self.ortools.Solver, self.PROBLEM_TYPE)
         )
         self.INF = self.model.infinity()
         self.STATUS = collections.defaultdict(
@@ -302,16 +415,55 @@ class CBC(Gurobi):
     def quicksum(self, expr):
         return self.model.Sum(expr)
 
+    def _parameters(self):
+        """:returns: OR-Tools solver parameters (sets the time and gap limits)."""
+        left = self._time_left()
+        if left is not None:  # OR-Tools treat 0 as no limit
+            self.model.SetTimeLimit(max(1, int(left * 1000)))
+        params = self.ortools.MPSolverParameters()
+        if self.mip_gap is not None:
+            params.SetDoubleParam(params.RELATIVE_MIP_GAP, self.mip_gap)
+        return params
+
+    def _status(self, status, obj: float) -> str:
+        """
+        :returns: Status of an optimal or a feasible solution. Feasible solutions
+            of the interrupted models have the `time_limit` status.
+            OR-Tools also reports the solutions within `mip_gap` as optimal;
+            such solutions have the `gap_limit` status unless their gap is closed.
+        """
+        self.proven_gap = 0.0
+        optimal = status == self.ortools.Solver.OPTIMAL
+        if self.mip_gap is None:
+            if optimal:
+                return "optimal"
+            if not self.time_limit:
+                return "feasible"
+        gap = self._relative_gap(obj, self.model.Objective().BestBound())
+        if not optimal and self.time_limit:
+            self.proven_gap = gap
+            return "time_limit"
+        if gap <= SOLVER_PRECISON:
+            return "optimal"
+        self.proven_gap = gap
+        return "gap_limit"
+
     def solve(self, init: Optional[Callable] = None) -> Tuple[str, float]:
+        params = self._parameters()
         if init is not None:
             init(self.model)
-        status = self.model.Solve()
+        status = self.model.Solve(params)
 
+        if status == self.ortools.Solver.NOT_SOLVED and self.time_limit:
+            raise NoSolutionsError("time_limit")
         if status == self.ortools.Solver.INFEASIBLE:
             raise NoSolutionsError(status)
         if not self.model.VerifySolution(SOLVER_PRECISON, True):
             raise NoSolutionsError(status)
-        return self.STATUS[status].lower(), self.model.Objective().Value()
+        obj = self.model.Objective().Value()
+        if status in [self.ortools.Solver.OPTIMAL, self.ortools.Solver.FEASIBLE]:
+            return self._status(status, obj), obj
+        return self.STATUS[status].lower(), obj
 
     def varName(self, var):
         return var.name()
@@ -341,20 +493,881 @@ class CBC(Gurobi):
     def is_binary(self, v):
         return isinstance(self.getValue(v), bool)
 
+    def solutions(
+        self,
+        gap: float = 0,
+        best_obj: Optional[float] = None,
+        limit=None,
+        iteration=0,
+        init: Optional[Callable] = None,
+    ):
+        """
+        Solve the model and returns the list of all optimal solutions.
+        See :py:meth:`Gurobi.solutions` for details.
+
+        This is a generic version that supports any solver: each subsequent solution
+        is found by re-solving the model with an additional no-good constraint
+        that excludes the previous solution. After the first solve, the objective
+        is bounded by (1 + `gap`) times the optimal score, so subsequent solves only
+        need to find any solution below that bound (or to prove that none exists).
+
+        The enumeration stops once the model's time limit is reached.
+
+        :yields: Status of the solution, the objective value and the solution itself.
+        """
+
+        first = True
+        while not limit or iteration < limit:
+            if not first and self._time_left() == 0:
+                log.trace("[lp] time limit reached; stopping the enumeration")
+                return
+            first = False
+            try:
+                status, obj = self.solve(init)
+            except NoSolutionsError as err:
+                self._no_solution(err)
+                return
+            if best_obj is None:
+                best_obj = obj
+            if status not in ["optimal", "time_limit", "gap_limit"]:
+                return
+            ub = (1 + gap) * best_obj
+            if abs(obj - ub) >= SOLVER_PRECISON and obj > ub:
+                return
+
+            vv = {
+                self.varName(v): v
+                for v in self.variables()
+                if self.is_binary(v) and self.getValue(v) == 1
+            }
+            yield status, obj, sorted_tuple(set(vv.keys()))
+            if status == "time_limit":
+                return
+
+            if iteration == 0:
+                self.addConstr(self.objective <= ub + SOLVER_PRECISON, name="POOL_UB")
+            self.addConstr(self.quicksum(vv.values()) <= len(vv) - 1)
+            iteration += 1
+
+
+class LinearExpr:
+    """
+    Sparse linear expression :math:`\sum_i c_i x_i + c`
+    (used by :py:class:`LinearModel`).
+    Supports the usual arithmetic operators and the comparisons
+    that yield :py:class:`Constraint` objects.
+    """
+
+    __slots__ = ("terms", "constant")
+
+    def __init__(self, terms: Optional[Dict[int, float]] = None, constant=0.0):
+        self.terms: Dict[int, float] = terms if terms is not None else {}
+        """Coefficients of the variables (accessed by their indices)."""
+        self.constant = constant
+        """Constant term."""
+
+    def _add(self, other, sign=1.0):
+        """Add `sign * other` to the expression in-place."""
+        if isinstance(other, Variable):
+            self.terms[other.index] = self.terms.get(other.index, 0) + sign
+        elif isinstance(other, LinearExpr):
+            for i, c in other.terms.items():
+                self.terms[i] = self.terms.get(i, 0) + sign * c
+            self.constant += sign * other.constant
+        else:
+            self.constant += sign * other
+        return self
+
+    def copy(self) -> "LinearExpr":
+        return LinearExpr(dict(self.terms), self.constant)
+
+    def __add__(self, other):
+        return self.copy()._add(other)
+
+    def __radd__(self, other):
+        return self.copy()._add(other)
+
+    def __iadd__(self, other):
+        return self._add(other)
+
+    def __sub__(self, other):
+        return self.copy()._add(other, -1.0)
+
+    def __rsub__(self, other):
+        return (-self)._add(other)
+
+    def __isub__(self, other):
+        return self._add(other, -1.0)
+
+    def __mul__(self, other):
+        if isinstance(other, (Variable, LinearExpr)):
+            raise AldyException("Only linear expressions are supported")
+        return LinearExpr(
+            {i: c * other for i, c in self.terms.items()}, self.constant * other
+        )
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __truediv__(self, other):
+        return self * (1.0 / other)
+
+    def __neg__(self):
+        return self * -1.0
+
+    def __le__(self, other):
+        e = self - other
+        return Constraint(e.terms, -float("inf"), -e.constant)
+
+    def __ge__(self, other):
+        e = self - other
+        return Constraint(e.terms, -e.constant, float("inf"))
+
+    def __eq__(self, other):  # type: ignore
+        e = self - other
+        return Constraint(e.terms, -e.constant, -e.constant)
+
+    __hash__ = object.__hash__
+
+
+class Variable(LinearExpr):
+    """Model variable (used by :py:class:`LinearModel`)."""
+
+    __slots__ = ("index", "name", "lb", "ub", "vtype")
+
+    def __init__(self, index: int, name: str, lb: float, ub: float, vtype: str):
+        self.index = index
+        self.name = name
+        self.lb = lb
+        self.ub = ub
+        self.vtype = vtype
+        """Variable type (`B`, `I` or `C`)."""
+
+    @property  # type: ignore
+    def terms(self):
+        return {self.index: 1.0}
+
+    @property  # type: ignore
+    def constant(self):
+        return 0.0
+
+    def copy(self) -> LinearExpr:
+        return LinearExpr({self.index: 1.0})
+
+    def __iadd__(self, other):
+        return self.copy()._add(other)
+
+    def __isub__(self, other):
+        return self.copy()._add(other, -1.0)
+
+    def __str__(self):
+        return self.name
+
+
+class Constraint:
+    """
+    Linear constraint :math:`lb \leq \sum_i c_i x_i \leq ub`
+    (used by :py:class:`LinearModel`).
+    """
+
+    __slots__ = ("terms", "lb", "ub")
+
+    def __init__(self, terms: Dict[int, float], lb: float, ub: float):
+        self.terms = terms
+        self.lb = lb
+        self.ub = ub
+
+
+class LinearModel(Gurobi):
+    """
+    Solver-independent representation of an ILP model.
+    Variables and constraints are accumulated in flat sparse arrays (the constraints
+    in compressed sparse row format) and passed to the underlying solver in bulk
+    by :py:meth:`solve`.
+    Used by the solvers that either lack a suitable Python modelling interface
+    or whose modelling interface is too slow.
+    """
+
+    solutions = CBC.solutions
+
+    def __init__(self, name, names: bool = True):
+        """
+        :param names: Keep human-readable variable and constraint names.
+            Set to `False` to speed up the construction of large models.
+        """
+        self.name = name
+        self.INF = float("inf")
+        self.keep_names = names
+        self.names: Dict[str, int] = collections.defaultdict(int)
+        self.vars: List[Variable] = []
+        """Model variables."""
+        self.row_start = array.array("q", [0])
+        """Offsets of the constraint rows within :py:attr:`row_index`."""
+        self.row_index = array.array("i")
+        """Variable indices of the non-zero constraint coefficients."""
+        self.row_value = array.array("d")
+        """Non-zero constraint coefficients."""
+        self.row_lb = array.array("d")
+        """Lower bounds of the constraints."""
+        self.row_ub = array.array("d")
+        """Upper bounds of the constraints."""
+        self.row_names: List[str] = []
+        self.objective: LinearExpr = LinearExpr()
+        self.maximize = False
+        self.values: List[float] = []
+        """Values of the variables in the last solution."""
+        self.start: Optional[Dict[int, float]] = None
+        """Warm start (initial values of the variables) for the next solve."""
+        self._synced_vars = 0
+        self._synced_rows = 0
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.row_lb)
+
+    def _new_model(self):
+        """Create an empty model in the underlying solver."""
+        pass
+
+    def clone(self) -> "LinearModel":
+        """
+        :returns: Copy of the model (without the solutions) that is passed anew to
+            the underlying solver. Used to reuse a model template for different
+            right-hand sides (see :py:meth:`setBounds`).
+        """
+        m = copy.copy(self)
+        m.names = collections.defaultdict(int, self.names)
+        m.vars = list(self.vars)
+        m.row_start, m.row_index = self.row_start[:], self.row_index[:]
+        m.row_value = self.row_value[:]
+        m.row_lb, m.row_ub = self.row_lb[:], self.row_ub[:]
+        m.row_names = list(self.row_names)
+        m.objective = self.objective.copy()
+        m.values, m.start = [], None
+        m.proven_gap, m._deadline = 0.0, None
+        m._synced_vars = m._synced_rows = 0
+        m._new_model()
+        return m
+
+    def setBounds(self, row: int, lb: float, ub: float):
+        """
+        Change the bounds (i.e. right-hand side) of a constraint.
+
+        :param row: Constraint index (as returned by :py:meth:`addConstr`).
+        :raise: :py:class:`aldy.common.AldyException` if the constraint was already
+            passed to the solver.
+        """
+        if row < self._synced_rows:
+            raise AldyException("Cannot modify a constraint of a solved model")
+        self.row_lb[row], self.row_ub[row] = lb, ub
+
+    def _take_start(self) -> Dict[int, float]:
+        """:returns: Warm start for the next solve (used only once)."""
+        start, self.start = self.start or {}, None
+        return start
+
+    def update(self):
+        pass
+
+    def addVar(self, *_, **kwargs):
+        name = ""
+        if self.keep_names:
+            name = escape_name(kwargs.get("name", f"x{len(self.vars)}"), self.names)
+        vtype = kwargs.get("vtype", "C")
+        lb, ub = kwargs.get("lb", 0), kwargs.get("ub", self.INF)
+        if vtype == "B":
+            lb, ub = 0, 1
+        v = Variable(len(self.vars), name, lb, ub, vtype)
+        self.vars.append(v)
+        return v
+
+    def addConstr(self, constr, name: str = ""):
+        if isinstance(constr, bool):  # constant expressions (e.g. 0 <= 1)
+            if constr:
+                return None
+            constr = Constraint({}, 1, 1)
+        terms = {i: c for i, c in constr.terms.items() if c}
+        self.row_index.extend(terms.keys())
+        self.row_value.extend(terms.values())
+        self.row_start.append(len(self.row_index))
+        self.row_lb.append(constr.lb)
+        self.row_ub.append(constr.ub)
+        if self.keep_names:
+            self.row_names.append(
+                escape_name(name or f"c{self.num_rows - 1}", self.names)
+            )
+        return self.num_rows - 1
+
+    def setObjective(self, objective, method: str = "min"):
+        self.objective = LinearExpr()._add(objective)
+        self.maximize = method != "min"
+
+    def quicksum(self, expr: Iterable):
+        e = LinearExpr()
+        for x in expr:
+            e._add(x)
+        return e
+
+    def varName(self, var):
+        return var.name or f"x{var.index}"
+
+    def getValue(self, var):
+        if isinstance(var, Variable):
+            x = self.values[var.index]
+            if var.vtype == "B":
+                return round(x) > 0
+            elif var.vtype == "I":
+                return int(round(x))
+            return x
+        elif isinstance(var, LinearExpr):
+            return var.constant + sum(c * self.values[i] for i, c in var.terms.items())
+        return var
+
+    def variables(self):
+        return self.vars
+
+    def is_binary(self, v):
+        return v.vtype == "B"
+
+    def rows(self, start: int = 0, end: Optional[int] = None):
+        """
+        :returns: Constraints from `start` to `end` in compressed sparse row format
+            (row offsets, variable indices, coefficients, lower and upper bounds)
+            as numpy arrays.
+        """
+        end = self.num_rows if end is None else end
+        offset = self.row_start[start]
+        return (
+            numpy.array(self.row_start[start : end + 1], dtype=numpy.int32) - offset,
+            numpy.array(
+                self.row_index[offset : self.row_start[end]], dtype=numpy.int32
+            ),
+            numpy.array(self.row_value[offset : self.row_start[end]], dtype=float),
+            numpy.array(self.row_lb[start:end], dtype=float),
+            numpy.array(self.row_ub[start:end], dtype=float),
+        )
+
+    @staticmethod
+    def _iter_rows(start, index, value, lower, upper):
+        """
+        Iterate over the constraints in compressed sparse row format.
+
+        :yields: Variable indices, coefficients, lower and upper bounds of each
+            constraint.
+        """
+        start, index, value = start.tolist(), index.tolist(), value.tolist()
+        for r, (lb, ub) in enumerate(zip(lower.tolist(), upper.tolist())):
+            s, e = start[r], start[r + 1]
+            yield index[s:e], value[s:e], lb, ub
+
+    def _pending(self):
+        """
+        :returns: Variables and constraints (in compressed sparse row format) added
+            since the last call.
+        """
+        vars = self.vars[self._synced_vars :]
+        rows = self.rows(self._synced_rows)
+        self._synced_vars, self._synced_rows = len(self.vars), self.num_rows
+        return vars, rows
+
+    def dump(self, file):
+        def expr(terms):
+            return " ".join(
+                f"{'-' if c < 0 else '+'} {abs(c):g} {self.varName(self.vars[i])}"
+                for i, c in terms
+            )
+
+        with open(file, "w") as f:
+            print("Maximize" if self.maximize else "Minimize", file=f)
+            print(f"  obj: {expr(self.objective.terms.items())}", file=f)
+            print("Subject To", file=f)
+            for r in range(self.num_rows):
+                n = self.row_names[r] if self.keep_names else f"c{r}"
+                s, e = self.row_start[r], self.row_start[r + 1]
+                terms = zip(self.row_index[s:e], self.row_value[s:e])
+                lb, ub = self.row_lb[r], self.row_ub[r]
+                if lb == ub:
+                    print(f"  {n}: {expr(terms)} = {lb:g}", file=f)
+                    continue
+                terms = list(terms)
+                if lb > -self.INF:
+                    print(f"  {n}_lb: {expr(terms)} >= {lb:g}", file=f)
+                if ub < self.INF:
+                    print(f"  {n}_ub: {expr(terms)} <= {ub:g}", file=f)
+            print("Bounds", file=f)
+            for v in self.vars:
+                if v.vtype != "B":
+                    print(f"  {v.lb:g} <= {self.varName(v)} <= {v.ub:g}", file=f)
+            for kind, vtype in [("Generals", "I"), ("Binaries", "B")]:
+                print(kind, file=f)
+                for v in self.vars:
+                    if v.vtype == vtype:
+                        print(f"  {self.varName(v)}", file=f)
+            print("End", file=f)
+
+
+class BulkGurobi(LinearModel):  # pragma: no cover
+    """
+    Gurobi model that is constructed in bulk by :py:class:`LinearModel`.
+    Avoids the overhead of Gurobi's expression operators when building large models.
+    The solutions are enumerated via Gurobi's solution pool (see
+    :py:meth:`Gurobi.solutions`).
+    """
+
+    solutions = Gurobi.solutions
+
+    def __init__(self, name, names: bool = True):
+        super().__init__(name, names)
+        self.gurobipy = importlib.import_module("gurobipy")
+        self.env = self.gurobipy.Env(empty=True)
+        self.env.setParam("OutputFlag", 0)
+        self.env.start()
+        self._new_model()
+
+    def _new_model(self):
+        self.model = self.gurobipy.Model(self.name, env=self.env)
+        self._gp_vars: list = []
+
+    def _sync(self):
+        """Pass the newly added variables and constraints to Gurobi."""
+
+        gp = self.gurobipy
+        vars, rows = self._pending()
+        if vars:
+            new = self.model.addVars(
+                len(vars),
+                lb=[v.lb for v in vars],
+                ub=[v.ub for v in vars],
+                vtype=[
+                    {"B": gp.GRB.BINARY, "I": gp.GRB.INTEGER}.get(
+                        v.vtype, gp.GRB.CONTINUOUS
+                    )
+                    for v in vars
+                ],
+                name=[v.name for v in vars] if self.keep_names else "",
+            )
+            self._gp_vars += [new[i] for i in range(len(vars))]
+        x = self._gp_vars
+        for index, value, lb, ub in self._iter_rows(*rows):
+            expr = gp.LinExpr(value, [x[i] for i in index])
+            if lb == ub:
+                self.model.addLConstr(expr, gp.GRB.EQUAL, lb)
+            elif lb == -self.INF:
+                self.model.addLConstr(expr, gp.GRB.LESS_EQUAL, ub)
+            elif ub == self.INF:
+                self.model.addLConstr(expr, gp.GRB.GREATER_EQUAL, lb)
+            else:
+                self.model.addRange(expr, lb, ub)
+        terms = self.objective.terms
+        self.model.setObjective(
+            gp.LinExpr(list(terms.values()), [x[i] for i in terms])
+            + self.objective.constant,
+            gp.GRB.MAXIMIZE if self.maximize else gp.GRB.MINIMIZE,
+        )
+        self.model.update()
+        start = self._take_start()
+        if start:
+            self.model.setAttr("Start", [x[i] for i in start], list(start.values()))
+
+    def solve(self, init: Optional[Callable] = None) -> Tuple[str, float]:
+        self._sync()
+        self.model.params.outputFlag = 0
+        self.model.params.logFile = ""
+        self._set_limits(self.model)
+        if init is not None:
+            init(self.model)
+        self.model.optimize()
+
+        status = self.model.status
+        if status == self.gurobipy.GRB.INFEASIBLE:
+            raise NoSolutionsError("INFEASIBLE")
+        self.proven_gap = 0.0
+        if status == self.gurobipy.GRB.TIME_LIMIT:
+            if not self.model.SolCount:
+                raise NoSolutionsError("time_limit")
+            self.proven_gap = self.model.MIPGap
+        elif status != self.gurobipy.GRB.OPTIMAL:
+            return str(status), 0
+        self.values = self.model.getAttr("X", self._gp_vars)
+        status = "optimal" if status == self.gurobipy.GRB.OPTIMAL else "time_limit"
+        return status, self.getValue(self.objective)
+
+    def _select_pool_solution(self, i: Optional[int]):
+        super()._select_pool_solution(i)
+        self.values = self.model.getAttr("X" if i is None else "Xn", self._gp_vars)
+
+
+class BulkCBC(LinearModel):
+    """
+    CBC model that is constructed in bulk by :py:class:`LinearModel`.
+    The initial model is passed to OR-Tools as a single model protocol buffer.
+    """
+
+    PROBLEM_TYPE = CBC.PROBLEM_TYPE
+    _parameters = CBC._parameters
+    _status = CBC._status
+
+    def __init__(self, name, names: bool = True):
+        self.ortools = importlib.import_module("ortools.linear_solver.pywraplp")
+        self.proto = importlib.import_module("ortools.linear_solver.linear_solver_pb2")
+        super().__init__(name, names)
+        self._new_model()
+
+    def _new_model(self):
+        self.model = self.ortools.Solver(
+            self.name, getattr(self.ortools.Solver, self.PROBLEM_TYPE)
+        )
+
+    def _sync(self):
+        """Pass the newly added variables and constraints to OR-Tools."""
+
+        first = not self._synced_vars
+        vars, rows = self._pending()
+        if first:
+            pb = self.proto.MPModelProto(name=self.name)
+            for v in vars:
+                pb.variable.add(
+                    lower_bound=v.lb,
+                    upper_bound=v.ub,
+                    is_integer=v.vtype != "C",
+                    name=v.name,
+                )
+            for index, value, lb, ub in self._iter_rows(*rows):
+                c = pb.constraint.add(lower_bound=lb, upper_bound=ub)
+                c.var_index.extend(index)
+                c.coefficient.extend(value)
+            err = self.model.LoadModelFromProto(pb)
+            if err:
+                raise AldyException(f"Cannot load the model: {err}")
+        else:
+            for v in vars:
+                self.model.Var(v.lb, v.ub, v.vtype != "C", v.name)
+            x = self.model.variables()
+            for index, value, lb, ub in self._iter_rows(*rows):
+                c = self.model.RowConstraint(lb, ub, "")
+                for i, val in zip(index, value):
+                    c.SetCoefficient(x[i], val)
+
+        x = self.model.variables()
+        obj = self.model.Objective()
+        obj.Clear()
+        for i, c in self.objective.terms.items():
+            obj.SetCoefficient(x[i], c)
+        obj.SetOffset(self.objective.constant)
+        obj.SetOptimizationDirection(self.maximize)
+        start = self._take_start()
+        self.model.SetHint([x[i] for i in start], list(start.values()))
+
+    def solve(self, init: Optional[Callable] = None) -> Tuple[str, float]:
+        self._sync()
+        params = self._parameters()
+        if init is not None:
+            init(self.model)
+        status = self.model.Solve(params)
+
+        if status == self.ortools.Solver.NOT_SOLVED and self.time_limit:
+            raise NoSolutionsError("time_limit")
+        if status == self.ortools.Solver.INFEASIBLE:
+            raise NoSolutionsError(status)
+        if not self.model.VerifySolution(SOLVER_PRECISON, True):
+            raise NoSolutionsError(status)
+        if status not in [self.ortools.Solver.OPTIMAL, self.ortools.Solver.FEASIBLE]:
+            return "unknown", 0
+        self.values = [v.solution_value() for v in self.model.variables()]
+        obj = self.getValue(self.objective)
+        return self._status(status, obj), obj
+
+
+class CPSAT(LinearModel):
+    """
+    Wrapper around OR-Tools' CP-SAT solver (Google's ortools).
+
+    CP-SAT only supports integer variables and coefficients. Thus each continuous
+    variable is represented by an integer variable scaled by :py:attr:`SCALE`,
+    and each constraint with fractional coefficients is scaled by a power of ten
+    until its coefficients become (near-)integral.
+    """
+
+    SCALE = 10**6
+    """Resolution of the continuous variables."""
+
+    BOUND = 10**5
+    """Replacement for the infinite bounds."""
+
+    MAX_ROW_SCALE = 10**12
+    """Maximum scaling factor of a constraint."""
+
+    def __init__(
+        self, name, names: bool = True, num_search_workers: Optional[int] = None
+    ):
+        """
+        :param num_search_workers: Number of parallel search workers.
+            Default: number of available CPUs.
+        """
+        self.cp_model = importlib.import_module("ortools.sat.python.cp_model")
+        super().__init__(name, names)
+        if not num_search_workers:
+            num_search_workers = cpu_count()
+        self.num_search_workers = num_search_workers
+        self._new_model()
+
+    def _new_model(self):
+        self.model = self.cp_model.CpModel()
+        self.model.name = self.name
+        self._cp_vars: list = []
+
+    def _scale(self, v: Variable) -> int:
+        """:returns: Scaling factor of a variable."""
+        return self.SCALE if v.vtype == "C" else 1
+
+    def _row(self, terms: Dict[int, float], lb: float, ub: float):
+        """:returns: Integral coefficients and bounds of a (scaled) constraint."""
+
+        coeffs = {i: c / self._scale(self.vars[i]) for i, c in terms.items() if c}
+        # Continuous variables must keep integral coefficients to absorb the rounding
+        # errors of the remaining coefficients (e.g. in equalities)
+        pivots = [c for i, c in coeffs.items() if self.vars[i].vtype == "C"]
+        integral = not pivots
+        pivots = pivots or list(coeffs.values())
+        scale = 1
+        while scale < self.MAX_ROW_SCALE and any(
+            abs(c * scale - round(c * scale)) > 1e-9 * max(1, abs(c * scale))
+            for c in pivots
+        ):
+            scale *= 10
+        integral = integral and scale < self.MAX_ROW_SCALE
+        # Integer-valued rows can be safely tightened. Otherwise, round the bounds to
+        # the nearest integer (to preserve equalities).
+        lo, hi = (math.ceil, math.floor) if integral else (round, round)
+        return (
+            [self._cp_vars[i] for i in coeffs],
+            [int(round(c * scale)) for c in coeffs.values()],
+            int(lo(lb * scale - 1e-9)) if lb > -self.INF else None,
+            int(hi(ub * scale + 1e-9)) if ub < self.INF else None,
+        )
+
+    def _sync(self):
+        """Pass the newly added variables and constraints to CP-SAT."""
+
+        vars, rows = self._pending()
+        for v in vars:
+            s = self._scale(v)
+            lb, ub = max(v.lb, -self.BOUND), min(v.ub, self.BOUND)
+            self._cp_vars.append(
+                self.model.new_int_var(math.ceil(lb * s), math.floor(ub * s), v.name)
+            )
+        cp = self.cp_model
+        for index, value, lb, ub in self._iter_rows(*rows):
+            vars, coeffs, lb, ub = self._row(dict(zip(index, value)), lb, ub)
+            expr = cp.LinearExpr.weighted_sum(vars, coeffs)
+            if lb is None and ub is None:
+                continue
+            elif lb is None:
+                self.model.add(expr <= ub)
+            elif ub is None:
+                self.model.add(expr >= lb)
+            else:
+                self.model.add_linear_constraint(expr, lb, ub)
+
+        # CP-SAT supports floating-point objectives
+        terms = self.objective.terms
+        self.model.minimize(
+            cp.LinearExpr.weighted_sum(
+                [self._cp_vars[i] for i in terms],
+                [
+                    (-c if self.maximize else c) / self._scale(self.vars[i])
+                    for i, c in terms.items()
+                ],
+            )
+        )
+        self.model.clear_hints()
+        for i, x in self._take_start().items():
+            s = self._scale(self.vars[i])
+            self.model.add_hint(self._cp_vars[i], round(x * s))
+
+    def solve(self, init: Optional[Callable] = None) -> Tuple[str, float]:
+        self._sync()
+        solver = self.cp_model.CpSolver()
+        solver.parameters.num_workers = self.num_search_workers
+        # Ties are broken by tiny objective differences (e.g. in the minor model)
+        solver.parameters.absolute_gap_limit = 1e-9
+        left = self._time_left()
+        if left is not None:
+            solver.parameters.max_time_in_seconds = left
+        if self.mip_gap is not None:
+            solver.parameters.relative_gap_limit = self.mip_gap
+        if init is not None:
+            init(solver)
+        status = solver.solve(self.model)
+
+        if status in [self.cp_model.INFEASIBLE, self.cp_model.MODEL_INVALID]:
+            raise NoSolutionsError(solver.status_name(status))
+        if status == self.cp_model.UNKNOWN and self.time_limit:
+            raise NoSolutionsError("time_limit")
+        if status not in [self.cp_model.OPTIMAL, self.cp_model.FEASIBLE]:
+            return solver.status_name(status).lower(), 0
+        self.values = [
+            solver.value(cv) / self._scale(v) for v, cv in zip(self.vars, self._cp_vars)
+        ]
+        obj = self.getValue(self.objective)
+        self.proven_gap = 0.0
+        if status == self.cp_model.FEASIBLE and self.time_limit:
+            # Both values exclude the objective constant
+            gap = abs(solver.objective_value - solver.best_objective_bound)
+            self.proven_gap = gap / max(abs(obj), SOLVER_PRECISON)
+            return "time_limit", obj
+        return solver.status_name(status).lower(), obj
+
+
+class HiGHS(LinearModel):
+    """
+    Wrapper around the HiGHS MILP solver (via `highspy`).
+
+    The constraint matrix is built in bulk from the accumulated sparse rows and
+    passed to HiGHS in a single call; constraints added afterwards (e.g. no-good
+    cuts in :py:meth:`LinearModel.solutions`) are appended in batches.
+    """
+
+    def __init__(self, name, names: bool = True, threads: Optional[int] = None):
+        """
+        :param threads: Number of threads used by the HiGHS scheduler.
+            Default: number of available CPUs.
+        """
+        self.highspy = importlib.import_module("highspy")
+        super().__init__(name, names)
+        if not threads:
+            threads = cpu_count()
+        self.threads = threads
+        self._new_model()
+
+    def _new_model(self):
+        self.model = self.highspy.Highs()
+        self.model.setOptionValue("output_flag", False)
+        self.model.setOptionValue("threads", self.threads)
+        # Ties are broken by tiny objective differences (e.g. in the minor model)
+        self.model.setOptionValue("mip_rel_gap", 0.0)
+        self.model.setOptionValue("mip_abs_gap", 1e-9)
+
+    def _sync(self):
+        """Pass the newly added variables and constraints to HiGHS."""
+
+        hs = self.highspy
+        first = not self._synced_vars
+        vars, (start, index, value, lower, upper) = self._pending()
+        col_lower = numpy.array([v.lb for v in vars], dtype=float)
+        col_upper = numpy.array([v.ub for v in vars], dtype=float)
+        integrality = [
+            hs.HighsVarType.kContinuous if v.vtype == "C" else hs.HighsVarType.kInteger
+            for v in vars
+        ]
+        if first:
+            lp = hs.HighsLp()
+            lp.num_col_, lp.num_row_ = len(vars), len(lower)
+            lp.col_cost_ = numpy.zeros(len(vars))
+            lp.col_lower_, lp.col_upper_ = col_lower, col_upper
+            lp.integrality_ = integrality
+            lp.row_lower_, lp.row_upper_ = lower, upper
+            lp.a_matrix_.format_ = hs.MatrixFormat.kRowwise
+            lp.a_matrix_.num_col_, lp.a_matrix_.num_row_ = lp.num_col_, lp.num_row_
+            lp.a_matrix_.start_, lp.a_matrix_.index_ = start, index
+            lp.a_matrix_.value_ = value
+            self.model.passModel(lp)
+        else:
+            if vars:
+                n = len(vars)
+                self.model.addVars(n, col_lower, col_upper)
+                idx = numpy.arange(n, dtype=numpy.int32) + len(self.vars) - n
+                self.model.changeColsIntegrality(
+                    n, idx, numpy.array(integrality, dtype=numpy.uint8)
+                )
+            if len(lower):
+                self.model.addRows(
+                    len(lower), lower, upper, len(index), start[:-1], index, value
+                )
+
+        terms = self.objective.terms
+        n = len(self.vars)
+        self.model.changeColsCost(
+            n,
+            numpy.arange(n, dtype=numpy.int32),
+            numpy.array([terms.get(i, 0.0) for i in range(n)], dtype=float),
+        )
+        self.model.changeObjectiveSense(
+            hs.ObjSense.kMaximize if self.maximize else hs.ObjSense.kMinimize
+        )
+        start = self._take_start()
+        if start:
+            self.model.setSolution(
+                len(start),
+                numpy.array(list(start), dtype=numpy.int32),
+                numpy.array(list(start.values()), dtype=float),
+            )
+
+    def solve(self, init: Optional[Callable] = None) -> Tuple[str, float]:
+        self._sync()
+        left = self._time_left()
+        self.model.setOptionValue("time_limit", self.INF if left is None else left)
+        self.model.setOptionValue("mip_rel_gap", self.mip_gap or 0.0)
+        if init is not None:
+            init(self.model)
+        self.model.run()
+        status = self.model.getModelStatus()
+
+        ms = self.highspy.HighsModelStatus
+        if status in [ms.kInfeasible, ms.kUnboundedOrInfeasible, ms.kModelError]:
+            raise NoSolutionsError(self.model.modelStatusToString(status))
+        info = self.model.getInfo()
+        self.proven_gap = 0.0
+        if status == ms.kTimeLimit:
+            if info.primal_solution_status != 2:  # no feasible solution
+                raise NoSolutionsError("time_limit")
+            self.proven_gap = info.mip_gap
+        elif status != ms.kOptimal:
+            return self.model.modelStatusToString(status).lower(), 0
+        self.values = list(self.model.getSolution().col_value)
+        status = "optimal" if status == ms.kOptimal else "time_limit"
+        return status, self.getValue(self.objective)
+
 
-def model(name: str, solver: str):
+def model(
+    name: str,
+    solver: str,
+    bulk: bool = False,
+    names: bool = True,
+    time_limit: float = 0,
+    mip_gap: float = 0,
+    threads: int = 0,
+):
     """
     Create an ILP solver instance for a model named `name`.
     If `solver` is `'any'`, this function will try to use
-    Gurobi, and will fall back on CBC if Gurobi is missing.
+    CBC, and will fall back on Gurobi, CP-SAT and HiGHS if CBC is missing.
+    If more than one thread is available (see `threads`), CP-SAT is tried first.
 
+    :param bulk: Accumulate the model in :py:class:`LinearModel` and pass it to the
+        solver in bulk (CP-SAT and HiGHS models are always built in bulk).
+        Recommended for large models.
+    :param names: Keep human-readable variable and constraint names
+        in the bulk models.
+    :param time_limit: Time limit (in seconds) for all solves of the model
+        (0 for no limit). See :py:attr:`Gurobi.time_limit`.
+    :param mip_gap: Relative optimality gap at which the solver stops
+        (0 for the solver's default).
+    :param threads: Number of parallel search workers of the CP-SAT solver
+        or threads of the HiGHS solver (0 for all available CPUs).
     :raise: :py:class:`Exception` if no solver is found.
     """
 
+    def limited(model):
+        if model is not None:
+            model.time_limit = time_limit or None
+            model.mip_gap = mip_gap or None
+        return model
+
     def test_gurobi(name):  # pragma: no cover
         """Test if Gurobi is present. Requires Gurobi 7+."""
         try:
-            model = Gurobi(name)
+            model = BulkGurobi(name, names) if bulk else Gurobi(name)
             log.trace("[lp] solver= gurobi")
         except ImportError:
             model = None
@@ -365,22 +1378,45 @@ def model(name: str, solver: str):
     def test_cbc(name):
         """Test if OR-Tools are present. Requires Google's `ortools`."""
         try:
-            model = CBC(name)
+            model = BulkCBC(name, names) if bulk else CBC(name)
             log.trace("[lp] solver= cbc")
         except ImportError:
             model = None
         return model
 
+    def test_cpsat(name):
+        """Test if OR-Tools are present. Requires Google's `ortools`."""
+        try:
+            model = CPSAT(name, names, threads)
+            log.trace("[lp] solver= cpsat")
+        except ImportError:
+            model = None
+        return model
+
+    def test_highs(name):
+        """Test if HiGHS is present. Requires `highspy`."""
+        try:
+            model = HiGHS(name, names, threads)
+            log.trace("[lp] solver= highs")
+        except ImportError:
+            model = None
+        return model
+
     if solver == "any":
-        model = test_cbc(name)
-        if model is None:
-            model = test_gurobi(name)
+        tests = [test_cbc, test_gurobi, test_cpsat, test_highs]
+        if (threads or cpu_count()) > 1:  # CP-SAT uses the idle CPUs
+            tests = [test_cpsat, test_cbc, test_gurobi, test_highs]
+        model = None
+        for test in tests:
+            model = test(name)
+            if model is not None:
+                break
         if model is None:
             raise AldyException(
                 "No ILP solver found. Aldy cannot operate without an ILP solver. "
                 + "Please install Gurobi or Google OR Tools."
             )
-        return model
+        return limited(model)
     else:
         fname = "test_" + solver
         if fname in locals():
@@ -389,6 +1425,6 @@ def model(name: str, solver: str):
                 raise AldyException(
                     "ILP solver {} cannot be initialized".format(solver)
                 )
-            return m
+            return limited(m)
         else:
             raise AldyException("ILP solver {} is not supported".format(solver))
@@ -4,7 +4,8 @@
 #   file 'LICENSE', which is part of this source code package.
 
 
-from typing import List, Dict, Tuple, Any, Optional
+from typing import List, Dict, Tuple, Any, Optional, Set
+from dataclasses import dataclass
 from natsort import natsorted
 import collections
 import copy
@@ -13,6 +14,7 @@ from . import lpinterface
 from .common import log, json, sorted_tuple
 from .gene import MajorAllele, Mutation, Gene
 from .coverage import Coverage
+from .profile import Profile
 from .solutions import CNSolution, MajorSolution, SolvedAllele
 
 
@@ -85,7 +87,6 @@ def solve_major_model(
         (section Methods/Major star-allele identification) for the model explanation.
     """
 
-    model = lpinterface.model("AldyMajor", solver)
     debug_info = json[gene.name]["major"][len(json[gene.name]["major"])]
 
     # Get the list of _all_ functional mutations present in the sample
@@ -97,10 +98,130 @@ def solve_major_model(
     }
     _print_candidates(gene, allele_dict, coverage, cn_solution, func_muts)
 
-    a: Any = 0
+    # The model structure does not depend on the coverage: reuse it if possible
+    key = (
+        id(gene),
+        solver,
+        coverage.profile.major_novel,
+        sorted_tuple(allele_dict),
+        sorted_tuple(cn_solution.solution.items()),
+        sorted_tuple(func_muts),
+    )
+    if key in _templates:
+        template = _templates.pop(key)
+    else:
+        template = _build_major_model(
+            gene, cn_solution, allele_dict, func_muts, solver, coverage.profile
+        )
+    _templates[key] = template
+    while len(_templates) > MAX_TEMPLATES:
+        _templates.pop(next(iter(_templates)))
+    model, VA, VNEW = template.model.clone(), template.VA, template.VNEW
+    model.start = template.start
+    model.time_limit = coverage.profile.major_time_limit or None
+    model.mip_gap = coverage.profile.major_mip_gap or None
+
+    # Each allele must express all of its functional mutations
+    debug_info["id"] = identifier
+    debug_info["cn"] = str(dict(cn_solution.solution))
+    debug_info["data"] = []
+    for m, row in sorted(template.rows.items()):
+        if coverage.single_copy(m.pos, cn_solution) == 0:
+            cov = 0.0
+        else:
+            cov = coverage[m] / coverage.single_copy(m, cn_solution)
+        model.setBounds(row, cov, cov)
+        debug_info["data"].append((m[0], m[1], cov))
+    if debug:
+        model.dump(f"{debug}.{gene.name}.major{identifier}.lp")
+
+    # Solve the model
+    lookup = {
+        **{model.varName(v): a for a, v in VA.items()},
+        **{model.varName(v): m for m, v in VNEW.items()},
+    }
+    result: Dict[Any, MajorSolution] = {}
+    debug_info["sol"] = []
+    for status, opt, sol in model.solutions(coverage.profile.gap):
+        if not result:  # warm start the next use of the template
+            template.start = {
+                v.index: model.getValue(v) for v in model.vars if v.vtype != "C"
+            }
+        solved_alleles = sorted_tuple(
+            [lookup[s][0] for s in sol if s in lookup and s.startswith("A_")]
+        )
+        novel_muts = sorted_tuple(
+            [lookup[s] for s in sol if s in lookup and s.startswith("N_")]
+        )
+        if (solved_alleles, novel_muts) not in result:
+            solution = collections.Counter(
+                SolvedAllele(gene, major=a) for a in solved_alleles
+            )
+            debug_info["sol"].append(
+                dict(collections.Counter(a for a in solved_alleles))
+            )
+            sol = MajorSolution(
+                score=opt,
+                solution=solution,
+                cn_solution=cn_solution,
+                added=list(novel_muts),
+                status=status,
+                proven_gap=model.proven_gap,
+            )
+            log.debug(
+                f"[major] status= {status}; opt= {opt:.2f}; "
+                + f"solution= {sol._solution_nice()}"
+            )
+            result[solved_alleles, novel_muts] = sol
+    if not result:
+        log.debug("[major] solution= []")
+    return list(result.values())
+
+
+@dataclass
+class _MajorModel:
+    """Major model template (see :py:func:`solve_major_model`)."""
+
+    gene: Gene
+    model: Any
+    """Model (:py:class:`aldy.lpinterface.LinearModel`) with unset coverages."""
+    VA: Dict[Tuple[str, int], Any]
+    """Allele copy variables."""
+    VNEW: Dict[Mutation, Any]
+    """Novel mutation variables."""
+    rows: Dict[Mutation, int]
+    """Coverage constraints."""
+    start: Optional[Dict[int, float]] = None
+    """Last solution of the model (used as a warm start)."""
+
+
+MAX_TEMPLATES = 64
+"""Maximum number of cached major model templates."""
+
+
+_templates: Dict[tuple, _MajorModel] = {}
+"""Cache of the major model templates (in the least recently used order)."""
+
+
+def _build_major_model(
+    gene: Gene,
+    cn_solution: CNSolution,
+    alleles_dict: Dict[str, MajorAllele],
+    func_muts: Set[Mutation],
+    solver: str,
+    profile: Profile,
+) -> _MajorModel:
+    """
+    Build the major model template whose coverage constraints are set by
+    :py:func:`solve_major_model`.
+    """
+
+    model = lpinterface.model(
+        "AldyMajor", solver, bulk=True, threads=profile.solver_threads
+    )
 
     # Create a binary variable for every possible allele copy
-    alleles = {(a, int(0)): allele_dict[a] for a in allele_dict}
+    alleles = {(a, int(0)): alleles_dict[a] for a in alleles_dict}
     for (an, _), a in list(alleles.items()):
         max_cn = cn_solution.solution[a.cn_config]
         for i in range(1, max_cn):
@@ -117,7 +238,7 @@ def solve_major_model(
         m: model.addVar(lb=-model.INF, ub=model.INF, name=f"E_{m.pos}_{m.op}")
         for m in func_muts
     }
-    constraints = {e: 0 for e in VERR}
+    constraints: Dict[Mutation, Any] = {e: 0 for e in VERR}
 
     # Add a binary variable for each mutation copy
     # For each present functional mutation, add a binary variable VNEW s.t.
@@ -151,17 +272,11 @@ def solve_major_model(
         model.addConstr(z <= 1, name=f"CONE_{pos}")
 
     # Each allele must express all of its functional mutations
-    debug_info["id"] = identifier
-    debug_info["cn"] = str(dict(cn_solution.solution))
-    debug_info["data"] = []
-    for m, expr in sorted(constraints.items()):
-        if coverage.single_copy(m.pos, cn_solution) == 0:
-            cov = 0.0
-        else:
-            cov = coverage[m] / coverage.single_copy(m, cn_solution)
-        model.addConstr(expr + VERR[m] <= cov, name=f"CFUNC_{m.pos}_{m.op}")
-        model.addConstr(expr + VERR[m] >= cov, name=f"CFUNC_{m.pos}_{m.op}")
-        debug_info["data"].append((m[0], m[1], cov))
+    # (the coverages are set later)
+    rows = {
+        m: model.addConstr(expr + VERR[m] == 0, name=f"CFUNC_{m.pos}_{m.op}")
+        for m, expr in sorted(constraints.items())
+    }
 
     # Each CN configuration must be satisfied by corresponding alleles
     for cnf, cnt in cn_solution.solution.items():
@@ -192,47 +307,11 @@ def solve_major_model(
     for m in VNEW:
         model.addConstr(z >= VNEW[m], name=f"NOVEL_UB_{VNEW[m]}")
     model.addConstr(z <= model.quicksum(VNEW[m] for m in VNEW), name="NOVEL_LB")
-    objective += coverage.profile.major_novel * z
+    objective += profile.major_novel * z
     objective += 0.1 * model.quicksum(VNEW[m] for m in VNEW)
     model.setObjective(objective)
-    if debug:
-        model.dump(f"{debug}.{gene.name}.major{identifier}.lp")
 
-    # Solve the model
-    lookup = {
-        **{model.varName(v): a for a, v in VA.items()},
-        **{model.varName(v): m for m, v in VNEW.items()},
-    }
-    result: Dict[Any, MajorSolution] = {}
-    debug_info["sol"] = []
-    for status, opt, sol in model.solutions(coverage.profile.gap):
-        solved_alleles = sorted_tuple(
-            [lookup[s][0] for s in sol if s in lookup and s.startswith("A_")]
-        )
-        novel_muts = sorted_tuple(
-            [lookup[s] for s in sol if s in lookup and s.startswith("N_")]
-        )
-        if (solved_alleles, novel_muts) not in result:
-            solution = collections.Counter(
-                SolvedAllele(gene, major=a) for a in solved_alleles
-            )
-            debug_info["sol"].append(
-                dict(collections.Counter(a for a in solved_alleles))
-            )
-            sol = MajorSolution(
-                score=opt,
-                solution=solution,
-                cn_solution=cn_solution,
-                added=list(novel_muts),
-            )
-            log.debug(
-                f"[major] status= {status}; opt= {opt:.2f}; "
-                + f"solution= {sol._solution_nice()}"
-            )
-            result[solved_alleles, novel_muts] = sol
-    if not result:
-        log.debug("[major] solution= []")
-    return list(result.values())
+    return _MajorModel(gene, model, VA, VNEW, rows)
 
 
 def _filter_alleles(
@@ -264,7 +343,7 @@ def _filter_alleles(
 
         def pileup(pos):
             return "".join(
-                (a if a == "_" else a[2:]) * len(c)
+                (a if a == "_" else a[2:]) * sum(c.values())
                 for a, c in coverage._coverage[pos].items()
             )
 
@@ -3,13 +3,16 @@
 #   This file is subject to the terms and conditions defined in
 #   file 'LICENSE', which is part of this source code package.
 
-from typing import List, Set, Tuple, Dict
+from typing import List, Set, Tuple, Dict, Optional
 from natsort import natsorted
 import collections
+import concurrent.futures
+import logbook
+import math
 import os
 
 from . import lpinterface
-from .common import log, json, Timing
+from .common import log, json, Timing, AldyException
 from .gene import Mutation, Gene
 from .coverage import Coverage
 from .solutions import MajorSolution, SolvedAllele, MinorSolution
@@ -23,6 +26,8 @@ def estimate_minor(
     solver: str,
     max_solutions: int = 1,
     novel: bool = False,
+    debug: Optional[str] = None,
+    jobs: int = 1,
 ) -> List[MinorSolution]:
     """
     Estimate the optimal minor star-allele.
@@ -35,6 +40,12 @@ def estimate_minor(
         Default: 1.
     :param novel: Include non-database functional and silent mutations in the model.
         Default: `False`.
+    :param debug: When set, keep human-readable variable names in the models.
+        Default: `None`.
+    :param jobs: Number of minor models (one for each major solution) to solve in
+        parallel (each in its own thread). The logs and the debug information are
+        reported in the same order as in the sequential run.
+        Default: 1.
     """
 
     # Get the list of potential alleles and mutations
@@ -87,29 +98,63 @@ def estimate_minor(
                     mutations.add(Mutation(pos, m))
 
     # Group by CN solutions
-    minor_sols: List[MinorSolution] = []
     cn_sols = {m.cn_solution for m in major_sols}
+    tasks = [
+        (c, major_sol)
+        for c in sorted(cn_sols, key=lambda x: x._solution_nice())
+        for major_sol in natsorted(
+            [m for m in major_sols if m.cn_solution == c],
+            key=lambda s: str(s.solution),
+        )
+    ]
+
+    def task_args(major_sol):
+        return (gene, cov, major_sol, alleles, mutations, solver, max_solutions, debug)
+
+    minor_sols: List[MinorSolution] = []
     min_score = min(m.score for m in major_sols)
-    for c in sorted(cn_sols, key=lambda x: x._solution_nice()):
-        log.debug("*" * 80)
-        majors = [m for m in major_sols if m.cn_solution == c]
-        _print_candidates(gene, alleles, c, cov, mutations)
-        for major_sol in natsorted(majors, key=lambda s: str(s.solution)):
-            sols = solve_minor_model(
-                gene,
-                cov,
-                major_sol,
-                alleles,
-                mutations,
-                solver,
-                max_solutions,
-            )
+    pool = concurrent.futures.ThreadPoolExecutor(jobs) if jobs > 1 else None
+    try:
+        if pool:
+            futures = [pool.submit(_solve_job, task_args(m)) for _, m in tasks]
+        for ti, (c, major_sol) in enumerate(tasks):
+            if ti == 0 or tasks[ti - 1][0] is not c:
+                log.debug("*" * 80)
+                _print_candidates(gene, alleles, c, cov, mutations)
+            if pool:
+                sols, debug_info, records = futures[ti].result()
+                for r in records:
+                    log.handle(r)
+            else:
+                debug_info = {}
+                sols = solve_minor_model(*task_args(major_sol), debug_info)
+            json[gene.name]["minor"][len(json[gene.name]["minor"])] = debug_info
             for s in sols:
                 s.score += major_sol.score - min_score
             minor_sols += sols
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
     return minor_sols
 
 
+def _solve_job(args: tuple) -> tuple:
+    """
+    Solve a minor model within a worker thread (see :py:func:`estimate_minor`).
+    The debug information and the log records are captured and returned
+    to the caller.
+
+    :returns: Tuple consisting of the minor solutions, the debug information
+        and the log records.
+    """
+
+    debug_info: dict = {}
+    handler = logbook.TestHandler(level="TRACE", bubble=False)
+    with handler.threadbound():
+        sols = solve_minor_model(*args, debug_info)
+    return sols, debug_info, handler.records
+
+
 def solve_minor_model(
     gene: Gene,
     coverage: Coverage,
@@ -118,6 +163,8 @@ def solve_minor_model(
     mutations: Set[Mutation],
     solver: str,
     max_solutions: int = 1,
+    debug: Optional[str] = None,
+    debug_info: Optional[dict] = None,
 ) -> List[MinorSolution]:
     """
     Solves the minor star-allele detection problem via integer linear programming.
@@ -131,6 +178,10 @@ def solve_minor_model(
     :param solver: ILP solver (see :py:mod:`aldy.lpinterface` for supported solvers).
     :param max_solutions: Maximum number of solutions to report.
         Default: 1.
+    :param debug: When set, keep human-readable variable names in the model.
+        Default: `None`.
+    :param debug_info: Dictionary for the debug information.
+        Default: `None` (a new entry in :py:data:`aldy.common.json`).
 
     .. note::
         Please see `Aldy paper <https://www.nature.com/articles/s41467-018-03273-1>`_
@@ -139,8 +190,18 @@ def solve_minor_model(
     """
 
     log.debug("[minor] major= {}", major_sol._solution_nice())
-    model = lpinterface.model("AldyMinor", solver)
-    debug_info = json[gene.name]["minor"][len(json[gene.name]["minor"])]
+    # The model is large: build it in bulk and skip the naming unless debugging
+    model = lpinterface.model(
+        "AldyMinor",
+        solver,
+        bulk=True,
+        names=bool(debug),
+        time_limit=coverage.profile.minor_time_limit,
+        mip_gap=coverage.profile.minor_mip_gap,
+        threads=coverage.profile.solver_threads,
+    )
+    if debug_info is None:
+        debug_info = json[gene.name]["minor"][len(json[gene.name]["minor"])]
 
     # Establish minor alleles and their mutations
     alleles: Dict[Tuple[SolvedAllele, int], Set[Mutation]] = {
@@ -153,6 +214,10 @@ def solve_minor_model(
         max_cn = major_sol.solution[SolvedAllele(gene, a.major, "", a.added, a.missing)]
         for cnt in range(1, max_cn):
             alleles[a, cnt] = alleles[a, 0]
+    # Keep the phasing read sample of the full model (see below)
+    phase_alleles = len(alleles)
+    keep = set(_prune_candidates(gene, coverage, major_sol, alleles_list, mutations))
+    alleles = {a: m for a, m in alleles.items() if a[0] in keep}
 
     VA = {
         a: model.addVar(vtype="B", name=f"A_{a[0].major}_{a[0].minor}_{a[1]}")
@@ -368,22 +433,14 @@ def solve_minor_model(
     # 7) Respect phasing
     VPHASEERR = []
     VPHASE = {}
-    modes = collections.defaultdict(int)
+    modes: dict = {}
     if coverage.profile.phase and coverage.sam:
-        mut_pos = {m.pos for m in mutations}
-        for rr, rv in coverage.sam.phases.items():
-            c = []
-            for k, v in rv.items():
-                if k in mut_pos:
-                    c.append((k, v))
-            c = sorted(c)
-            if len(c) > 1:
-                modes[tuple(c)] += 1
+        modes = coverage.sam.phases.modes({m.pos for m in mutations})
         log.debug("[minor] number of phases= {}", len(modes))
         log.debug("[minor] number of alleles= {}", len(alleles))
-        if len(modes) * len(alleles) > coverage.profile.minor_phase_vars:
+        if len(modes) * phase_alleles > coverage.profile.minor_phase_vars:
             max_sample = len(modes) * (
-                coverage.profile.minor_phase_vars / (len(modes) * len(alleles))
+                coverage.profile.minor_phase_vars / (len(modes) * phase_alleles)
             )
             log.debug("[minor] downsampling to= {}", max_sample)
             skip = len(modes) / max_sample
@@ -518,6 +575,8 @@ def solve_minor_model(
                 solution=solution,
                 major_solution=major_sol,
                 profile=coverage.profile,
+                status=status,
+                proven_gap=model.proven_gap,
             )
             _ = estimate_diplotype(gene, sol)
             debug_info["sol"] = [(s.minor, s.added, s.missing) for s in solution]
@@ -543,6 +602,125 @@ def solve_minor_model(
     return sorted(results.values(), key=lambda x: str(x.get_minor_diplotype()))
 
 
+def _prune_candidates(
+    gene: Gene,
+    coverage: Coverage,
+    major_sol: MajorSolution,
+    alleles: List[SolvedAllele],
+    mutations: Set[Mutation],
+) -> List[SolvedAllele]:
+    """
+    Remove the minor star-allele candidates that cannot be a part of the optimal
+    minor solution (see `minor_prune` in :py:class:`aldy.profile.Profile`).
+
+    The candidates whose major star-allele is not a part of `major_sol` are always
+    removed. A candidate A is also removed if another candidate B of the same major
+    star-allele can replace A in any solution with a strictly lower miss/add penalty.
+    This is checked locus by locus: each assignment of A at a locus (e.g., a kept,
+    a missed or an added mutation) is matched with the B's assignment that has
+    the same effect on the coverage and the phasing, and the worst penalty
+    difference is taken.
+    In the `safe` mode, B must be able to match all assignments of A, so the pruned
+    model has the same optimum as the full model. The `bound` mode ignores the
+    assignments that B cannot match; it is a heuristic as A might still be needed
+    for such an assignment (e.g., to explain a mutation that B cannot keep).
+    Only the candidates with a lower penalty bound (i.e., the penalty of the
+    mutations that cannot be kept) than A are considered for B.
+
+    :param gene: Gene instance.
+    :param coverage: Read coverage instance.
+    :param major_sol: Major allele solution for minor star-allele calling.
+    :param alleles: Candidate minor star-alleles.
+    :param mutations: Mutations used for the model building.
+    :returns: Remaining candidates (in the original order).
+    :raise: :py:class:`aldy.common.AldyException` if the pruning mode is invalid.
+    """
+
+    mode = coverage.profile.minor_prune
+    if mode not in ["bound", "safe", "none"]:
+        raise AldyException(f"Invalid minor_prune mode: {mode}")
+    if mode == "none":
+        return alleles
+
+    cn_sol = major_sol.cn_solution
+    miss, add = coverage.profile.minor_miss, coverage.profile.minor_add
+    at_pos: Dict[int, Set[Mutation]] = collections.defaultdict(set)
+    for m in mutations:
+        at_pos[m.pos].add(m)
+
+    def locus(major, own, pos):
+        """:returns: Penalty of each assignment at `pos` (keyed by its effect)."""
+        if not gene.has_coverage(major, pos):
+            return {(None, len(own)): miss * len(own)}
+        cand = own | at_pos[pos]
+        ref = [m for m in own if m.op[:3] != "ins"]
+        func = [m for m in own if gene.is_functional(m)]
+        opts = {}
+        for x in [None, *cand]:
+            if x is not None and (coverage[x] == 0 or cn_sol.position_cn(pos) == 0):
+                continue  # cannot be selected
+            if any(m != x for m in func):
+                continue  # functional mutations must be kept
+            if ref:
+                r = x != ref[0]
+            else:
+                r = x is None or x in own or x.op[:3] == "ins"
+            new = x is not None and x not in own
+            novel = new and gene.is_functional(x)
+            novel = novel and x not in gene.alleles[major].func_muts
+            opts[r, x, novel, len(cand) - (x is not None)] = (
+                miss * len(own - {x}) + add * new
+            )
+        return opts
+
+    empty_cache: dict = {}
+
+    def empty(major, pos):
+        if (major, pos) not in empty_cache:
+            empty_cache[major, pos] = locus(major, set(), pos)
+        return empty_cache[major, pos]
+
+    def dominates(b, a):
+        """:returns: `True` if the candidate `b` dominates the candidate `a`."""
+        delta = 0.0
+        for pos in a[2].keys() | b[2].keys():
+            oa = a[2].get(pos) or empty(a[1].major, pos)
+            ob = b[2].get(pos) or empty(b[1].major, pos)
+            if not oa:
+                return True  # A cannot be selected
+            if mode == "safe" and not oa.keys() <= ob.keys():
+                return False
+            d = [ob[k] - p for k, p in oa.items() if k in ob]
+            if not d:
+                return False
+            delta += max(d)
+        return delta < 0
+
+    groups: dict = collections.defaultdict(list)
+    for a in alleles:
+        key = SolvedAllele(gene, a.major, "", a.added, a.missing)
+        if major_sol.solution.get(key, 0) > 0:
+            groups[key].append(a)
+    keep = set()
+    for group in groups.values():
+        cands = []
+        for a in set(group):
+            own: dict = collections.defaultdict(set)
+            for m in gene.alleles[a.major].func_muts:
+                own[m.pos].add(m)
+            for m in gene.alleles[a.major].minors[a.minor].neutral_muts:
+                own[m.pos].add(m)
+            opts = {pos: locus(a.major, muts, pos) for pos, muts in own.items()}
+            lb = sum(min(o.values(), default=math.inf) for o in opts.values())
+            cands.append((lb, a, opts))
+        for c in cands:
+            if not any(b[0] < c[0] and dominates(b, c) for b in cands):
+                keep.add(c[1])
+    pruned = len(set(alleles)) - len(keep)
+    log.debug("[minor] candidates= {} (pruned= {})", len(keep), pruned)
+    return [a for a in alleles if a in keep]
+
+
 def _print_candidates(gene, alleles, cn_sol, coverage, muts):
     """Pretty-print the list of allele candidates and their mutations."""
 
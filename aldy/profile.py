@@ -4,18 +4,21 @@
 #   file 'LICENSE', which is part of this source code package.
 
 
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 import importlib.resources
+import concurrent.futures
 import pysam
 import os
 import os.path
 import yaml
 
-from collections import defaultdict
 from natsort import natsorted
 from .common import log, GRange, AldyException, script_path, chr_prefix
 from .gene import Gene
 
+SHARD_GAP = 10_000
+"""Maximum distance between the regions that are scanned together in a profile."""
+
 
 class Profile:
     """Profile and model parameter information."""
@@ -137,6 +140,13 @@ class Profile:
         Default: 0.25.
         """
 
+        self.cn_enumeration_limit = 100_000
+        """
+        Maximum number of copy number configuration combinations that are scored
+        directly instead of solving the copy number ILP (0 to always use the ILP).
+        Default: 100,000
+        """
+
         self.major_novel = 21.0
         """
         Penalty for novel functional mutation (0 for no penalty).
@@ -173,6 +183,16 @@ class Profile:
         Default: 3,000
         """
 
+        self.minor_prune = "safe"
+        """
+        Pruning of the minor star-allele candidates before building the minor model.
+        Use `safe` to drop only the provably dominated candidates, `bound` to also
+        drop the candidates whose penalty bounds suggest that some other candidate
+        is always better (faster, but it might drop an optimal candidate),
+        or `none` to keep all candidates.
+        Default: safe
+        """
+
         self.male = False
         """
         Set if the sample is male (i.e., has two X chromosomes). Used for calling
@@ -186,6 +206,56 @@ class Profile:
         Default: 1
         """
 
+        self.cn_time_limit = 0.0
+        """
+        Time limit (in seconds) of the copy number solver (0 for no limit).
+        If the limit is reached, the best solution found so far is reported.
+        Default: 0
+        """
+
+        self.major_time_limit = 0.0
+        """
+        Time limit (in seconds) of the major star-allele solver for each copy number
+        solution (0 for no limit).
+        Default: 0
+        """
+
+        self.minor_time_limit = 0.0
+        """
+        Time limit (in seconds) of the minor star-allele solver for each major
+        solution (0 for no limit). Use it if the minor model takes too long to
+        complete.
+        Default: 0
+        """
+
+        self.cn_mip_gap = 0.0
+        """
+        Relative optimality gap at which the copy number solver stops
+        (0 for the solver's default).
+        Default: 0
+        """
+
+        self.major_mip_gap = 0.0
+        """
+        Relative optimality gap at which the major star-allele solver stops
+        (0 for the solver's default).
+        Default: 0
+        """
+
+        self.minor_mip_gap = 0.0
+        """
+        Relative optimality gap at which the minor star-allele solver stops
+        (0 for the solver's default).
+        Default: 0
+        """
+
+        self.solver_threads = 0
+        """
+        Number of parallel search workers of the CP-SAT solver
+        or threads of the HiGHS solver (0 for all available CPUs).
+        Default: 0
+        """
+
         self.display_format = False
         """
         New novel allele display format.
@@ -310,12 +380,14 @@ class Profile:
         cn_region: Optional[GRange] = None,
         genome: Optional[str] = "hg19",
         params: Dict = dict(),
+        jobs: int = 1,
     ) -> Dict[str, Dict[str, List[float]]]:
         """
         Load the profile information from a SAM/BAM/CRAM file.
 
         :param regions: List of regions to be extracted.
         :param cn_region: Copy-number neutral region.
+        :param jobs: Number of processes that scan the file in parallel.
 
         :return: list of tuples `(gene_name, chromosome, loci, coverage)`.
 
@@ -354,48 +426,39 @@ class Profile:
             cn_region if cn_region else default_cn_neutral_region[genome]
         )
 
-        chr_regions: Dict[str, Tuple[int, int]] = {}
-        for c, s, e in gene_regions.values():
-            if c not in chr_regions:
-                chr_regions[c] = (s, e)
+        # Group the nearby regions into shards (the intergenic sequence is skipped)
+        # that are scanned in parallel
+        shards: List[List] = []  # (chromosome, start, end, regions)
+        for c, s, e in natsorted(set(gene_regions.values())):
+            if shards and shards[-1][0] == c and s <= shards[-1][2] + SHARD_GAP:
+                shards[-1][2] = max(shards[-1][2], e)
+                shards[-1][3].append((s, e))
             else:
-                chr_regions[c] = (min(s, chr_regions[c][0]), max(e, chr_regions[c][1]))
-
-        cov: dict = defaultdict(lambda: defaultdict(int))
-        for c, (s, e) in natsorted(chr_regions.items()):
-            if sam_path == "<illumina>":
-                continue
-            with pysam.AlignmentFile(  # type: ignore
-                sam_path, reference_filename=ref_path
-            ) as sam:
-                region = GRange(c, s, e).samtools(
-                    pad_left=1000,
-                    pad_right=1000,
-                    prefix=chr_prefix(c, [x["SN"] for x in sam.header["SQ"]]),
-                )
-                log.info("Scanning {}...", region)
-                try:
-                    for read in sam.fetch(region=region):
-                        start, s_start = read.reference_start, 0
-                        if not read.cigartuples:
-                            continue
-
-                        for op, size in read.cigartuples:
-                            if op == 2:
-                                for i in range(size):
-                                    cov[c][start + i] += 1
-                                start += size
-                            elif op == 1:
-                                s_start += size
-                            elif op == 4:
-                                s_start += size
-                            elif op in [0, 7, 8]:
-                                for i in range(size):
-                                    cov[c][start + i] += 1
-                                start += size
-                                s_start += size
-                except ValueError:
-                    log.warn("Cannot fetch {}", region)
+                shards.append([c, s, e, [(s, e)]])
+
+        cov: Dict[GRange, int] = {}
+        if sam_path != "<illumina>":
+            pool = concurrent.futures.ProcessPoolExecutor(jobs) if jobs > 1 else None
+            try:
+                with pysam.AlignmentFile(  # type: ignore
+                    sam_path, reference_filename=ref_path
+                ) as sam:
+                    chrs = [x["SN"] for x in sam.header["SQ"]]
+                tasks: List[Any] = []
+                for c, s, e, rs in shards:
+                    region = GRange(c, s, e).samtools(
+                        pad_left=0, pad_right=0, prefix=chr_prefix(c, chrs)
+                    )
+                    log.info("Scanning {}...", region)
+                    args = (sam_path, ref_path, region, rs)
+                    tasks.append(pool.submit(_shard_coverage, *args) if pool else args)
+                for (c, _, _, rs), task in zip(shards, tasks):
+                    totals = task.result() if pool else _shard_coverage(*task)
+                    for (s, e), n in zip(rs, totals):
+                        cov[GRange(c, s, e)] = n
+            finally:
+                if pool:
+                    pool.shutdown()
 
         d: Dict = {}
         for (g, r, ri), (c, s, e) in gene_regions.items():
@@ -408,7 +471,7 @@ class Profile:
             if sam_path == "<illumina>":
                 d[g][r][ri] = e - s
             else:
-                d[g][r][ri] = sum(cov[c][i] for i in range(s, e))
+                d[g][r][ri] = cov[GRange(c, s, e)]
         d["neutral"]["value"] = d["neutral"]["value"][0]
         d["neutral"][genome] = [*gene_regions["neutral", "value", 0]]
         if params:
@@ -416,3 +479,31 @@ class Profile:
             for k, v in Profile("").update(params).items():
                 d["options"][k] = v
         return d
+
+
+def _shard_coverage(
+    sam_path: str,
+    ref_path: Optional[str],
+    region: str,
+    regions: List[Tuple[int, int]],
+) -> List[int]:
+    """
+    Calculate the total read coverage of the regions within a chromosome span.
+
+    :param region: Span in samtools format (e.g. chr1:10-20).
+    :param regions: Regions within the span.
+    :returns: Total coverage of each region.
+    """
+
+    from .sam import DepthCounter
+
+    depth = DepthCounter(supplementary=True)
+    with pysam.AlignmentFile(  # type: ignore
+        sam_path, reference_filename=ref_path
+    ) as sam:
+        try:
+            for read in sam.fetch(region=region):
+                depth.add(read)
+        except ValueError:
+            log.warn("Cannot fetch {}", region)
+    return [depth.total(s, e) for s, e in regions]
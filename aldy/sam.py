@@ -4,22 +4,37 @@
 #   file 'LICENSE', which is part of this source code package.
 
 
-from typing import Tuple, Dict, List, Optional
+from typing import Tuple, Dict, List, Optional, Set, Union
 from collections import defaultdict, Counter
 from statistics import mean
 import pysam
+import array
+import bisect
+import numpy as np
 import os
 import os.path
 import gzip
+import io
+import itertools
+import json
+import struct
 import tarfile
 import pickle
-import tempfile
+import zipfile
 
 from .common import log, GRange, AldyException, script_path, Timing, chr_prefix
 from .gene import Gene, CNConfigType
 from .coverage import Coverage
 from .profile import Profile
 
+DUMP_VERSION = 1
+"""Version of the dump format (see :py:meth:`Sample._dump_alignments`)."""
+
+_PICKLED_DUMP_ERROR = (
+    "Dump {} uses the older pickle format, which is unsafe to load. "
+    + "Use --allow-pickle only if it comes from a trusted source."
+)
+
 
 class Sample:
     """Parse read alignments in a SAM/BAM/CRAM/VCF/dump format"""
@@ -32,6 +47,7 @@ class Sample:
         reference: Optional[str] = None,
         debug: Optional[str] = None,
         store_reads: bool = False,
+        allow_pickle: bool = False,
     ):
         """
         :param gene: Gene instance.
@@ -41,11 +57,53 @@ class Sample:
             Default: None.
         :param debug: When set, create a `{debug}.dump` file for debug purposes.
             Default: None.
+        :param allow_pickle: Allow loading the older (pickled) dump files.
+            Only use it for the dumps from the trusted sources.
+            Default: `False`.
 
         :raise: :py:class:`aldy.common.AldyException` if the sample is invalid
             (e.g., the coverage of the copy-number neutral region is too low).
         """
 
+        self._setup(gene, profile, path, store_reads)
+
+        with Timing("[sam] Read SAM"):
+            self.kind, _ = detect_genome(path)
+            self.genome = gene.genome
+
+            if self.kind == "vcf":
+                try:
+                    norm, muts = self._load_vcf(
+                        path, profile.vcf_sample_idx if profile else 0
+                    )
+                except ValueError:
+                    raise AldyException(f"VCF {path} is not indexed")
+            elif self.kind == "dump":
+                norm, muts = self._load_dump(path, allow_pickle)
+            elif self.kind == "pscan":
+                norm, muts = self._load_pscan(path)
+            else:
+                if self.profile and self.profile.sam_long_reads:
+                    self.is_long_read = True
+                    norm, muts = self._load_long_sam(path, reference, debug)
+                else:
+                    norm, muts = self._load_sam(path, reference, debug)
+                if self.profile and self.profile.cn_region:
+                    self._dump_cn = self._load_cn_region(
+                        path, reference, self.profile.cn_region
+                    )
+            self._make_coverage(norm, muts)
+            self._phases.compact()
+            if self.kind == "sam" and debug:
+                self._dump_alignments(f"{debug}.{gene.name}", norm, muts)
+
+        self._check_coverage()
+
+    def _setup(
+        self, gene: Gene, profile: Optional[Profile], path: str, store_reads=False
+    ):
+        """Initialize the sample state prior to reading the alignments."""
+
         self.name = os.path.basename(path).split(".")[0]
         """Sample name."""
 
@@ -58,8 +116,8 @@ class Sample:
         self.path = path
         """File path."""
 
-        self._dump_cn = defaultdict(int)
-        """dict[int, int]: Coverage of the copy-number neutral region"""
+        self._dump_cn = np.zeros(0, dtype=np.int64)
+        """numpy.ndarray: Read depth of the copy-number neutral region"""
 
         self._dump_reads: List[Tuple[Tuple, List]] = []
         """list[tuple[tuple, list]]: Read information."""
@@ -82,9 +140,19 @@ class Sample:
             pos: i for i, pos in enumerate(sorted({pos for pos, _ in gene.mutations}))
         }
         """Locations that should be phased."""
+        self._phaseable_pos = sorted(self.phaseable)
+
+        # Reference sequence codes used for the fast mismatch detection
+        # (0 indicates a location outside of the RefSeq region)
+        lo, hi = gene.chr_to_ref.bounds()
+        ref = np.frombuffer(gene[lo : hi + 1].encode(), dtype=np.uint8).copy()
+        in_ref = np.zeros(len(ref), dtype=bool)
+        for st, sz in zip(gene.chr_to_ref.starts, gene.chr_to_ref.sizes):
+            in_ref[st - lo : st - lo + sz] = True
+        ref[~in_ref] = 0
+        self._ref_codes, self._ref_start = ref, lo
 
-        self.phases: Dict[str, Dict[int, str]] = {}
-        """Phasing information."""
+        self._phases = _PhaseMatrix(self.phaseable)
 
         self._fusion_counter: Dict = {}
         """Fusion read coverage (for long reads)."""
@@ -94,34 +162,23 @@ class Sample:
 
         self.reads = [] if store_reads else None
 
-        with Timing("[sam] Read SAM"):
-            self.kind, _ = detect_genome(path)
-            self.genome = gene.genome
+    @property
+    def phases(self) -> "_PhaseMatrix":
+        """Phasing information (see :py:class:`_PhaseMatrix`)."""
+        return self._phases
 
-            if self.kind == "vcf":
-                try:
-                    norm, muts = self._load_vcf(
-                        path, profile.vcf_sample_idx if profile else 0
-                    )
-                except ValueError:
-                    raise AldyException(f"VCF {path} is not indexed")
-            elif self.kind == "dump":
-                norm, muts = self._load_dump(path)
-            elif self.kind == "pscan":
-                norm, muts = self._load_pscan(path)
-            else:
-                if self.profile and self.profile.sam_long_reads:
-                    self.is_long_read = True
-                    norm, muts = self._load_long_sam(path, reference, debug)
-                else:
-                    norm, muts = self._load_sam(path, reference, debug)
-                if self.profile and self.profile.cn_region:
-                    self._dump_cn = self._load_cn_region(
-                        path, reference, self.profile.cn_region
-                    )
-            self._make_coverage(norm, muts)
-            if self.kind == "sam" and debug:
-                self._dump_alignments(f"{debug}.{gene.name}", norm, muts)
+    @phases.setter
+    def phases(self, phases: Dict[str, Dict[int, str]]):
+        """Set the phasing information from a dictionary of fragment phasings."""
+        self._phases = _PhaseMatrix.from_dict(phases)
+
+    def _check_coverage(self):
+        """
+        Normalize the sample coverage and ensure that it is sufficient for genotyping.
+
+        :raise: :py:class:`aldy.common.AldyException` if the coverage of the
+            copy-number neutral region is too low.
+        """
 
         assert self.profile, "profile not set"
         if self.profile.cn_region:
@@ -145,27 +202,19 @@ class Sample:
             log.debug("[sam] reference= {}", os.path.abspath(reference))
         assert self.profile, "profile not set"
 
-        norm: dict = defaultdict(list)
-        muts: dict = defaultdict(list)
+        norm = _QualityCounts()
+        muts: dict = defaultdict(Counter)
 
         with pysam.AlignmentFile(  # type: ignore
             sam_path, reference_filename=reference
         ) as sam:
             # Check do we have proper index to speed up the queries
-            try:
-                has_index = sam.check_index()
-            except AttributeError:
-                # SAM files do not have an index. BAMs might also lack it
-                has_index = False
-            except ValueError:
-                raise AldyException(f"Cannot check index of {sam_path}")
-
+            has_index = _has_index(sam, sam_path)
             self._prefix = chr_prefix(
                 self.gene.chr, [x["SN"] for x in sam.header["SQ"]]
             )
 
-            with tempfile.TemporaryDirectory() as tmp:
-                self._realign_indels(tmp, sam, reference)
+            self._realign_indels(sam, reference)
             if has_index:
                 iter = sam.fetch(
                     region=self.gene.get_wide_region().samtools(prefix=self._prefix)
@@ -175,43 +224,53 @@ class Sample:
                 iter = sam.fetch()
             # Fetch the reads
             for read in iter:
-                if not read.cigartuples:  # only valid alignments
-                    continue
-                if read.is_supplementary:  # avoid supplementary alignments
-                    continue
-                if "H" in read.cigarstring:  # avoid hard-clipped reads
-                    continue
-                if not read.query_sequence:
-                    continue
-                # ensure that it is a proper gene read
-                if not _in_region(self.gene.get_wide_region(), read, self._prefix):
-                    continue
+                self._load_read(read, norm, muts, debug)
+        return norm.finalize(), muts
 
-                # Handle 10X Genomics tags
-                if read.has_tag("BX"):
-                    fragment = read.get_tag("BX")
-                    if read.has_tag("XC"):
-                        fragment = f"{fragment}:{read.get_tag('XC')}"
-                    elif read.has_tag("MI"):
-                        fragment = f"{fragment}:{read.get_tag('MI')}"
-                    self.is_long_read = True
-                else:
-                    fragment = read.query_name
-                r = self._parse_read(
-                    fragment,
-                    read.reference_start,
-                    read.cigartuples,
-                    read.query_sequence,
-                    norm,
-                    muts,
-                    read.mapping_quality,
-                    read.query_qualities,
-                )
-                if self.reads is not None:
-                    self.reads.append((read.query_sequence, read.query_name, r))
-                if r and debug:
-                    self._dump_reads.append(r)
-        return norm, muts
+    def _load_read(self, read, norm, muts, debug=None):
+        """
+        Parse a single SAM/BAM/CRAM read if it is a valid alignment that overlaps
+        the gene region.
+
+        .. note:: `norm` and `muts` are modified.
+        """
+
+        if not read.cigartuples:  # only valid alignments
+            return
+        if read.is_supplementary:  # avoid supplementary alignments
+            return
+        if "H" in read.cigarstring:  # avoid hard-clipped reads
+            return
+        if not read.query_sequence:
+            return
+        # ensure that it is a proper gene read
+        if not _in_region(self.gene.get_wide_region(), read, self._prefix):
+            return
+
+        # Handle 10X Genomics tags
+        if read.has_tag("BX"):
+            fragment = read.get_tag("BX")
+            if read.has_tag("XC"):
+                fragment = f"{fragment}:{read.get_tag('XC')}"
+            elif read.has_tag("MI"):
+                fragment = f"{fragment}:{read.get_tag('MI')}"
+            self.is_long_read = True
+        else:
+            fragment = read.query_name
+        r = self._parse_read(
+            fragment,
+            read.reference_start,
+            read.cigartuples,
+            read.query_sequence,
+            norm,
+            muts,
+            read.mapping_quality,
+            read.query_qualities,
+        )
+        if self.reads is not None:
+            self.reads.append((read.query_sequence, read.query_name, r))
+        if r and debug:
+            self._dump_reads.append(r)
 
     def _load_vcf(self, vcf_path: str, sample_idx: int = 0):
         """Load the read, mutation and coverage data from a VCF file."""
@@ -219,13 +278,13 @@ class Sample:
         log.debug("[vcf] path= {}", os.path.abspath(vcf_path))
 
         norm = {
-            p: [(40, 40)] * 20
+            p: Counter({(40, 40): 20})
             for p in range(
                 self.gene.get_wide_region().start - 500,
                 self.gene.get_wide_region().end + 1,
             )
         }
-        muts: dict = defaultdict(list)
+        muts: dict = defaultdict(Counter)
 
         def get_mut(pos, ref, alt):
             off = 0
@@ -271,8 +330,8 @@ class Sample:
                     pos, op = hgvs[gt]
                     if op == "_":
                         continue
-                    muts[pos, op] += [(40, 40)] * 10
-                    norm[pos] = norm[pos][:-10]
+                    muts[pos, op][40, 40] += 10
+                    norm[pos][40, 40] = max(0, norm[pos][40, 40] - 10)
                     dump_arr[pos] = op
 
                 # Handle multi-SNPs
@@ -288,14 +347,21 @@ class Sample:
                         for p in range(len(l)):
                             if l[p] != ".":
                                 np = pos + p, f"{l[p]}>{r[p]}"
-                                muts[np] = muts[np][:-10]
+                                muts[np][40, 40] = max(0, muts[np][40, 40] - 10)
                                 if p:
-                                    norm[pos + p] += [(40, 40)] * 10
-                        muts[pos, op] += [(40, 40)] * 10
+                                    norm[pos + p][40, 40] += 10
+                        muts[pos, op][40, 40] += 10
         return norm, muts
 
-    def _load_dump(self, dump_path: str):
-        """Load Aldy dump data."""
+    def _load_dump(self, dump_path: str, allow_pickle: bool = False):
+        """
+        Load Aldy dump data (see :py:meth:`_dump_alignments`).
+        Plain dump files are memory-mapped.
+
+        :param allow_pickle: Allow loading the older (pickled) dumps.
+        :raise: :py:class:`aldy.common.AldyException` if the dump is pickled and
+            `allow_pickle` is not set.
+        """
 
         log.debug("[dump] path= {}", os.path.abspath(dump_path))
         if dump_path.endswith(".tar.gz"):
@@ -307,11 +373,70 @@ class Sample:
             log.debug("Found {} in the archive", f[0])
             data = tar.extractfile(f[0])
             assert data, "Malformed dump file"
-            fd = gzip.open(data)
+            fd = io.BytesIO(data.read())
+            is_npz = zipfile.is_zipfile(fd)
+            fd.seek(0)
+            if is_npz:
+                arrays = dict(np.load(fd, allow_pickle=False))
+            elif allow_pickle:
+                return self._load_pickled_dump(dump_path, gzip.open(fd))
+            else:
+                raise AldyException(_PICKLED_DUMP_ERROR.format(dump_path))
+        elif zipfile.is_zipfile(dump_path):
+            arrays = _mmap_npz(dump_path)
+        elif allow_pickle:
+            return self._load_pickled_dump(dump_path, gzip.open(dump_path, "rb"))
         else:
-            fd = gzip.open(dump_path, "rb")
+            raise AldyException(_PICKLED_DUMP_ERROR.format(dump_path))
 
         log.warn("Loading debug dump from {}", dump_path)
+        meta = json.loads(arrays["meta"].item())
+        if meta["version"] > DUMP_VERSION:
+            raise AldyException(f"Unsupported dump version {meta['version']}")
+        if meta["gene"] != self.gene.name:
+            raise AldyException(f"Dump {dump_path} is not a {self.gene.name} dump")
+        self.name = meta["name"]
+        self.profile = Profile(meta["profile"]["name"])
+        self.profile.__dict__.update(meta["profile"])
+        if self.profile.cn_region:
+            self.profile.cn_region = GRange(*self.profile.cn_region)
+        self._setup_dump_profile()
+        self._fusion_counter = meta["fusion"]
+        self._dump_cn = arrays["cn"]
+
+        ops = arrays["ops"].tolist()
+        norm: Dict[int, Counter] = defaultdict(Counter)
+        muts: Dict[Tuple[int, str], Counter] = defaultdict(Counter)
+        for pos, op, mq, q, n in arrays["coverage"].tolist():
+            if op == 0:
+                norm[pos][mq, q] = n
+            else:
+                muts[pos, ops[op]][mq, q] = n
+        self._indel_sites = {
+            (pos, ops[op]): n
+            for pos, op, n in zip(
+                arrays["indel_pos"].tolist(),
+                arrays["indel_op"].tolist(),
+                arrays["indel_counts"].tolist(),
+            )
+        }
+        self._phases = _PhaseMatrix.from_arrays(
+            arrays["phase_row"],
+            arrays["phase_pos"],
+            arrays["phase_op"],
+            arrays["phase_ops"].tolist(),
+        )
+        return norm, muts
+
+    def _load_pickled_dump(self, dump_path: str, fd):
+        """
+        Load the older (pickled) Aldy dump data.
+
+        .. warning:: Unpickling can execute arbitrary code:
+            only load the pickled dumps from the trusted sources.
+        """
+
+        log.warn("Loading debug dump from {} (pickle format)", dump_path)
         (
             self.name,
             self.profile,
@@ -324,14 +449,24 @@ class Sample:
         ) = pickle.load(
             fd
         )  # type: ignore
+        self._setup_dump_profile()
+        self.phases = {f"r{i}": v for i, v in enumerate(phases)}
+        return norm, muts
+
+    def _setup_dump_profile(self):
+        """Reset the debug parameters of a profile that was loaded from a dump."""
+
+        assert self.profile, "profile not set"
         self.profile.display_format = False
         self.profile.debug_probe = ""
         self.profile.debug_novel = False
         self.profile.min_avg_coverage = 2.0
-        self.phases = {f"r{i}": v for i, v in enumerate(phases)}
-        norm = {p: [q for q, n in c.items() for _ in range(n)] for p, c in norm.items()}
-        muts = {p: [q for q, n in c.items() for _ in range(n)] for p, c in muts.items()}
-        return norm, muts
+        for stage in ["cn", "major", "minor"]:  # not present in the older dumps
+            self.profile.__dict__.setdefault(f"{stage}_time_limit", 0.0)
+            self.profile.__dict__.setdefault(f"{stage}_mip_gap", 0.0)
+        self.profile.__dict__.setdefault("cn_enumeration_limit", 100_000)
+        self.profile.__dict__.setdefault("minor_prune", "safe")
+        self.profile.__dict__.setdefault("solver_threads", 0)
 
     def _load_pscan(self, path: str):
         """Load Pharmacoscan probe data."""
@@ -339,13 +474,13 @@ class Sample:
         log.debug("[pscan] path= {}", os.path.abspath(path))
 
         norm = {
-            p: [(40, 40)] * 20
+            p: Counter({(40, 40): 20})
             for p in range(
                 self.gene.get_wide_region().start - 500,
                 self.gene.get_wide_region().end + 1,
             )
         }
-        muts: dict = defaultdict(list)
+        muts: dict = defaultdict(Counter)
 
         def parse(start, ref, alt):
             while ref and alt and ref[0] == alt[0]:
@@ -420,51 +555,100 @@ class Sample:
                         m += 10
                         r -= 10
                 if m:
-                    muts[mut] += [(40, 40)] * m
-                    norm[mut[0]] = norm[mut[0]][:r]
+                    muts[mut][40, 40] += m
+                    norm[mut[0]][40, 40] = min(norm[mut[0]][40, 40], r)
         return norm, muts
 
     def _dump_alignments(self, debug: str, norm, muts):
-        """Pickle alignment data for debug purposes."""
+        """
+        Save the alignment data for debug purposes as an (uncompressed) NPZ archive.
+        The archive contains the sample metadata (as JSON) and the following arrays:
+
+            - `coverage`: location, operation, mapping quality, base quality and
+              read count of each quality score count,
+            - `ops`: operations (indexed by `coverage` and `indel_op`),
+            - `cn`: read depth of the copy-number neutral region,
+            - `indel_pos`, `indel_op` and `indel_counts`: realigned indel coverage,
+            - `phase_row`, `phase_pos`, `phase_op` and `phase_ops`:
+              read phasing entries (see :py:meth:`_PhaseMatrix.to_arrays`).
+        """
+
         with open(f"{debug}.genome", "w") as fd:
             print(self.gene.genome, file=fd)
-        with gzip.open(f"{debug}.dump", "wb") as fd:  # type: ignore
-            pickle.dump(
-                (
-                    self.name,
-                    self.profile,
-                    self._dump_cn,
-                    {p: Counter(q) for p, q in norm.items()},
-                    {p: Counter(q) for p, q in muts.items()},
-                    [v for v in self.phases.values() if len(v) > 1],
-                    self._fusion_counter,
-                    self._indel_sites,  # TODO: remove
-                ),
-                fd,  # type: ignore
+        ops: Dict[str, int] = {"_": 0}
+        coverage = []
+        for (pos, op), quals in itertools.chain(
+            (((p, "_"), q) for p, q in norm.items()), muts.items()
+        ):
+            code = ops.setdefault(op, len(ops))
+            coverage += [(pos, code, m, q, n) for (m, q), n in quals.items() if n > 0]
+        indels = [
+            (pos, ops.setdefault(op, len(ops)), *n)
+            for (pos, op), n in self._indel_sites.items()
+        ]
+        indels_arr = np.array(indels, dtype=np.int64).reshape(-1, 4)
+        phase_row, phase_pos, phase_op, phase_ops = self.phases.to_arrays(min_size=2)
+        assert self.profile, "profile not set"
+        meta = {
+            "version": DUMP_VERSION,
+            "name": self.name,
+            "gene": self.gene.name,
+            "genome": self.gene.genome,
+            "profile": self.profile.__dict__,
+            "fusion": self._fusion_counter,
+        }
+        with open(f"{debug}.dump", "wb") as fd:
+            np.savez(
+                fd,
+                meta=np.array(json.dumps(meta)),
+                coverage=np.array(coverage, dtype=np.int64).reshape(-1, 5),
+                ops=np.array(list(ops)),
+                cn=np.asarray(self._dump_cn, dtype=np.int64),
+                indel_pos=indels_arr[:, 0],
+                indel_op=indels_arr[:, 1],
+                indel_counts=indels_arr[:, 2:],
+                phase_row=phase_row,
+                phase_pos=phase_pos,
+                phase_op=phase_op,
+                phase_ops=np.array(phase_ops),
             )
 
-    def _realign_indels(self, tmp, sam, reference, long_reads=False):
-        """Realign reads around database indels via indelpost module."""
+    def _realign_indels(self, sam, reference, long_reads=False):
+        """
+        Realign reads around database indels via indelpost module.
+        If the reference is not provided, the gene sequence is served from memory.
+        """
 
         assert self.profile, "profile not loaded"
 
-        from .indelpost import Variant, VariantAlignment
+        from .indelpost import Variant, VariantAlignment, SharedPileup
 
         rname = f"{self._prefix}{self.gene.chr}"
-        if not reference:
-            reference = f"{tmp}/ref.fa"
-            with open(reference, "w") as f:
-                print(f">{rname}", file=f)
-                print("N" * self.gene._lookup_range[0], end="", file=f)
-                print(self.gene._lookup_seq, end="", file=f)
-                sz = sam.get_reference_length(rname)
-                print("N" * (sz - self.gene._lookup_range[1]), file=f)
-            with open(f"{reference}.fai", "w") as f:
-                print(rname, sz, len(rname) + 2, sz, sz + 1, sep="\t", file=f)
-        ref = pysam.FastaFile(reference)  # type: ignore
+        if reference:
+            ref = pysam.FastaFile(reference)  # type: ignore
+        else:
+            ref = _GeneReference(
+                rname,
+                sam.get_reference_length(rname),
+                self.gene._lookup_range[0],
+                self.gene._lookup_seq,
+            )
+
+        # Nearby indels share the same pileup: reads are fetched and parsed only once.
+        # Indels that are more than `gap` bases apart belong to different pileups;
+        # each pileup covers additional `margin` bases on each side.
+        sites = sorted(self._indel_sites, key=lambda x: (x[0], -len(x[1])))
+        gap, margin = 1_000, 250
+        cluster_end: Dict[int, int] = {}
+        end = next_pos = None
+        for pos, _ in reversed(sites):
+            if next_pos is None or next_pos - pos > gap:
+                end = pos
+            cluster_end[pos], next_pos = end, pos
+        pileup = None
 
         prev_indel = None
-        for pos, op in sorted(self._indel_sites, key=lambda x: (x[0], -len(x[1]))):
+        for pos, op in sites:
             p = pos
             if op.startswith("del"):
                 if "ins" in op:
@@ -494,6 +678,13 @@ class Sample:
                         self._indel_sites_eqs[np, no] = (pos, op)
                 continue
 
+            if pileup is None or not pileup.covers(rname, pos, pos + 1):
+                pileup = SharedPileup(  # type: ignore
+                    sam,
+                    rname,
+                    max(0, pos - margin),
+                    min(ref.get_reference_length(rname), cluster_end[pos] + margin),
+                )
             try:
                 exact_match_for_shiftable = True
                 valn = VariantAlignment(  # type: ignore
@@ -503,6 +694,7 @@ class Sample:
                     base_quality_threshold=self.profile.min_quality,
                     # needed to account for indel and database errors
                     exact_match_for_shiftable=exact_match_for_shiftable,
+                    shared_pileup=pileup,
                 )
 
                 phased = valn.phase()
@@ -540,18 +732,12 @@ class Sample:
 
         :param cn_region: Copy-number neutral region to be used for coverage rescaling.
         """
-        self._dump_cn = defaultdict(int)
+        depth = DepthCounter()
         with pysam.AlignmentFile(  # type: ignore
             path, reference_filename=reference
         ) as sam:
             # Check do we have proper index to speed up the queries
-            try:
-                has_index = sam.check_index()
-            except AttributeError:
-                # SAM files do not have an index. BAMs might also lack it
-                has_index = False
-            except ValueError:
-                raise AldyException(f"Cannot check index of {self.path}")
+            has_index = _has_index(sam, self.path)
             self._prefix = chr_prefix(
                 self.gene.chr, [x["SN"] for x in sam.header["SQ"]]
             )
@@ -564,42 +750,36 @@ class Sample:
                 iter = sam.fetch()
             for read in iter:
                 if _in_region(cn_region, read, self._prefix):
-                    start = read.reference_start
-                    if read.cigartuples is None:
-                        continue
-                    if read.is_supplementary:
-                        continue
-                    for op, size in read.cigartuples:
-                        if op in [0, 7, 8, 2]:
-                            for i in range(size):
-                                self._dump_cn[start + i] += 1
-                            start += size
+                    depth.add(read)
+        self._dump_cn = depth.depth(cn_region.start, cn_region.end)
         return self._dump_cn
 
     def _make_coverage(self, norm, muts):
         """Populate coverage data."""
 
-        coverage: Dict[int, Dict[str, List]] = dict()
+        coverage: Dict[int, Dict[str, Counter]] = dict()
         for pos, cov in norm.items():
-            if len(cov) == 0:
+            cov = +cov  # drop empty counts
+            if not cov:
                 continue
             coverage.setdefault(pos, {})["_"] = cov
-        bounds = min(self.gene.chr_to_ref), max(self.gene.chr_to_ref)
+        bounds = self.gene.chr_to_ref.bounds()
         for (pos, mut), cov in muts.items():
             if pos not in coverage:
                 coverage[pos] = {}
             if not bounds[0] <= pos <= bounds[1] and mut[:3] != "ins":
                 mut = "_"  # ignore mutations outside of the region of interest
-            coverage.setdefault(pos, {}).setdefault(mut, []).extend(cov)
+            coverage.setdefault(pos, {}).setdefault(mut, Counter()).update(+cov)
         for pos, op in self._multi_sites.items():
             if pos in coverage and op in coverage[pos]:
-                log.debug(f"[sam] multi-SNP {pos}{op}: {len(coverage[pos][op])} reads")
+                n = sum(coverage[pos][op].values())
+                log.debug(f"[sam] multi-SNP {pos}{op}: {n} reads")
         assert self.profile, "profile not set"
         self.coverage = Coverage(
             self.gene,
             self.profile,
             self,
-            {p: {m: v for m, v in coverage[p].items() if len(v) > 0} for p in coverage},
+            {p: {m: v for m, v in coverage[p].items() if v} for p in coverage},
             self._indel_sites,
             self._dump_cn,
         )
@@ -636,32 +816,21 @@ class Sample:
         .. note:: Qualities will be binned.
         """
 
-        def bin_quality(q):
-            """
-            Quality score binning.
-            See https://www.illumina.com/content/dam/illumina-marketing/docum ents/products/technotes/technote_understanding_quality_scores.pdf  # noqa
-            """
-            if q < 2:
-                return int(q)
-            if q < 10:
-                return 6
-            if q < 20:
-                return 15
-            if q < 29:
-                return 25
-            if q < 39:
-                return 35
-            return 40
-
-        phase = self.phases.setdefault(fragment, {})
+        phase: Dict[int, str] = {}
         dump_arr = []
+        quals = {}  # binned qualities of the read mutations
         start, s_start = ref_start, 0
         prev_q = 10
+        mq_bin = _bin_quality(mq)
+        read_seq = np.frombuffer(seq.encode(), dtype=np.uint8)
+        read_qual = np.asarray(qual, dtype=np.uint8) if qual else None
+        ref, ref_lo = self._ref_codes, self._ref_start
+        ref_hi = ref_lo + len(ref)
         for op, size in cigar:
             if op == 2:  # Deletion
                 mut = (start, "del" + self.gene[start : start + size])
                 for i in range(size):
-                    muts[start + i, "-"].append((bin_quality(mq), bin_quality(prev_q)))
+                    muts[start + i, "-"][mq_bin, _bin_quality(prev_q)] += 1
                 dump_arr.append(mut)
                 if start in self.phaseable:
                     phase[start] = mut[1]
@@ -671,7 +840,7 @@ class Sample:
             elif op == 1:  # Insertion
                 mut = (start, "ins" + seq[s_start : s_start + size])
                 q = mean(qual[s_start : s_start + size]) if qual else prev_q
-                muts[mut].append((bin_quality(mq), bin_quality(q)))
+                muts[mut][mq_bin, _bin_quality(q)] += 1
                 prev_q = q
                 dump_arr.append(mut)
                 if start in self.phaseable:
@@ -682,22 +851,40 @@ class Sample:
             elif op == 4:  # Soft-clip
                 s_start += size
             elif op in [0, 7, 8]:  # M, X and =
-                for i in range(size):
-                    q = qual[s_start + i] if qual else prev_q
-                    if (
-                        start + i in self.gene
-                        and self.gene[start + i] != seq[s_start + i]
-                    ):
-                        mut = (start + i, f"{self.gene[start + i]}>{seq[s_start + i]}")
-                        dump_arr.append(mut)
-                        muts[mut].append((bin_quality(mq), bin_quality(q)))
-                        if start + i in self.phaseable:
-                            phase[start + i] = mut[1]
-                    else:  # We ignore all mutations outside the RefSeq region
-                        norm[start + i].append((bin_quality(mq), bin_quality(q)))
-                        if start + i in self.phaseable:
-                            phase[start + i] = "_"
-                    prev_q = q
+                # Find the mismatches within the RefSeq region in one pass;
+                # we ignore all mutations outside the RefSeq region
+                lo, hi = max(start, ref_lo), min(start + size, ref_hi)
+                mismatches: List[int] = []
+                if lo < hi:
+                    r = ref[lo - ref_lo : hi - ref_lo]
+                    b = read_seq[s_start + lo - start : s_start + hi - start]
+                    mismatches = (
+                        np.flatnonzero((r != 0) & (r != b)) + (lo - start)
+                    ).tolist()
+                if read_qual is not None:
+                    q_bins = _BIN_QUALITY[read_qual[s_start : s_start + size]]
+                else:
+                    q_bins = np.full(size, _bin_quality(prev_q), dtype=np.int64)
+
+                ops = {}
+                for i in mismatches:
+                    mut = (start + i, f"{self.gene[start + i]}>{seq[s_start + i]}")
+                    dump_arr.append(mut)
+                    quals[mut] = (mq_bin, int(q_bins[i]))
+                    muts[mut][quals[mut]] += 1
+                    ops[start + i] = mut[1]
+                norm.add_block(start, mq_bin, q_bins, mismatches)
+
+                pi = bisect.bisect_left(self._phaseable_pos, start)
+                while (
+                    pi < len(self._phaseable_pos)
+                    and self._phaseable_pos[pi] < start + size
+                ):
+                    pos = self._phaseable_pos[pi]
+                    phase[pos] = ops.get(pos, "_")
+                    pi += 1
+                if read_qual is not None:
+                    prev_q = qual[s_start + size - 1]
                 start += size
                 s_start += size
 
@@ -714,18 +901,21 @@ class Sample:
                 items = []
                 for p in range(len(l)):
                     if l[p] != ".":
-                        items.append(muts[pos + p, f"{l[p]}>{r[p]}"].pop())
+                        mut = pos + p, f"{l[p]}>{r[p]}"
+                        items.append(quals[mut])
+                        muts[mut][items[-1]] -= 1
                         if p:  # no idea why...
-                            norm[pos + p].append(items[-1])
+                            norm[pos + p][items[-1]] += 1
                 # TODO: use sth else instead of mean?
-                muts[pos, op].append(
-                    (mean(mq for mq, _ in items), mean(q for _, q in items))
-                )
+                muts[pos, op][
+                    mean(mq for mq, _ in items), mean(q for _, q in items)
+                ] += 1
 
         if self._indel_sites_eqs:  # long-read hack
             for pos, op in self._indel_sites:
                 if ref_start <= pos < start:
                     self._indel_sites[pos, op][0] += 1
+        self._phases.add(fragment, phase)
         read_pos = (ref_start, start, len(seq))
         return read_pos, dump_arr
 
@@ -743,8 +933,8 @@ class Sample:
         assert self.genome == "hg38", "Only hg38 supported at this moment"
         assert self.profile, "profile not set"
 
-        norm: dict = defaultdict(list)
-        muts: dict = defaultdict(list)
+        norm = _QualityCounts()
+        muts: dict = defaultdict(Counter)
 
         self._index = None
         ref = script_path("aldy.resources.genes", f"{self.gene.name.lower()}.fa.gz")
@@ -800,10 +990,9 @@ class Sample:
                 self.gene.chr, [x["SN"] for x in sam.header["SQ"]]
             )
 
-            with tempfile.TemporaryDirectory() as tmp:
-                self._realign_indels(tmp, sam, reference, True)
-                for po, (off, on) in self._indel_sites.items():
-                    self._indel_sites[po] = [off - on, on]
+            self._realign_indels(sam, reference, True)
+            for po, (off, on) in self._indel_sites.items():
+                self._indel_sites[po] = [off - on, on]
 
             wide = self.gene.get_wide_region()
             end = wide.end
@@ -883,7 +1072,7 @@ class Sample:
                     counter += 1
                     if r and debug:
                         self._dump_reads.append(r)
-        return norm, muts
+        return norm.finalize(), muts
 
     def _map(self, idx, seq):
         """
@@ -973,6 +1162,111 @@ class Sample:
         return regs
 
 
+def load_samples(
+    genes: List[Tuple[Gene, Profile]],
+    path: str,
+    reference: Optional[str] = None,
+    debug: Optional[str] = None,
+) -> List[Union[Sample, AldyException]]:
+    """
+    Load the samples of multiple genes from a single SAM/BAM/CRAM file.
+    The file is opened only once: the wide regions of all genes and the copy-number
+    neutral regions are merged and sorted by their coordinates, and each read is
+    passed to every gene whose region it overlaps during a single sweep.
+
+    :param genes: List of gene and profile instances.
+        Long-read profiles are not supported.
+    :param path: Path to a SAM/BAM/CRAM file.
+    :param reference: Reference genome path for reading CRAM files.
+        Default: None.
+    :param debug: When set, create a `{debug}.{gene}.dump` file for each gene.
+        Default: None.
+    :returns: List of samples (one for each gene). If a sample is invalid, its
+        :py:class:`aldy.common.AldyException` is returned instead.
+    """
+
+    samples = []
+    for gene, profile in genes:
+        assert profile and not profile.sam_long_reads, "long reads not supported"
+        sample = Sample.__new__(Sample)
+        sample._setup(gene, profile, path)
+        sample.kind, sample.genome = "sam", gene.genome
+        samples.append(sample)
+    data = [(_QualityCounts(), defaultdict(Counter)) for _ in samples]
+    cn_data: Dict[GRange, DepthCounter] = {}
+
+    log.debug("[sam] path= {}", os.path.abspath(path))
+    with (
+        pysam.AlignmentFile(path, reference_filename=reference) as sam,  # type: ignore
+        Timing("[sam] Read SAM ({} genes)".format(len(samples))),
+    ):
+        has_index = _has_index(sam, path)
+        chrs = [x["SN"] for x in sam.header["SQ"]]
+
+        # Each consumer is a tuple (chromosome prefix, region, sample ID or `None`
+        # for the copy-number neutral region)
+        consumers = []
+        for si, sample in enumerate(samples):
+            sample._prefix = chr_prefix(sample.gene.chr, chrs)
+            sample._realign_indels(sam, reference)
+            region = sample.gene.get_wide_region()
+            consumers.append((sample._prefix, region, si))
+            cn_region = sample.profile.cn_region
+            if cn_region and cn_region not in cn_data:
+                cn_data[cn_region] = DepthCounter()
+                consumers.append((chr_prefix(cn_region.chr, chrs), cn_region, None))
+
+        def dispatch(read, active):
+            for prefix, region, si in active:
+                if not _in_region(region, read, prefix):
+                    continue
+                if si is None:
+                    cn_data[region].add(read)
+                else:
+                    samples[si]._load_read(read, *data[si], debug)
+
+        if has_index:
+            # Merge overlapping fetch regions (padded as in `GRange.samtools`)
+            intervals: List[Tuple[str, int, int, List]] = []
+            for c in sorted(consumers, key=lambda c: (c[0] + c[1].chr, c[1][1:])):
+                prefix, region, _ = c
+                contig = prefix + region.chr
+                st, ed = region.start - 501, region.end + 1
+                if intervals and intervals[-1][0] == contig and st <= intervals[-1][2]:
+                    intervals[-1][2] = max(intervals[-1][2], ed)
+                    intervals[-1][3].append(c)
+                else:
+                    intervals.append([contig, st, ed, [c]])
+            # Each consumer belongs to exactly one interval: a read that spans
+            # several intervals is fetched once per interval, but it reaches
+            # each of its consumers only once
+            for contig, st, ed, active in intervals:
+                for read in sam.fetch(contig, max(0, st), ed):
+                    dispatch(read, active)
+        else:
+            log.warn("SAM/BAM index not found. Reading will be slow.")
+            for read in sam.fetch():
+                dispatch(read, consumers)
+
+    cn_depth = {r: d.depth(r.start, r.end) for r, d in cn_data.items()}
+    results: List[Union[Sample, AldyException]] = []
+    for sample, (norm, muts) in zip(samples, data):
+        norm = norm.finalize()
+        assert sample.profile, "profile not set"
+        if sample.profile.cn_region:
+            sample._dump_cn = cn_depth[sample.profile.cn_region]
+        sample._make_coverage(norm, muts)
+        sample.phases.compact()
+        if debug:
+            sample._dump_alignments(f"{debug}.{sample.gene.name}", norm, muts)
+        try:
+            sample._check_coverage()
+            results.append(sample)
+        except AldyException as ex:
+            results.append(ex)
+    return results
+
+
 def detect_genome(sam_path: str) -> Tuple[str, Optional[str]]:
     """Detect file type and the reference genome."""
 
@@ -1019,6 +1313,11 @@ def detect_genome(sam_path: str) -> Tuple[str, Optional[str]]:
                 if data:
                     genome = data.read().decode("utf-8").strip()
                     return "dump", genome
+            if zipfile.is_zipfile(sam_path):
+                with np.load(sam_path, allow_pickle=False) as data:
+                    if "meta" not in data:
+                        raise AldyException("Invalid dump file")
+                    return "dump", json.loads(data["meta"].item())["genome"]
             if sam_path.endswith(".txt") and os.path.exists(sam_path):
                 with open(sam_path) as f:
                     if f.readline().startswith("##batch-folder"):
@@ -1026,6 +1325,49 @@ def detect_genome(sam_path: str) -> Tuple[str, Optional[str]]:
     return "", None
 
 
+def _mmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """
+    Load the arrays of an NPZ archive. The uncompressed arrays are memory-mapped.
+    """
+
+    arrays: Dict[str, np.ndarray] = {}
+    with zipfile.ZipFile(path) as z, open(path, "rb") as fd:
+        for info in z.infolist():
+            name = info.filename
+            name = name[:-4] if name.endswith(".npy") else name
+            with z.open(info) as f:
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+                elif version == (2, 0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+                else:
+                    shape = ()  # read the array directly
+                header_size = f.tell()
+            if (
+                info.compress_type != zipfile.ZIP_STORED
+                or not shape
+                or 0 in shape
+                or dtype.hasobject
+            ):
+                with z.open(info) as f:
+                    arrays[name] = np.lib.format.read_array(f, allow_pickle=False)
+                continue
+            # Array data follows the local file header and the array header
+            fd.seek(info.header_offset + 26)
+            name_size, extra_size = struct.unpack("<HH", fd.read(4))
+            offset = info.header_offset + 30 + name_size + extra_size + header_size
+            arrays[name] = np.memmap(
+                fd,
+                dtype=dtype,
+                mode="r",
+                offset=offset,
+                shape=shape,
+                order="F" if fortran else "C",
+            )
+    return arrays
+
+
 def _in_region(region: GRange, read, prefix: str) -> bool:
     """Check if a read intersects a given gene region."""
 
@@ -1037,3 +1379,416 @@ def _in_region(region: GRange, read, prefix: str) -> bool:
     a = (read.reference_start, read.reference_end)
     b = (region.start, region.end)
     return a[0] <= b[0] <= a[1] or b[0] <= a[0] <= b[1]
+
+
+def _has_index(sam, path: str) -> bool:
+    """
+    Check if a SAM/BAM/CRAM file has a proper index that speeds up the queries.
+    :raise: :py:class:`aldy.common.AldyException` if the index cannot be checked.
+    """
+
+    try:
+        return sam.check_index()
+    except AttributeError:
+        # SAM files do not have an index. BAMs might also lack it
+        return False
+    except ValueError:
+        raise AldyException(f"Cannot check index of {path}")
+
+
+class DepthCounter:
+    """
+    Read depth counter. Only the boundaries of the covered blocks (matches and
+    deletions) are stored for each read; the depth is computed from them
+    in a vectorized way.
+    """
+
+    def __init__(self, supplementary: bool = False):
+        """:param supplementary: Count the supplementary alignments."""
+        self.supplementary = supplementary
+        self._starts = array.array("q")
+        self._ends = array.array("q")
+
+    def add(self, read) -> None:
+        """Add the read coverage."""
+
+        if read.cigartuples is None:
+            return
+        if read.is_supplementary and not self.supplementary:
+            return
+        start = end = read.reference_start
+        for op, size in read.cigartuples:
+            if op in [0, 7, 8, 2]:
+                end += size
+            elif op == 3:  # Skipped region (e.g. an intron)
+                if end > start:
+                    self._starts.append(start)
+                    self._ends.append(end)
+                start = end = end + size
+        if end > start:
+            self._starts.append(start)
+            self._ends.append(end)
+
+    def _blocks(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        """:returns: Covered blocks clipped to `[start, end)`."""
+        starts = np.asarray(self._starts, dtype=np.int64)
+        ends = np.asarray(self._ends, dtype=np.int64)
+        return np.clip(starts, start, end), np.clip(ends, start, end)
+
+    def depth(self, start: int, end: int) -> np.ndarray:
+        """:returns: Read depth of each location within `[start, end)`."""
+        n = end - start
+        starts, ends = self._blocks(start, end)
+        diff = np.bincount(starts - start, minlength=n + 1)
+        diff -= np.bincount(ends - start, minlength=n + 1)
+        return np.cumsum(diff[:n])
+
+    def total(self, start: int, end: int) -> int:
+        """:returns: Total read depth of the locations within `[start, end)`."""
+        starts, ends = self._blocks(start, end)
+        return int((ends - starts).sum())
+
+
+def _bin_quality(q) -> int:
+    """
+    Quality score binning.
+    See https://www.illumina.com/content/dam/illumina-marketing/docum ents/products/technotes/technote_understanding_quality_scores.pdf  # noqa
+    """
+    if q < 2:
+        return int(q)
+    if q < 10:
+        return 6
+    if q < 20:
+        return 15
+    if q < 29:
+        return 25
+    if q < 39:
+        return 35
+    return 40
+
+
+_BIN_QUALITY = np.array([_bin_quality(q) for q in range(256)], dtype=np.int64)
+"""Quality score binning table (see :py:func:`_bin_quality`)."""
+
+
+class _QualityCounts(defaultdict):
+    """
+    Counts of binned (mapping quality, base quality) pairs at each location.
+    Behaves like `defaultdict(Counter)`. Bulk updates (see :py:meth:`add_block`)
+    are buffered as NumPy arrays and must be merged by :py:meth:`finalize`.
+    """
+
+    _BINS = sorted(set(_BIN_QUALITY.tolist()))
+    _INDEX = np.zeros(max(_BINS) + 1, dtype=np.int64)
+    _INDEX[_BINS] = np.arange(len(_BINS))
+    _BUFFER_SIZE = 1 << 22
+
+    def __init__(self):
+        super().__init__(Counter)
+        self._codes = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._buffer: List[np.ndarray] = []
+        self._buffer_size = 0
+
+    def add_block(self, start: int, mq: int, quals: np.ndarray, skip: List[int]):
+        """
+        Count the consecutive locations starting at `start`.
+
+        :param start: First location.
+        :param mq: Binned mapping quality.
+        :param quals: Binned base qualities (one for each location).
+        :param skip: Offsets of the locations that should not be counted.
+        """
+
+        # Each (location, mapping quality, base quality) is encoded as a single integer
+        codes = (start + np.arange(len(quals), dtype=np.int64)) << 6
+        codes += self._INDEX[mq] << 3
+        codes += self._INDEX[quals]
+        if skip:
+            codes = np.delete(codes, skip)
+        self._buffer.append(codes)
+        self._buffer_size += len(codes)
+        if self._buffer_size > self._BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        """Aggregate the buffered bulk updates."""
+
+        if not self._buffer:
+            return
+        codes = np.concatenate([self._codes] + self._buffer)
+        weights = np.concatenate(
+            [self._counts, np.ones(self._buffer_size, dtype=np.int64)]
+        )
+        self._codes, inv = np.unique(codes, return_inverse=True)
+        self._counts = np.bincount(inv, weights=weights).astype(np.int64)
+        self._buffer, self._buffer_size = [], 0
+
+    def finalize(self) -> Dict[int, Counter]:
+        """
+        Merge the bulk updates into the dictionary.
+
+        :returns: Dictionary that maps each location to its quality score counts
+            (ordered by locations).
+        """
+
+        self._flush()
+        bins = self._BINS
+        counts: Dict[int, Counter] = defaultdict(Counter)
+        for pos in sorted(set(self) | set((self._codes >> 6).tolist())):
+            counts[pos]  # keep the locations sorted
+        for code, n in zip(self._codes.tolist(), self._counts.tolist()):
+            counts[code >> 6][bins[(code >> 3) & 7], bins[code & 7]] += n
+        for pos, c in self.items():
+            counts[pos].update(c)
+        self._codes = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self.clear()
+        return counts
+
+
+class _PhaseMatrix:
+    """
+    Read phasing information: a sparse (fragment x phaseable location) matrix
+    of integer-coded read operations at each location.
+    Fragments added via :py:meth:`add` are buffered until :py:meth:`compact`.
+    """
+
+    def __init__(self, sites: Dict[int, int]):
+        self.sites = sites
+        """Column index of each phaseable location."""
+        self.ops: Dict[str, int] = {"_": 0}
+        """Integer code of each read operation."""
+        self.fragments: Dict[str, int] = {}
+        """Row index of each fragment (in order of appearance)."""
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._cols = np.zeros(0, dtype=np.int32)
+        self._codes = np.zeros(0, dtype=np.int32)
+        self._buffer = [array.array("i") for _ in range(3)]
+
+    @staticmethod
+    def from_dict(phases: Dict[str, Dict[int, str]]) -> "_PhaseMatrix":
+        """:returns: Matrix of fragment phasings given as `{fragment: {pos: op}}`."""
+        pos = sorted({p for ph in phases.values() for p in ph})
+        matrix = _PhaseMatrix({p: i for i, p in enumerate(pos)})
+        for fragment, ph in phases.items():
+            matrix.add(fragment, ph)
+        matrix.compact()
+        return matrix
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def add(self, fragment: str, phase: Dict[int, str]):
+        """
+        Add the read operations of a fragment. The operations that are already
+        present at the same locations are overwritten.
+
+        :param fragment: Fragment name.
+        :param phase: Read operation at each phaseable location.
+        """
+
+        row = self.fragments.setdefault(fragment, len(self.fragments))
+        rows, cols, codes = self._buffer
+        for pos, op in phase.items():
+            rows.append(row)
+            cols.append(self.sites[pos])
+            codes.append(self.ops.setdefault(op, len(self.ops)))
+
+    def compact(self):
+        """
+        Merge the buffered operations into the matrix (sorted by rows and columns).
+        Must be called before the matrix is shared between threads.
+        """
+
+        if not self._buffer[0]:
+            return
+        rows, cols, codes = (
+            np.concatenate([a, np.asarray(b, dtype=np.int32)])
+            for a, b in zip((self._rows, self._cols, self._codes), self._buffer)
+        )
+        keys = rows.astype(np.int64) * len(self.sites) + cols
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        idx = order[np.r_[keys[1:] != keys[:-1], True]]  # keep the latest operation
+        self._rows, self._cols, self._codes = rows[idx], cols[idx], codes[idx]
+        self._buffer = [array.array("i") for _ in range(3)]
+
+    @staticmethod
+    def _hash(keys: np.ndarray, seed: int) -> np.ndarray:
+        """SplitMix64 hash of each key."""
+        z = keys.astype(np.uint64) + np.uint64(seed * 0x9E3779B97F4A7C15 % 2**64)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+    def modes(self, positions: Set[int]) -> Dict[tuple, int]:
+        """
+        Group the fragments by their read operations at the given locations.
+
+        :param positions: Locations to be considered.
+        :returns: Number of fragments for each distinct phasing (a sorted tuple of
+            location and operation pairs) that covers at least two locations.
+            The phasings are ordered by their first appearance.
+        """
+
+        self.compact()
+        mask = np.isin(self._cols, [c for p, c in self.sites.items() if p in positions])
+        rows, cols, codes = self._rows[mask], self._cols[mask], self._codes[mask]
+        if not len(rows):
+            return {}
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        sizes = np.diff(np.r_[starts, len(rows)])
+
+        # Find the distinct rows via the hashes of their (location, operation) sets
+        keys = cols.astype(np.int64) * len(self.ops) + codes
+        hashes = [np.add.reduceat(self._hash(keys, i), starts) for i in (1, 2)]
+        multi = sizes > 1
+        hashes = [h[multi] for h in hashes] + [sizes[multi].astype(np.uint64)]
+        hashes = np.stack(hashes, axis=1)
+        starts, sizes = starts[multi], sizes[multi]
+        if not len(starts):
+            return {}
+        _, first, inv, counts = np.unique(
+            hashes, axis=0, return_index=True, return_inverse=True, return_counts=True
+        )
+        # Ensure that the rows with the same hash are identical
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        entries = np.repeat(starts, sizes) + offsets
+        same = np.repeat(starts[first[inv.reshape(-1)]], sizes) + offsets
+        if np.array_equal(keys[entries], keys[same]):
+            groups = {first[i]: counts[i] for i in np.argsort(first, kind="stable")}
+        else:  # hash collision: group the rows directly
+            groups, seen = {}, {}
+            for i, (st, sz) in enumerate(zip(starts, sizes)):
+                row = seen.setdefault(keys[st : st + sz].tobytes(), i)
+                groups[row] = groups.get(row, 0) + 1
+
+        positions = sorted(self.sites, key=self.sites.get)
+        ops = list(self.ops)
+        modes = {}
+        for i, n in groups.items():
+            st, en = starts[i], starts[i] + sizes[i]
+            mode = zip(cols[st:en].tolist(), codes[st:en].tolist())
+            modes[tuple(sorted((positions[c], ops[o]) for c, o in mode))] = int(n)
+        return modes
+
+    @staticmethod
+    def from_arrays(
+        rows: np.ndarray, positions: np.ndarray, codes: np.ndarray, ops: List[str]
+    ) -> "_PhaseMatrix":
+        """
+        :returns: Matrix with the given entries (see :py:meth:`to_arrays`).
+        """
+        pos, cols = np.unique(positions, return_inverse=True)
+        matrix = _PhaseMatrix({p: i for i, p in enumerate(pos.tolist())})
+        matrix.ops = {op: i for i, op in enumerate(ops)}
+        _, rows = np.unique(rows, return_inverse=True)
+        matrix.fragments = {f"r{i}": i for i in range(rows.max(initial=-1) + 1)}
+        matrix._rows = rows.reshape(-1).astype(np.int32)
+        matrix._cols = cols.reshape(-1).astype(np.int32)
+        matrix._codes = np.asarray(codes, dtype=np.int32)
+        return matrix
+
+    def to_arrays(
+        self, min_size: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+        """
+        :returns: Row, location and operation code of each entry of the fragments
+            that cover at least `min_size` locations, and the list of operations
+            (indexed by their codes).
+        """
+
+        self.compact()
+        keep = np.bincount(self._rows)[self._rows] >= min_size
+        positions = np.array(sorted(self.sites, key=self.sites.get), dtype=np.int64)
+        return (
+            self._rows[keep],
+            positions[self._cols[keep]],
+            self._codes[keep],
+            list(self.ops),
+        )
+
+
+class _GeneReference(pysam.FastaFile):
+    """
+    In-memory reference that contains only the gene sequence (all other locations
+    are masked with `N`). Mimics the parts of :py:class:`pysam.FastaFile` that are used
+    by indelpost without creating a FASTA file.
+    """
+
+    def __init__(self, name: str, length: int, start: int, seq: str):
+        """
+        :param name: Chromosome name.
+        :param length: Chromosome length.
+        :param start: Start of the gene sequence within the chromosome (0-based).
+        :param seq: Gene sequence.
+        """
+
+        self._name = name
+        self._length = length
+        self._start = start
+        self._seq = seq
+
+    def _open(self, *args, **kwargs):
+        pass  # Nothing to open: called by pysam.FastaFile.__cinit__
+
+    def is_open(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def __len__(self) -> int:
+        return 1
+
+    @property
+    def closed(self) -> bool:
+        return False
+
+    @property
+    def filename(self) -> bytes:
+        return b""
+
+    @property
+    def references(self) -> List[str]:
+        return [self._name]
+
+    @property
+    def nreferences(self) -> int:
+        return 1
+
+    @property
+    def lengths(self) -> List[int]:
+        return [self._length]
+
+    def get_reference_length(self, reference: str) -> int:
+        if reference != self._name:
+            raise KeyError(reference)
+        return self._length
+
+    def fetch(self, reference=None, start=None, end=None, region=None) -> str:
+        if region is not None:
+            reference, start, end = pysam.libcutils.parse_region(  # type: ignore
+                region=region
+            )
+        if reference != self._name:
+            raise KeyError(f"sequence '{reference}' not present")
+        start = 0 if start is None else start
+        end = self._length if end is None else min(end, self._length)
+        if start < 0:
+            raise ValueError(f"start out of range ({start})")
+        if start > end:
+            if start >= self._length:
+                return ""
+            raise ValueError(f"invalid coordinates: start ({start}) > stop ({end})")
+
+        # Only the gene sequence is available; everything else is N
+        i, j = max(start, self._start), min(end, self._start + len(self._seq))
+        if i >= j:
+            return "N" * (end - start)
+        return (
+            "N" * (i - start)
+            + self._seq[i - self._start : j - self._start]
+            + "N" * (end - j)
+        )
@@ -4,7 +4,7 @@
 #   file 'LICENSE', which is part of this source code package.
 
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from dataclasses import dataclass, field
 from natsort import natsorted
 from collections import Counter, defaultdict
@@ -28,6 +28,15 @@ class CNSolution:
     """
     region_cn: List[Dict[str, int]]
     """Gene region copy numbers inferred by this solution."""
+    status: str = field(default="optimal", compare=False)
+    """
+    Solver status: `optimal`, `time_limit` if the solver was interrupted by
+    the time limit (see :py:attr:`aldy.profile.Profile.cn_time_limit`),
+    or `gap_limit` if it stopped at the optimality gap
+    (see :py:attr:`aldy.profile.Profile.cn_mip_gap`).
+    """
+    proven_gap: float = field(default=0.0, compare=False)
+    """Proven relative optimality gap (non-zero only for the interrupted solvers)."""
 
     def __init__(self, gene: Gene, score: float, solution: List[str]):
         self.region_cn = [
@@ -87,7 +96,7 @@ class SolvedAllele:
 
     def mutations(self):
         """Set of allele mutations."""
-        m = self.gene.alleles[self.major].func_muts
+        m = set(self.gene.alleles[self.major].func_muts)
         if self.minor:
             m |= self.gene.alleles[self.major].minors[self.minor].neutral_muts
         m |= set(self.added)
@@ -134,6 +143,15 @@ class MajorSolution:
     List of added mutations. Will be assigned to :py:class:`SolvedAllele` in the
     minor star-allele calling step if phasing is enabled.
     """
+    status: str = field(default="optimal", compare=False)
+    """
+    Solver status: `optimal`, `time_limit` if the solver was interrupted by
+    the time limit (see :py:attr:`aldy.profile.Profile.major_time_limit`),
+    or `gap_limit` if it stopped at the optimality gap
+    (see :py:attr:`aldy.profile.Profile.major_mip_gap`).
+    """
+    proven_gap: float = field(default=0.0, compare=False)
+    """Proven relative optimality gap (non-zero only for the interrupted solvers)."""
 
     def _solution_nice(self):
         x = ", ".join(
@@ -169,6 +187,32 @@ class MinorSolution:
     """Major star-allele solution used for calculating minor star-allele assignments."""
     profile: Profile = None
     """Profile."""
+    status: str = field(default="optimal", compare=False)
+    """
+    Solver status: `optimal`, `time_limit` if the solver was interrupted by
+    the time limit (see :py:attr:`aldy.profile.Profile.minor_time_limit`),
+    or `gap_limit` if it stopped at the optimality gap
+    (see :py:attr:`aldy.profile.Profile.minor_mip_gap`).
+    """
+    proven_gap: float = field(default=0.0, compare=False)
+    """Proven relative optimality gap (non-zero only for the interrupted solvers)."""
+
+    def time_limits(self) -> List[Tuple[str, str, float]]:
+        """
+        :returns: Model stages (`cn`, `major` or `minor`) whose solvers were
+            interrupted by the time or the gap limit, together with the limit
+            (`time` or `gap`) and their proven optimality gaps.
+        """
+        stages = [
+            ("cn", self.major_solution.cn_solution),
+            ("major", self.major_solution),
+            ("minor", self),
+        ]
+        return [
+            (n, s.status.split("_")[0], s.proven_gap)
+            for n, s in stages
+            if s.status in ["time_limit", "gap_limit"]
+        ]
 
     def _solution_nice(self):
         return ", ".join(
@@ -5,11 +5,24 @@
 
 
 import pytest
+import os
 
 from aldy.gene import Gene
 from aldy.common import script_path
 
 
+@pytest.fixture(scope="session", autouse=True)
+def gene_cache(tmp_path_factory):
+    """Keep the compiled gene cache of the test runs out of the user cache."""
+    prev = os.environ.get("ALDY_CACHE")
+    os.environ["ALDY_CACHE"] = str(tmp_path_factory.mktemp("cache"))
+    yield
+    if prev is None:
+        del os.environ["ALDY_CACHE"]
+    else:
+        os.environ["ALDY_CACHE"] = prev
+
+
 @pytest.fixture
 def toy_gene():
     return Gene(script_path("aldy.tests.resources", "toy.yml"))
@@ -12,8 +12,15 @@ from aldy.common import SOLUTION_PRECISION
 
 
 def assert_cn(gene, solver, expected, cov, expected_obj=None, gap=0.0):
+    # Check both the ILP and the enumeration
+    for limit in [0, Profile("test").cn_enumeration_limit]:
+        assert_cn_model(gene, solver, expected, cov, expected_obj, gap, limit)
+
+
+def assert_cn_model(gene, solver, expected, cov, expected_obj, gap, limit):
     profile = Profile("test")
     profile.gap = gap
+    profile.cn_enumeration_limit = limit
     sols = solve_cn_model(
         gene,
         profile,
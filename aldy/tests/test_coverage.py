@@ -0,0 +1,103 @@
+# 786
+# Aldy source: test_coverage.py
+#   This file is subject to the terms and conditions defined in
+#   file 'LICENSE', which is part of this source code package.
+
+
+import pytest  # noqa
+from collections import Counter
+
+from aldy.coverage import Coverage
+from aldy.gene import Mutation
+from aldy.profile import Profile
+
+
+profile = Profile("test", min_mapq=10, min_quality=10)
+
+
+def make_coverage(gene):
+    cov = {
+        100: {"_": [(60, 40)] * 5 + [(5, 40)] * 2 + [(60, 5)] * 3},
+        101: {"_": [(60, 40)] * 10, "A>G": [(60, 40)] * 4 + [(60, 5)] * 4},
+        102: {"_": [(5, 5)] * 3, "C>T": [(60, 40)]},
+        103: {"_": [(60, 40)] * 6, "insAA": [(60, 40)] * 3},
+        105: {"_": [(60, 35)] * 2, "delT": [(60, 35)] * 2},
+    }
+    return Coverage(gene, profile, None, cov, {(103, "insAA"): (6, 3)}, {})
+
+
+def test_region_total(toy_gene):
+    cov = make_coverage(toy_gene)
+    views = [
+        cov,
+        cov.filtered(Coverage.quality_filter),  # vectorized totals
+        cov.filtered(lambda c, m: Coverage.quality_filter(c, m)),
+    ]
+    for c in views:
+        for start, end in [
+            (90, 100),
+            (90, 101),
+            (100, 101),
+            (100, 106),
+            (101, 104),
+            (104, 105),
+            (105, 106),
+            (105, 120),
+            (106, 120),
+            (104, 102),
+            (0, 1000),
+        ]:
+            expected = sum(c.total(p) for p in range(start, end))
+            assert c.region_total(start, end) == expected
+    assert views[0].region_total(0, 1000) == 10 + 18 + 4 + 6 + 4
+    assert views[1].region_total(0, 1000) == 5 + 14 + 1 + 6 + 4
+
+
+def eager(cov, filter_fn):
+    """Filter the coverage eagerly (as the filtered copies were built before)."""
+    data = {}
+    for pos, ops in cov._coverage.items():
+        data[pos] = {}
+        for op, quals in ops.items():
+            f = filter_fn(cov, Mutation(pos, op))
+            if isinstance(f, Counter) and f:
+                data[pos][op] = f
+            elif isinstance(f, bool) and f:
+                data[pos][op] = quals
+    indels = {
+        (pos, op): v
+        for (pos, op), v in (cov._indels or {}).items()
+        if not (filter_fn(cov, Mutation(pos, op)) is False)
+    }
+    return Coverage(cov.gene, cov.profile, None, data, indels, {})
+
+
+def test_filtered(toy_gene):
+    def filter_fn(cov, mut):  # as in major._filter_alleles
+        return mut.op == "_" or cov.percentage(mut) >= 30
+
+    cov = make_coverage(toy_gene)
+    for quality_filter in [
+        Coverage.quality_filter,  # vectorized totals
+        lambda c, m: Coverage.quality_filter(c, m),
+    ]:
+        view = cov.filtered(quality_filter)
+        assert (view._depth is not None) == (quality_filter is Coverage.quality_filter)
+        view = view.filtered(filter_fn)
+        expected = eager(eager(cov, quality_filter), filter_fn)
+        muts = [
+            Mutation(pos, op)
+            for pos in range(99, 107)
+            for op in ["_", "A>G", "C>T", "insAA", "delT", "G>T"]
+        ]
+        for m in muts:
+            assert view[m] == expected[m]
+            assert view.total(m) == expected.total(m)
+            assert view.total(m.pos) == expected.total(m.pos)
+            assert view.percentage(m) == expected.percentage(m)
+        assert view._coverage == expected._coverage
+        assert view.region_total(0, 1000) == expected.region_total(0, 1000)
+    assert view[Mutation(101, "A>G")] == 0  # 4 of 14 high-quality reads
+    assert view[Mutation(102, "C>T")] == 1
+    assert view[Mutation(103, "insAA")] == 3
+    assert view[Mutation(105, "delT")] == 2
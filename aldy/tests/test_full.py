@@ -6,6 +6,7 @@
 # flake8: noqa
 
 import pytest  # noqa
+import os
 import re
 import subprocess
 import platform
@@ -14,7 +15,10 @@ import datetime
 from tempfile import NamedTemporaryFile as tmpfile
 
 from aldy.__main__ import get_version, main
-from aldy.common import script_path, log
+from aldy.common import script_path, log, AldyException
+from aldy.gene import GRange
+from aldy.profile import Profile
+from aldy.sam import Sample, load_samples
 from aldy.version import __version__
 
 
@@ -59,7 +63,8 @@ def assert_file(monkeypatch, file, solver, expected, params=None, warn=False):
         },
         **(params or {}),
     }
-    main(["genotype", file] + [i for k, v in args.items() for i in [k, v]])
+    args = [i for k, v in args.items() for i in ([k] if v is True else [k, v])]
+    main(["genotype", file] + args)
     expected = "\n".join(e.strip() for e in expected.strip().split("\n"))
     lines = "\n".join(escape_ansi(l).strip() for l in lines).strip()
     assert lines == expected
@@ -147,6 +152,21 @@ def test_NA10860_debug(monkeypatch, solver):
         assert out == "\n".join(i.strip() for i in expected_tar.strip().split("\n"))
 
 
+def test_NA10860_dump(monkeypatch, solver):
+    file = script_path("aldy.tests.resources", "NA10860.bam")
+    with tmpfile(suffix=".tar.gz") as tmp:
+        assert_file(
+            monkeypatch,
+            file,
+            solver,
+            EXPECTED_NA10860 + "Preparing debug archive...",
+            {"--debug": tmp.name[:-7]},
+        )
+        # Genotype again from the dump in the debug archive
+        expected = EXPECTED_NA10860.replace("NA10860.bam", os.path.basename(tmp.name))
+        assert_file(monkeypatch, tmp.name, solver, expected)
+
+
 def test_NA10860_hg38(monkeypatch, solver):
     file = script_path("aldy.tests.resources", "NA10860_hg38.bam")
     assert_file(
@@ -273,7 +293,48 @@ def test_fusion(monkeypatch, solver):
         Estimated activity for *79#10: unknown
     """
     file = script_path("aldy.tests.resources", "HARD.dump.tar.gz")
-    assert_file(monkeypatch, file, solver, expected, {"--gene": "pharmacoscan/cyp2d6"})
+    assert_file(
+        monkeypatch,
+        file,
+        solver,
+        expected,
+        {"--gene": "pharmacoscan/cyp2d6", "--allow-pickle": True},
+    )
+
+
+def test_pickled_dump(real_gene):
+    file = script_path("aldy.tests.resources", "HARD.dump.tar.gz")
+    with pytest.raises(AldyException, match="--allow-pickle"):
+        Sample(real_gene, None, file)
+
+
+def test_load_samples_spanning_read(real_gene, tmp_path):
+    import pysam
+
+    # A read that spans the CYP2D6 region and the CN-neutral region (CYP2D8)
+    # is fetched by both merged SAM intervals and must reach both consumers
+    file = str(tmp_path / "span.bam")
+    src = script_path("aldy.tests.resources", "NA10860.bam")
+    with pysam.AlignmentFile(src) as sam:
+        with pysam.AlignmentFile(file + ".tmp", "wb", template=sam) as out:
+            for read in sam.fetch("22", 42518000, 42549000):
+                out.write(read)
+            read = pysam.AlignedSegment(out.header)
+            read.query_name, read.flag = "span", 0
+            read.reference_id, read.reference_start = out.get_tid("22"), 42545000
+            read.mapping_quality, read.cigarstring = 60, "4000M"
+            read.query_sequence = "A" * 4000
+            read.query_qualities = pysam.qualitystring_to_array("I" * 4000)
+            out.write(read)
+    pysam.sort("-o", file, file + ".tmp")
+    pysam.index(file)
+
+    profile = Profile.load(real_gene, "illumina")
+    assert profile.cn_region == GRange("22", 42547463, 42548249)
+    (sample,) = load_samples([(real_gene, profile)], file)
+    assert isinstance(sample, Sample)
+    expected = Sample(real_gene, profile, file)._dump_cn
+    assert list(sample._dump_cn) == list(expected)
 
 
 def test_fusion_off(monkeypatch, solver):
@@ -301,7 +362,11 @@ def test_fusion_off(monkeypatch, solver):
         file,
         solver,
         expected,
-        {"--param": "cn-fusion-left=10", "--gene": "pharmacoscan/cyp2d6"},
+        {
+            "--param": "cn-fusion-left=10",
+            "--gene": "pharmacoscan/cyp2d6",
+            "--allow-pickle": True,
+        },
     )
 
 
@@ -362,7 +427,11 @@ def test_fix_insertions(monkeypatch, solver):
         file,
         solver,
         expected,
-        {"--gene": "pharmacoscan/cyp2d6", "--param": "max-minor-solutions=1"},
+        {
+            "--gene": "pharmacoscan/cyp2d6",
+            "--param": "max-minor-solutions=1",
+            "--allow-pickle": True,
+        },
     )
 
 
@@ -379,21 +448,45 @@ def test_profile(monkeypatch, capsys):
 
     expected = f"""
     {HEADER}
-    Scanning 1:60355979-201113425...
-    Scanning 2:234492389-234684945...
-    Scanning 4:69916092-89158474...
-    Scanning 6:18125541-18161374...
-    Scanning 7:1016834-117359025...
-    Scanning 8:18021970-18261723...
-    Scanning 10:96516437-135355620...
-    Scanning 11:14896554-67357124...
-    Scanning 12:21278127-21395730...
-    Scanning 13:48605702-48629878...
-    Scanning 15:75008882-75051948...
-    Scanning 16:31099174-31112276...
-    Scanning 19:15985833-41716444...
-    Scanning 22:19923262-42549249...
-    Scanning X:153756605-153781787...
+    Scanning 1:60356979-60397423...
+    Scanning 1:97541298-98391615...
+    Scanning 1:110225417-110238367...
+    Scanning 1:201006639-201112425...
+    Scanning 2:234493389-234683945...
+    Scanning 4:69917092-69979005...
+    Scanning 4:89009415-89157474...
+    Scanning 6:18126541-18160374...
+    Scanning 7:1017834-1031276...
+    Scanning 7:99243816-99282621...
+    Scanning 7:99300659-99337821...
+    Scanning 7:99352603-99386808...
+    Scanning 7:99420635-99466173...
+    Scanning 7:117100837-117358025...
+    Scanning 8:18022970-18083198...
+    Scanning 8:18243754-18260723...
+    Scanning 10:96517437-96617308...
+    Scanning 10:96692914-96751848...
+    Scanning 10:96794528-96834254...
+    Scanning 10:135333909-135354620...
+    Scanning 11:14897554-14918751...
+    Scanning 11:67346065-67356124...
+    Scanning 12:21279127-21394730...
+    Scanning 13:48606702-48628878...
+    Scanning 15:75009882-75022869...
+    Scanning 15:75036185-75050948...
+    Scanning 16:31100174-31111276...
+    Scanning 19:15986833-16013884...
+    Scanning 19:38433698-39080204...
+    Scanning 19:39732271-39740611...
+    Scanning 19:41347442-41361352...
+    Scanning 19:41379343-41393657...
+    Scanning 19:41492203-41526301...
+    Scanning 19:41589367-41604099...
+    Scanning 19:41615352-41636281...
+    Scanning 19:41694114-41715444...
+    Scanning 22:19924262-19959498...
+    Scanning 22:42519175-42548249...
+    Scanning X:153757605-153780787...
     """
     main(["profile", script_path("aldy.tests.resources", "NA10860.bam")])
     lines = "\n".join(escape_ansi(l).strip() for l in lines).strip()
@@ -408,21 +501,45 @@ def test_profile(monkeypatch, capsys):
     lines = []
     expected = f"""
     {HEADER}
-    Scanning 1:59890307-201118566...
-    Scanning 2:233583743-233776299...
-    Scanning 4:69050374-88237322...
-    Scanning 6:18125310-18161143...
-    Scanning 7:977198-117718971...
-    Scanning 8:18164461-18404213...
-    Scanning 10:94756680-133542116...
-    Scanning 11:14875008-67589653...
-    Scanning 12:21125193-21242796...
-    Scanning 13:48031566-48055742...
-    Scanning 15:74716541-74759607...
-    Scanning 16:31087853-31100955...
-    Scanning 19:15875023-41210539...
-    Scanning 22:19935739-42153258...
-    Scanning X:154528390-154553572...
+    Scanning 1:59891307-59931751...
+    Scanning 1:97075742-97926059...
+    Scanning 1:109682795-109695745...
+    Scanning 1:201037511-201117566...
+    Scanning 2:233584743-233775299...
+    Scanning 4:69051374-69113287...
+    Scanning 4:88088263-88236322...
+    Scanning 6:18126310-18160143...
+    Scanning 7:978198-991640...
+    Scanning 7:99646193-99684998...
+    Scanning 7:99703036-99740198...
+    Scanning 7:99754980-99789185...
+    Scanning 7:99823012-99868550...
+    Scanning 7:117460783-117717971...
+    Scanning 8:18165461-18225689...
+    Scanning 8:18386244-18403213...
+    Scanning 10:94757680-94857551...
+    Scanning 10:94933157-94992091...
+    Scanning 10:95034771-95074497...
+    Scanning 10:133520405-133541116...
+    Scanning 11:14876008-14897205...
+    Scanning 11:67578594-67588653...
+    Scanning 12:21126193-21241796...
+    Scanning 13:48032566-48054742...
+    Scanning 15:74717541-74730528...
+    Scanning 15:74743844-74758607...
+    Scanning 16:31088853-31099955...
+    Scanning 19:15876023-15903074...
+    Scanning 19:38428699-38589564...
+    Scanning 19:39241631-39249971...
+    Scanning 19:40841537-40855447...
+    Scanning 19:40873438-40887752...
+    Scanning 19:40986298-41020396...
+    Scanning 19:41083462-41098194...
+    Scanning 19:41109447-41130376...
+    Scanning 19:41188209-41209539...
+    Scanning 22:19936739-19971975...
+    Scanning 22:42123773-42152258...
+    Scanning X:154529390-154552572...
     """
     main(
         [
@@ -464,3 +581,47 @@ def test_pacbio(monkeypatch, solver):
     assert_file(
         monkeypatch, file, solver, expected, {"--profile": "pacbio-hifi-targeted"}
     )
+
+
+def test_batch(monkeypatch, solver, tmp_path):
+    monkeypatch.setattr(log, "info", lambda *_: None)
+    monkeypatch.setattr(log, "warn", lambda *_: None)
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(
+        "# Samples\n"
+        + script_path("aldy.tests.resources", "NA10860.bam")
+        + "\n"
+        + script_path("aldy.tests.resources", "NA10860_hg38.bam")
+        + "\tNA10860_hg38\n"
+    )
+    args = ["--gene", "cyp2d6", "--profile", "illumina", "--cn", "1,1"]
+    args += ["--solver", solver, "--jobs", "2", "--output-dir", str(tmp_path)]
+    main(["batch", str(manifest)] + args)
+
+    expected = [
+        "Sample\tGene\tSolutionID\tMajor\tMinor\tLegacy\tStatus",
+        "NA10860\tCYP2D6\t1\t*1 / *4.021\t[*1.018 +rs113889384 +rs28371713] / "
+        + "[*4.021]\t[*1.018 +rs113889384 +rs28371713] / [*4.021]\tOK",
+        "NA10860_hg38\tCYP2D6\t1\t*1 / *4.021\t[*1.018 +rs113889384 +rs28371713] / "
+        + "[*4.021]\t[*1.018 +rs113889384 +rs28371713] / [*4.021]\tOK",
+    ]
+    assert (tmp_path / "summary.tsv").read_text().splitlines() == expected
+    for s in ["NA10860", "NA10860_hg38"]:
+        lines = (tmp_path / f"{s}.aldy").read_text().splitlines()
+        assert lines[1] == "#Solution 1: *(1.018 +rs113889384 +rs28371713), *4.021"
+
+
+def test_jobs(solver, tmp_path, capsys):
+    file = script_path("aldy.tests.resources", "NA10860.bam")
+    args = ["--gene", "cyp2c19,cyp2d6,dpyd", "--profile", "illumina", "--cn", "1,1"]
+    args += ["--solver", solver]
+
+    def run(jobs):
+        output = tmp_path / f"jobs{jobs}.aldy"
+        main(["genotype", file, "--jobs", str(jobs), "--output", str(output)] + args)
+        return escape_ansi(capsys.readouterr().err), output.read_text()
+
+    lines, output = run(1)
+    genes = [lines.index(f"Gene {g}") for g in ["CYP2C19", "CYP2D6", "DPYD"]]
+    assert genes == sorted(genes)
+    assert run(2) == (lines, output)
@@ -5,9 +5,11 @@
 
 
 import pytest  # noqa
+import os
+import aldy.gene
 
-from aldy.gene import Mutation, CNConfig, CNConfigType, MajorAllele, MinorAllele
-from aldy.common import GRange
+from aldy.gene import Gene, Mutation, CNConfig, CNConfigType, MajorAllele, MinorAllele
+from aldy.common import GRange, script_path
 
 
 def test_gene_basic(toy_gene):
@@ -60,6 +62,19 @@ def test_gene_regions(toy_gene):
     assert toy_gene[100_000_196:100_000_210] == "ACGT" + "N" * 10
 
 
+def test_gene_coordinates():
+    gene = Gene(script_path("aldy.tests.resources", "toy.yml"), genome="hg38")
+    assert gene.strand == -1
+    assert gene.chr_to_ref == {200_000_000 + i: 199 - i for i in range(200)}
+    assert gene.ref_to_chr == {199 - i: 200_000_000 + i for i in range(200)}
+    assert len(gene.chr_to_ref) == 200
+    assert gene.chr_to_ref.bounds() == (200_000_000, 200_000_199)
+    assert 200_000_199 in gene and 200_000_200 not in gene
+    assert gene.chr_to_ref.get(199_999_999, -1) == -1
+    assert gene.ref_to_chr[0] == 200_000_199
+    assert gene[200_000_000:200_000_004] == "ACGT"
+
+
 def test_gene_alleles(toy_gene):
     def cnify(s):
         s = s.replace(" ", "").replace("|", ",").split(",")
@@ -227,6 +242,11 @@ def test_get_functional(toy_gene):
     assert toy_gene.get_functional((100_000_111, "A>C"), infer=True) == "V1A"
     assert not toy_gene.is_functional((100_000_111, "A>C"), infer=False)
     assert toy_gene.is_functional((100_000_104, "T>A"))
+    # Inferred effects
+    assert toy_gene.get_functional((100_000_113, "C>T")) == "R2C"
+    assert toy_gene.get_functional((100_000_112, "A>G")) is None  # synonymous
+    assert toy_gene.get_functional((100_000_125, "G>A")) is None  # intronic
+    assert toy_gene.get_functional((100_000_112, "insA")) == "indel"
 
 
 def test_get_rsid(toy_gene):
@@ -238,3 +258,42 @@ def test_get_rsid(toy_gene):
 def test_get_refseq(toy_gene):
     assert toy_gene.get_refseq(100_000_114, "T>A") == "115T>A"
     assert toy_gene.get_refseq(100_000_114, "T>A", from_atg=True) == "6T>A"
+
+
+def test_gene_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("ALDY_CACHE", str(tmp_path))
+    with open(script_path("aldy.tests.resources", "toy.yml")) as f:
+        yml = f.read()
+
+    gene = Gene(None, name="TOY", yml=yml)
+    assert len(os.listdir(tmp_path)) == 1
+    cached = Gene(None, name="TOY", yml=yml)
+    assert cached.__dict__ == gene.__dict__
+    assert cached.get_functional((100_000_111, "A>C")) == "V1A"
+
+    # Cache is invalidated when the database changes
+    yml = yml.replace("test-2.0", "test-2.1")
+    gene = Gene(None, name="TOY", yml=yml)
+    assert gene.version == "test-2.1 (2020-11-17)"
+    assert len(os.listdir(tmp_path)) == 1
+
+    # Different genomes are cached separately
+    _ = Gene(None, name="TOY", yml=yml, genome="hg19")
+    assert len(os.listdir(tmp_path)) == 2
+
+    monkeypatch.setenv("ALDY_CACHE", "")
+    _ = Gene(None, name="TOY", yml=yml, genome="hg38")
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_gene_cache_sources(monkeypatch, tmp_path):
+    # Cache is invalidated when the sources of the cached objects change
+    monkeypatch.setenv("ALDY_CACHE", str(tmp_path))
+    src = tmp_path / "src"
+    src.mkdir()
+    for f in ["gene.py", "common.py"]:
+        (src / f).write_text(f)
+    monkeypatch.setattr(aldy.gene, "__file__", str(src / "gene.py"))
+    path = aldy.gene._cache_path("TOY", "", None)
+    (src / "common.py").write_text("common.py changed")
+    assert aldy.gene._cache_path("TOY", "", None) != path
@@ -0,0 +1,73 @@
+# 786
+# Aldy source: test_indelpost.py
+#   This file is subject to the terms and conditions defined in
+#   file 'LICENSE', which is part of this source code package.
+
+
+import pytest  # noqa
+import pysam
+
+import aldy.indelpost
+from aldy.common import script_path
+from aldy.indelpost import Variant, VariantAlignment, SharedPileup
+from aldy.profile import Profile
+from aldy.sam import Sample, _GeneReference
+
+BAM = script_path("aldy.tests.resources", "NA10860.bam")
+
+
+def realign(gene, sites=None, min_quality=10):
+    sample = Sample.__new__(Sample)
+    sample._setup(gene, Profile.load(gene, "illumina", min_quality=min_quality), BAM)
+    if sites is not None:
+        sample._indel_sites = {s: [0, 0] for s in sites}
+    sample._prefix = ""
+    with pysam.AlignmentFile(BAM) as sam:
+        sample._realign_indels(sam, None)
+    return sample._indel_sites
+
+
+def test_shared_pileup(real_gene, monkeypatch):
+    shared = realign(real_gene)
+    assert shared[42_527_885, "insT"] == [33, 1]
+    monkeypatch.setattr(aldy.indelpost, "SharedPileup", lambda *_: None)
+    assert realign(real_gene) == shared
+
+
+def test_shared_pileup_clusters(real_gene, monkeypatch):
+    # The pileups are split when the indels are more than 1,000 bases apart
+    # and extend 250 bases around the outermost indels
+    sites = [p for p in real_gene.mutations if p[1][:3] in ["ins", "del"]]
+    sites += [(42_520_000, "insA"), (42_521_000, "insA")]  # 1,000 bases apart
+    sites += [(42_528_885, "insA"), (42_529_886, "insA")]  # 1,001 bases apart
+    shared = realign(real_gene, sites)
+    monkeypatch.setattr(aldy.indelpost, "SharedPileup", lambda *_: None)
+    assert realign(real_gene, sites) == shared
+
+
+def test_shared_pileup_quality(real_gene):
+    # Reads are cached per base quality threshold (the phasing of 42527885.insT
+    # differs between the thresholds)
+    rname = real_gene.chr
+    with pysam.AlignmentFile(BAM) as sam:
+        ref = _GeneReference(
+            rname,
+            sam.get_reference_length(rname),
+            real_gene._lookup_range[0],
+            real_gene._lookup_seq,
+        )
+        pileup = SharedPileup(sam, rname, 42_522_000, 42_528_000)
+        for pos, op in [(42_522_397, "delCT"), (42_527_885, "insT")]:
+            if op.startswith("del"):
+                o = real_gene[pos - 1]
+                v = Variant(rname, pos, o + op[3:], o, ref)
+            else:
+                o = real_gene[pos]
+                v = Variant(rname, pos + 1, o, o + op[3:], ref)
+            for q in [0, 20, 40, 20]:
+                expected = VariantAlignment(v, sam, base_quality_threshold=q)
+                valn = VariantAlignment(
+                    v, sam, base_quality_threshold=q, shared_pileup=pileup
+                )
+                assert valn.count_alleles() == expected.count_alleles()
+                assert valn.phase() == expected.phase()
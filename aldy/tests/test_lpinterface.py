@@ -0,0 +1,109 @@
+# 786
+# Aldy source: test_lpinterface.py
+#   This file is subject to the terms and conditions defined in
+#   file 'LICENSE', which is part of this source code package.
+
+
+import pytest  # noqa
+
+
+import aldy.lpinterface
+
+
+def superset_solutions(solver, bulk=False):
+    """
+    Enumerate a model whose only optimum {x} has a superset {x, y}
+    within the gap, together with an independent solution {w}.
+    """
+    model = aldy.lpinterface.model("test", solver, bulk=bulk)
+    x, y, w = (model.addVar(vtype="B", name=n) for n in "xyw")
+    model.addConstr(x + w >= 1, name="CX")
+    model.setObjective(x + y + 1.5 * w)
+    return {s for _, _, s in model.solutions(gap=1)}
+
+
+def test_superset_solutions():
+    assert superset_solutions("cbc") == {("x",), ("w",)}
+    assert superset_solutions("cbc", bulk=True) == {("x",), ("w",)}
+
+
+def test_superset_solutions_gurobi():  # pragma: no cover
+    pytest.importorskip("gurobipy")
+    assert superset_solutions("gurobi") == superset_solutions("cbc")
+
+
+def test_bulk_gurobi_pool(monkeypatch):  # pragma: no cover
+    # Bulk Gurobi models are enumerated in a single optimization
+    pytest.importorskip("gurobipy")
+    solves = []
+    solve = aldy.lpinterface.BulkGurobi.solve
+
+    def counted(self, init=None):
+        solves.append(init)
+        return solve(self, init)
+
+    monkeypatch.setattr(aldy.lpinterface.BulkGurobi, "solve", counted)
+    assert superset_solutions("gurobi", bulk=True) == superset_solutions("cbc")
+    assert len(solves) == 1
+
+
+def test_cpu_count(monkeypatch):
+    assert aldy.lpinterface.cpu_count() >= 1
+    monkeypatch.delattr(aldy.lpinterface.os, "sched_getaffinity", raising=False)
+    monkeypatch.setattr(aldy.lpinterface.os, "cpu_count", lambda: 3)
+    assert aldy.lpinterface.cpu_count() == 3
+
+
+def test_cpsat_threads():
+    assert aldy.lpinterface.model("test", "cpsat", threads=2).num_search_workers == 2
+    model = aldy.lpinterface.model("test", "cpsat")
+    assert model.num_search_workers == aldy.lpinterface.cpu_count()
+
+
+def test_highs_threads():  # pragma: no cover
+    pytest.importorskip("highspy")
+    assert aldy.lpinterface.model("test", "highs", threads=2).threads == 2
+    model = aldy.lpinterface.model("test", "highs")
+    assert model.threads == aldy.lpinterface.cpu_count()
+
+
+def test_any_solver(monkeypatch):
+    monkeypatch.setattr(aldy.lpinterface, "cpu_count", lambda: 1)
+    assert isinstance(aldy.lpinterface.model("test", "any"), aldy.lpinterface.CBC)
+    model = aldy.lpinterface.model("test", "any", bulk=True, threads=4)
+    assert isinstance(model, aldy.lpinterface.CPSAT)
+    assert model.num_search_workers == 4
+
+    monkeypatch.setattr(aldy.lpinterface, "cpu_count", lambda: 8)
+    model = aldy.lpinterface.model("test", "any")
+    assert isinstance(model, aldy.lpinterface.CPSAT)
+    assert model.num_search_workers == 8
+    model = aldy.lpinterface.model("test", "any", threads=1)
+    assert isinstance(model, aldy.lpinterface.CBC)
+
+
+def knapsack(bulk, mip_gap):
+    model = aldy.lpinterface.model("test", "cbc", bulk=bulk, mip_gap=mip_gap)
+    x = [model.addVar(vtype="B", name=f"x{i}") for i in range(60)]
+    w = [(37 * i) % 91 + 10 for i in range(60)]
+    v = [wi + (13 * i) % 11 - 5 for i, wi in enumerate(w)]
+    model.addConstr(model.quicksum(c * xi for c, xi in zip(w, x)) <= sum(w) // 2)
+    model.setObjective(model.quicksum(c * xi for c, xi in zip(v, x)), method="max")
+    return model
+
+
+def test_cbc_gap_limit():
+    # CBC reports the solutions within the gap as optimal
+    for bulk in [False, True]:
+        model = knapsack(bulk, mip_gap=0.2)
+        status, obj = model.solve()
+        assert status == "gap_limit"
+        bound = model.model.Objective().BestBound()
+        assert model.proven_gap == pytest.approx((bound - obj) / obj)
+        assert 0 < model.proven_gap <= 0.2
+        status, obj, _ = next(knapsack(bulk, mip_gap=0.2).solutions())
+        assert status == "gap_limit"
+
+        model = knapsack(bulk, mip_gap=None)
+        assert model.solve()[0] == "optimal"
+        assert model.proven_gap == 0
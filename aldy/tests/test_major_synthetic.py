@@ -11,7 +11,10 @@ import collections
 
 from aldy.profile import Profile
 from aldy.major import estimate_major
-from aldy.solutions import CNSolution
+import aldy.major
+import aldy.lpinterface
+from aldy.solutions import CNSolution, MinorSolution
+from aldy.genotype import time_limit_note
 from aldy.coverage import Coverage
 from aldy.common import SOLUTION_PRECISION
 
@@ -281,3 +284,74 @@ def test_novel_mutations(toy_gene, solver):
             "score": profile.major_novel + 0.1 + 1,
         },
     )
+
+
+def test_template_reuse(toy_gene, solver):
+    # Models that differ only in the coverage share the same template
+    aldy.major._templates.clear()
+    assert_major(
+        toy_gene,
+        solver,
+        {
+            "cn": {"1": 2},
+            "data": {
+                (100_000_110, "_"): 10,
+                (100_000_110, "delAC"): 10,
+                (100_000_118, "_"): 20,
+                (100_000_118, "insTT"): 10,
+                (100_000_150, "_"): 10,
+                (100_000_150, "C>T"): 10,
+            },
+            "sol": [{"2": 1, "3": 1}],
+            "score": 0,
+        },
+    )
+    assert len(aldy.major._templates) == 1
+    template = next(iter(aldy.major._templates.values()))
+    assert template.start is not None
+    assert_major(
+        toy_gene,
+        solver,
+        {
+            "cn": {"1": 2},
+            "data": {
+                (100_000_110, "_"): 11,
+                (100_000_110, "delAC"): 9,
+                (100_000_118, "_"): 22,
+                (100_000_118, "insTT"): 8,
+                (100_000_150, "_"): 10,
+                (100_000_150, "C>T"): 9,
+            },
+            "sol": [{"2": 1, "3": 1}],
+            "score": 2 / 10 + 3 / 11 + 1 / 10,
+        },
+    )
+    assert len(aldy.major._templates) == 1
+    assert next(iter(aldy.major._templates.values())) is template
+
+
+def test_time_limit(toy_gene, solver, monkeypatch):
+    # The toy model is solved instantly: report each solve as interrupted by the
+    # time limit with a 25% optimality gap. The solutions are not enumerated after
+    # the time limit is reached
+    cls = type(aldy.lpinterface.model("test", solver, bulk=True))
+    solve = cls.solve
+
+    def interrupted(self, init=None):
+        _, obj = solve(self, init)
+        self.proven_gap = 0.25
+        return "time_limit", obj
+
+    monkeypatch.setattr(cls, "solve", interrupted)
+    monkeypatch.setattr(profile, "major_time_limit", 60.0)
+    aldy.major._templates.clear()
+    cn_sol = CNSolution(toy_gene, 0, ["1", "1", "4"])
+    cov = collections.defaultdict(dict)
+    cov[100_000_150] = {"_": [(60, 60)] * 10, "C>T": [(60, 60)] * 20}
+    cov = Coverage(toy_gene, profile, None, cov, None, {})
+    sols = estimate_major(toy_gene, cov, cn_sol, solver)
+    assert len(sols) == 1
+    assert sols[0].status == "time_limit"
+    assert sols[0].proven_gap == 0.25
+    note = time_limit_note(MinorSolution(sols[0].score, [], sols[0]))
+    assert note == "major time limit, gap=25.00%"
@@ -278,7 +278,9 @@ def test_deletion(real_gene, solver):  # HG00276/v1
     )
 
 
-def test_comparison(real_gene, solver):  # NA10846/v1
+@pytest.mark.parametrize("jobs", [1, 3])
+@pytest.mark.parametrize("prune", ["none", "safe", "bound"])
+def test_comparison(real_gene, solver, jobs, prune):  # NA10846/v1
     from aldy.solutions import CNSolution, SolvedAllele, MajorSolution
     from aldy.coverage import Coverage
     from aldy.minor import estimate_minor
@@ -464,9 +466,10 @@ def test_comparison(real_gene, solver):  # NA10846/v1
     ]
     sols = estimate_minor(
         real_gene,
-        Coverage(real_gene, Profile("test"), None, cov, None, {}),
+        Coverage(real_gene, Profile("test", minor_prune=prune), None, cov, None, {}),
         majors,
         solver,
+        jobs=jobs,
     )
     assert len(sols) == 3
     sols.sort(key=lambda x: x.score)
@@ -0,0 +1,114 @@
+# 786
+# Aldy source: test_sam.py
+#   This file is subject to the terms and conditions defined in
+#   file 'LICENSE', which is part of this source code package.
+
+
+import pytest  # noqa
+import collections
+import numpy as np
+import pysam
+
+from aldy.sam import _PhaseMatrix, DepthCounter
+
+
+PHASES = {
+    "r1": {10: "_", 20: "A>G", 30: "insT"},
+    "r2": {10: "_", 20: "A>G"},
+    "r3": {20: "A>G", 10: "_", 40: "C>T"},
+    "r4": {30: "insT"},
+    "r5": {30: "insT", 10: "_", 20: "A>G"},
+    "r6": {20: "_", 30: "_"},
+    "r7": {40: "C>T", 30: "_", 20: "_"},
+    "r8": {20: "_", 30: "_"},
+}
+
+POSITIONS = [{10, 20, 30, 40}, {20, 30}, {10, 40}, {10}, set(), {50}]
+
+
+def dict_modes(phases, positions):
+    modes = collections.defaultdict(int)
+    for ph in phases.values():
+        mode = sorted((pos, op) for pos, op in ph.items() if pos in positions)
+        if len(mode) > 1:
+            modes[tuple(mode)] += 1
+    return dict(modes)
+
+
+def test_phase_modes():
+    matrix = _PhaseMatrix.from_dict(PHASES)
+    assert len(matrix) == len(PHASES)
+    for positions in POSITIONS:
+        expected = dict_modes(PHASES, positions)
+        assert list(matrix.modes(positions).items()) == list(expected.items())
+
+
+def test_phase_modes_collision(monkeypatch):
+    # Rows with the same hash are grouped directly
+    hash = staticmethod(lambda keys, _: np.ones(len(keys), dtype=np.uint64))
+    monkeypatch.setattr(_PhaseMatrix, "_hash", hash)
+    matrix = _PhaseMatrix.from_dict(PHASES)
+    for positions in POSITIONS:
+        expected = dict_modes(PHASES, positions)
+        assert list(matrix.modes(positions).items()) == list(expected.items())
+
+
+def test_phase_add():
+    matrix = _PhaseMatrix({10: 0, 20: 1})
+    matrix.add("r1", {10: "_"})
+    matrix.add("r2", {10: "_", 20: "A>G"})
+    matrix.compact()
+    matrix.add("r1", {10: "C>T", 20: "A>G"})  # overwrites the compacted entry
+    assert matrix.modes({10, 20}) == {
+        ((10, "_"), (20, "A>G")): 1,
+        ((10, "C>T"), (20, "A>G")): 1,
+    }
+
+
+def test_phase_arrays():
+    matrix = _PhaseMatrix.from_dict(PHASES)
+    arrays = matrix.to_arrays()
+    rows, positions, codes, ops = arrays
+    assert len(rows) == sum(len(ph) for ph in PHASES.values())
+    entries = {(f"r{r + 1}", p, ops[c]) for r, p, c in zip(rows, positions, codes)}
+    assert entries == {(f, p, op) for f, ph in PHASES.items() for p, op in ph.items()}
+
+    loaded = _PhaseMatrix.from_arrays(*arrays)
+    assert len(loaded) == len(PHASES)
+    for a, b in zip(loaded.to_arrays(), arrays):
+        assert list(a) == list(b)
+    for positions in POSITIONS:
+        assert loaded.modes(positions) == matrix.modes(positions)
+
+    # Fragments that cover a single location are not needed for the phasing
+    rows, positions, codes, ops = matrix.to_arrays(min_size=2)
+    loaded = _PhaseMatrix.from_arrays(rows, positions, codes, ops)
+    assert len(loaded) == len(PHASES) - 1
+    for positions in POSITIONS:
+        assert loaded.modes(positions) == matrix.modes(positions)
+
+
+def test_depth_counter():
+    header = pysam.AlignmentHeader.from_dict({"SQ": [{"SN": "1", "LN": 1000}]})
+
+    def read(start, cigar, flag=0):
+        r = pysam.AlignedSegment(header)
+        r.reference_id, r.reference_start, r.cigarstring, r.flag = 0, start, cigar, flag
+        return r
+
+    depth = DepthCounter()
+    depth.add(read(95, "10M"))  # overhangs the region start
+    depth.add(read(102, "2M3D2M"))  # deletions are covered
+    depth.add(read(101, "4S3M2I1M5S"))  # clips and insertions are not
+    depth.add(read(100, "1M4N2M"))  # skipped regions are not
+    depth.add(read(108, "5M"))  # overhangs the region end
+    depth.add(read(100, "10M", flag=2048))  # supplementary alignment
+    expected = [2, 2, 3, 3, 3, 2, 2, 1, 2, 1]
+    assert list(depth.depth(100, 110)) == expected
+    assert depth.total(100, 110) == sum(expected)
+    assert list(depth.depth(103, 106)) == expected[3:6]
+    assert depth.total(103, 106) == sum(expected[3:6])
+
+    depth = DepthCounter(supplementary=True)
+    depth.add(read(100, "10M", flag=2048))
+    assert depth.total(100, 110) == 10